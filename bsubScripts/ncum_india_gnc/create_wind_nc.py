@@ -29,15 +29,23 @@ def createNetCdfFile(path, today, utc):
         print cmd
         subprocess.call(cmd, shell=True)
 
-    infiles = []
+    infiles, failedfiles = [], []
     for hr in range(0, 241, 24):
         infile = filename % (str(hr).zfill(3), today)        
         cmd = '%s -append -nc_grads -netcdf %s %s' % (wgrib2, outfile, infile)
         print cmd
-        subprocess.call(cmd, shell=True)
+        returncode = subprocess.call(cmd, shell=True)
+        if returncode != 0: failedfiles.append(infile)
         infiles.append(infile)        
     # end of for hr in range(24, 241, 24):
-    time.sleep(10)
+    if failedfiles:
+        # wgrib2 returned only after wrote the nc file, so no need to wait.
+        # But keep the infiles if any one got failed.
+        print "ALERT !!! wgrib2 failed for", ' '.join(failedfiles)
+        print "So not removing the infiles"
+        os.chdir(cdir)
+        return
+    # end of if failedfiles:
     cmd = 'rm %s' % ' '.join(infiles)
     print cmd
     subprocess.call(cmd, shell=True)
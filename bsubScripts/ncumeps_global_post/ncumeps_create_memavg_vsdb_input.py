@@ -11,7 +11,7 @@
 
 import os, subprocess, datetime, getopt, sys, iris, numpy, time 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../g2utils')))
-from cubeutils import cubeRealizationAverager
+from cubeutils import cubeRealizationStatistics
 from um2grb2 import tweaked_messages, getCubeData, createDirWhileParallelRacing
 
 
@@ -41,6 +41,9 @@ __grib1FilesNameSuffix__ = None
 __OVERWRITE__ = True
 _reverseLatitude_ = True
 _preExtension_ = '_unOrdered'
+# dtype of the ensemble mean data while regridding and masking. float32 is 
+# enough for the grib2/grib1 packed fields.
+_workingDtype_ = numpy.float32
 
 
 targetGridResolution = 1.0
@@ -93,8 +96,10 @@ def createENSavg_VSDB_Grib1Files(inpath, outpath, today, utc, start_long_fcst_ho
         ensCube = inf.extract(varConstraint)
         if not ensCube: continue        
         print "doing members average for", varName
-        # do average over ensembles (1 control + 44 ensemble members)
-        ensAvgCube = cubeRealizationAverager(ensCube[0])
+        # do average over ensembles (1 control + 44 ensemble members), which
+        # keeps the ensemble mean cell method, so that tweaked_messages sets
+        # the ensemble derived forecast template of the grib2 message.
+        ensAvgCube = cubeRealizationStatistics(ensCube[0], stats=('mean',))[0]
         # make memory free
         del ensCube
         
@@ -156,7 +161,7 @@ def createENSavg_VSDB_Grib1Files(inpath, outpath, today, utc, start_long_fcst_ho
         
         if exmode == 'mask':
             regdCube.data = numpy.ma.masked_array(regdCube.data, 
-                                dtype=numpy.float64, fill_value=9.999e+20) 
+                                dtype=_workingDtype_, fill_value=9.999e+20) 
 
         if _reverseLatitude_:   # required for VSDB 90 to -90 and it shoule be 
             # revered before regridding. Because we kept target grid file as
@@ -179,10 +184,8 @@ def createENSavg_VSDB_Grib1Files(inpath, outpath, today, utc, start_long_fcst_ho
         print "Appending %s to grib2 file" % varName
         # make memory free
         del regdCube      
-        time.sleep(15)
         ensfpath_list.append(ensfpath)
     # end of for varName, varSTASH  in neededVars:                      
-    time.sleep(15)
     
     cmd = 'rm -rf ' + '  '.join(ensfpath_list)
     subprocess.call(cmd, shell=True)
@@ -195,11 +198,14 @@ def createENSavg_VSDB_Grib1Files(inpath, outpath, today, utc, start_long_fcst_ho
     if os.path.isfile(g1filepath): os.remove(g1filepath)
     
     cmd = [cnvgrib, '-g21', g2filepath, g1filepath]
-    subprocess.call(cmd, shell=False)
+    if subprocess.call(cmd, shell=False) != 0:
+        # keep the grib2 file, since grib1 file not created properly.
+        print "ALERT !!! cnvgrib failed for", g2filepath
+        return
+    # end of if subprocess.call(cmd, shell=False) != 0:
     cmd = ['chmod', '644', g1filepath]
     subprocess.call(cmd, shell=False)
     print "Converted grib2 to grib1 file : -", g1filepath
-    time.sleep(15)
     os.remove(g2filepath)                         
 # end of def createTarBalls(path, today, ...):
 
@@ -84,14 +84,15 @@ def createTarBalls(path, today, member):
     # merge all the params, all the levels, all the time steps, but individual members 
     # into single grib2 (BIG) file.
     catcmd_out = catcmd % mergedg2filepath
-    subprocess.call(catcmd_out, shell=True)
-    time.sleep(30)
+    # cat returns only after merged file has written, so no need to wait.
+    if subprocess.call(catcmd_out, shell=True) != 0:
+        raise ValueError("Unable to merge grib2 files into %s" % mergedg2filepath)
     # Lets compress single BIG grib2 file by using gz compress cmd.
     os.chdir(tardir)
     gzip_cmd = '%s -9 -p 32 %s' % (pigz, mergedg2file)
     print "gzip_cmd = ", gzip_cmd
-    subprocess.call(gzip_cmd, shell=True)
-    time.sleep(5)
+    if subprocess.call(gzip_cmd, shell=True) != 0:
+        raise ValueError("Unable to compress %s" % mergedg2file)
     print os.getcwd(), member    
     if member == '000':        
         # remove today directory!!!
@@ -109,7 +110,6 @@ def createTarBalls(path, today, member):
             cmd = 'ssh ncmlogin3 "rsync  --update --ignore-existing -razt  %s  %s:/data/ftp/pub/outgoing/NCUM_TIGGE/"' % (tarpath, ftp_server)
             print cmd
             subprocess.call(cmd, shell=True)
-            time.sleep(5)
 
             # remove past 11th day tar ball from ftp_server
             cmd = 'ssh ncmlogin3 "ssh %s rm -rf /data/ftp/pub/outgoing/NCUM_TIGGE/%s"' % (ftp_server, y6Day)
@@ -0,0 +1,209 @@
+"""
+Common helpers of the g2scripts check scripts (say um2grb2_regridcheck.py),
+which run the local g2utils on synthetic UM like fields, without the need of
+real UM fieldsfiles.
+
+It puts the local (modified) g2utils into sys.path, so that the scripts check
+it instead of system installed g2utils. And it provides the synthetic UM like
+cube, the command line options, the json lines out file and the PASS / FAIL
+printing of the results, which are same for all the scripts.
+
+Every check function of the scripts returns list of results, where every
+result is a dictionary of its names, values and 'passed' (or 'error').
+
+Date : 18.Oct.2026
+"""
+
+import os, sys, getopt, json, datetime
+import numpy
+import iris
+from cf_units import Unit
+
+# Load g2utils from previous directory, so that the local (modified) g2utils
+# is checked instead of system installed g2utils.
+g2utils_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../g2utils'))
+sys.path.insert(0, g2utils_path)
+
+# sample target grids directory
+dataPath = os.path.abspath(os.path.join(os.path.dirname(__file__), '../data'))
+# reference date of the synthetic fields
+checkDate = datetime.datetime(2017, 12, 22, 0)
+timeUnit = Unit('hours since 1970-01-01 00:00:00', calendar='gregorian')
+
+
+def makeUMCube(varName, varSTASH, units, domain, res, fcstHours, fieldFunc,
+                                             coordSystem=None, levels=None):
+    """
+    :param varName, varSTASH, units: name, STASH and units of the cube.
+    :param domain: (south, north, west, east) of the source grid. Global
+               (west to east is 360) longitude is circular.
+    :param res: resolution of the source grid in degree.
+    :param fcstHours: forecast hours of the time dimension.
+    :param fieldFunc: function of (rlats, rlons, shape) returns the data
+               (numpy or masked array) of the cube shape, where rlats (2D
+               column) and rlons (2D row) are latitude, longitude radians.
+    :param coordSystem: coord system of the latitude, longitude (say of the
+               target grid). By default GeogCS of the UM earth radius.
+    :param levels: pressure levels (hPa) of the pressure dimension. By
+               default the cube has no pressure dimension.
+    :return: synthetic UM like (float32) cube on (time, latitude, longitude)
+             dimensions (or on (time, pressure, latitude, longitude), if
+             levels passed) with forecast_period, forecast_reference_time
+             and STASH attribute, as like loaded from UM fieldsfiles.
+    """
+    south, north, west, east = domain
+    dres = float(res)
+    cs = coordSystem or iris.coord_systems.GeogCS(6371229.0)
+    lats = numpy.arange(south + dres / 2., north, dres)
+    lons = numpy.arange(west + dres / 2., east, dres)
+    lat = iris.coords.DimCoord(lats, standard_name='latitude',
+                               units='degrees', coord_system=cs)
+    lon = iris.coords.DimCoord(lons, standard_name='longitude', units='degrees',
+                     coord_system=cs, circular=(east - west == 360.0))
+    refTime = timeUnit.date2num(checkDate)
+    fcstHours = numpy.array(fcstHours, dtype=numpy.float64)
+    time = iris.coords.DimCoord(refTime + fcstHours, standard_name='time',
+                                                          units=timeUnit)
+    fp = iris.coords.AuxCoord(fcstHours, standard_name='forecast_period',
+                                                               units='hours')
+    frt = iris.coords.AuxCoord(refTime, standard_name='forecast_reference_time',
+                                                                units=timeUnit)
+    dim_coords = [time]
+    if levels is not None:
+        dim_coords.append(iris.coords.DimCoord(numpy.array(levels, dtype=numpy.float32),
+                                             long_name='pressure', units='hPa'))
+    # end of if levels is not None:
+    dim_coords += [lat, lon]
+    shape = tuple(len(coord.points) for coord in dim_coords)
+    rlats, rlons = numpy.deg2rad(lats)[:, None], numpy.deg2rad(lons)[None, :]
+    data = fieldFunc(rlats, rlons, shape)
+    # UM fieldsfiles are float32
+    if numpy.ma.isMaskedArray(data):
+        data = numpy.ma.masked_array(data, dtype=numpy.float32, fill_value=1e+20)
+    else:
+        data = numpy.asarray(data, dtype=numpy.float32)
+    # end of if numpy.ma.isMaskedArray(data):
+    cube = iris.cube.Cube(data, standard_name=varName, units=units,
+         dim_coords_and_dims=[(coord, i) for i, coord in enumerate(dim_coords)])
+    cube.add_aux_coord(fp, 0)
+    cube.add_aux_coord(frt)
+    cube.attributes['STASH'] = iris.fileformats.pp.STASH.from_msi(varSTASH)
+    return cube
+# end of def makeUMCube(...):
+
+def compareData(refData, data, tolerance=None):
+    """
+    :return: (no of points of different mask, max abs difference of the
+             commonly unmasked points, allowed abs difference) where allowed
+             difference is tolerance fraction of the data range of refData
+             (None if tolerance is None).
+    """
+    refMask = numpy.ma.getmaskarray(refData)
+    mask = numpy.ma.getmaskarray(data)
+    maskDiffers = int((refMask != mask).sum())
+    valid = ~(refMask | mask)
+    refValues = numpy.ma.getdata(refData).astype(numpy.float64)[valid]
+    values = numpy.ma.getdata(data).astype(numpy.float64)[valid]
+    if not refValues.size: return maskDiffers, 0.0, 0.0
+    maxDiff = float(numpy.abs(values - refValues).max())
+    if tolerance is None: return maskDiffers, maxDiff, None
+    allowed = tolerance * max(float(refValues.max() - refValues.min()), 1e-30)
+    return maskDiffers, maxDiff, allowed
+# end of def compareData(refData, data, tolerance=None):
+
+def runChecks(checks, selected, *args):
+    """
+    :param checks: list of (check name, check function) in execution order.
+    :param selected: names of the checks to be run.
+    :param args: arguments of every check function.
+    :return: results of all the selected checks. If any check function
+             raises exception, then it is recorded as failed result.
+    """
+    results = []
+    for check, func in checks:
+        if check not in selected: continue
+        try:
+            results.extend(func(*args))
+        except Exception as e:
+            result = {'check': check, 'passed': False,
+                      'error': '%s: %s' % (e.__class__.__name__, str(e))}
+            printResult(result, ('check',), ())
+            results.append(result)
+        # end of try:
+    # end of for check, func in checks:
+    return results
+# end of def runChecks(checks, selected, *args):
+
+def _formatValue(value):
+    if isinstance(value, float): return '%.3g' % value
+    return str(value)
+# end of def _formatValue(value):
+
+def printResult(result, nameKeys, valueKeys):
+    # print the result in single line, i.e. values of its nameKeys, PASS /
+    # FAIL (if it has 'passed') and its valueKeys (or its error).
+    name = ' '.join('%-8s' % _formatValue(result[key]) for key in nameKeys
+                                                         if key in result)
+    if 'error' in result:
+        print "%s ERROR : %s" % (name, result['error'])
+        return
+    # end of if 'error' in result:
+    status = ('PASS ' if result['passed'] else 'FAIL ') if 'passed' in result else ''
+    print "%s %s%s" % (name, status, ', '.join('%s %s' % (key,
+                    _formatValue(result[key])) for key in valueKeys if key in result))
+# end of def printResult(result, nameKeys, valueKeys):
+
+def parseOptions(opts, helpmsg, listOpts=()):
+    """
+    Update opts (dictionary of the default options) by the command line
+    options. Every option name is lower case of its opts key (say --outfile
+    for opts['outFile']). Values of listOpts are comma separated lists,
+    others are cast into the type of its default value (string, if the
+    default is None).
+    """
+    names = dict((key.lower(), key) for key in opts)
+    try:
+        options, args = getopt.getopt(sys.argv[1:], "h", [name + '='
+                                               for name in sorted(names)])
+    except getopt.GetoptError:
+        print helpmsg
+        sys.exit(2)
+    # end of try:
+
+    for opt, arg in options:
+        if opt == '-h':
+            print helpmsg
+            sys.exit()
+        # end of if opt == '-h':
+        key = names[opt[2:]]
+        if key in listOpts:
+            opts[key] = arg.split(',')
+        elif opts[key] is None:
+            opts[key] = arg
+        else:
+            opts[key] = type(opts[key])(arg)
+    # end of for opt, arg in options:
+    return opts
+# end of def parseOptions(opts, helpmsg, listOpts=()):
+
+def writeResults(results, outFile):
+    # append the results (along with run date) into outFile as json lines
+    runDate = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    with open(outFile, 'a') as ofile:
+        for result in results:
+            result['date'] = runDate
+            ofile.write(json.dumps(result) + '\n')
+    # end of with open(outFile, 'a') as ofile:
+    print "Results appended into", outFile
+# end of def writeResults(results, outFile):
+
+def exitOnFailure(results, what='checks'):
+    # exit with status 1, if any result is not passed (or has error).
+    failed = [result for result in results if not result.get('passed',
+                                                     'error' not in result)]
+    if failed:
+        print "FAILED : %d of %d %s" % (len(failed), len(results), what)
+        sys.exit(1)
+    # end of if failed:
+    print "Passed all the %d %s" % (len(results), what)
+# end of def exitOnFailure(results, what='checks'):
@@ -78,6 +78,11 @@ startdate = cdic.get('startdate', 'YYYYMMDD')
 enddate = cdic.get('enddate', None)
 loadg2utils = cdic.get('loadg2utils', 'system')
 extraPolateMethod = cdic.get('extraPolateMethod', 'auto')
+cacheRegridWeights = eval(cdic.get('cacheRegridWeights', 'True'))
+regridEngine = cdic.get('regridEngine', 'iris')
+regridInSlabs = eval(cdic.get('regridInSlabs', 'True'))
+workingDtype = cdic.get('workingDtype', 'float32')
+fcstVariableTasks = eval(cdic.get('fcstVariableTasks', 'False'))
 overwriteFiles = eval(cdic.get('overwriteFiles', 'True'))
 debug = eval(cdic.get('debug', 'False'))
 requiredLat = eval(cdic.get('latitude', 'None'))
@@ -98,6 +103,16 @@ end_long_fcst_hour_at_12z = eval(cdic.get('end_long_fcst_hour_at_12z', '120'))
 fillFullyMaskedVars = eval(cdic.get('fillFullyMaskedVars', 'None'))
 anlOutGrib2FilesNameStructure = eval(cdic.get('anlOutGrib2FilesNameStructure', 'None'))
 fcstOutGrib2FilesNameStructure = eval(cdic.get('fcstOutGrib2FilesNameStructure', 'None'))
+writeGrib2Shards = eval(cdic.get('writeGrib2Shards', 'True'))
+reorderGrib2Bytes = eval(cdic.get('reorderGrib2Bytes', 'True'))
+maxWorkers = eval(cdic.get('maxWorkers', 'None'))
+memoryBudget = eval(cdic.get('memoryBudget', 'None'))
+watchInFiles = eval(cdic.get('watchInFiles', 'False'))
+watchInterval = eval(cdic.get('watchInterval', '60'))
+watchTimeout = eval(cdic.get('watchTimeout', '21600'))
+resumeConversion = eval(cdic.get('resumeConversion', 'False'))
+recordTimings = eval(cdic.get('recordTimings', 'False'))
+profileWorkers = eval(cdic.get('profileWorkers', 'None'))
 createGrib2CtlIdxFiles = eval(cdic.get('createGrib2CtlIdxFiles', 'True'))
 convertGrib2FilestoGrib1Files = eval(cdic.get('convertGrib2FilestoGrib1Files', 'False'))
 createGrib1CtlIdxFiles = eval(cdic.get('createGrib1CtlIdxFiles', 'False'))
@@ -105,6 +120,9 @@ removeGrib2FilesAfterGrib1FilesCreated = eval(cdic.get('removeGrib2FilesAfterGri
 grib1FilesNameSuffix = eval(cdic.get('grib1FilesNameSuffix', '.grib1'))
 wgrib2Arguments = cdic.get('wgrib2Arguments', '-set_grib_type complex2 -grib_out')
 wgrib2Arguments = None if wgrib2Arguments in ['None', ''] else wgrib2Arguments
+packGrib2InProcess = eval(cdic.get('packGrib2InProcess', 'True'))
+renderCtlFiles = eval(cdic.get('renderCtlFiles', 'True'))
+grib1Workers = eval(cdic.get('grib1Workers', 'None'))
 callBackScript = cdic.get('callBackScript', None)
 callBackScript = None if callBackScript in ['None', ''] else callBackScript
 ensemble_member = eval(cdic.get('ensemble_member', 'None'))
@@ -151,6 +169,11 @@ else:
     print "Will be loaded full model global longitudes"
 # end of if requiredLon:
 
+if regridEngine not in ('sparse', 'weights', 'iris'):
+    raise ValueError("regridEngine takes either 'sparse' or 'weights' or 'iris'")
+if workingDtype not in ('float32', 'float64'):
+    raise ValueError("workingDtype takes either 'float32' or 'float64'")
+
 if fillFullyMaskedVars:
     if not isinstance(fillFullyMaskedVars, (int, float)):
         raise ValueError("fillFullyMaskedVars must be either interger or float")
@@ -260,6 +283,20 @@ print "latitude = ", requiredLat
 print "longitude = ", requiredLon
 print "pressureLevels = ", pressureLevels
 print "extraPolateMethod = ", extraPolateMethod
+print "cacheRegridWeights = ", cacheRegridWeights
+print "regridEngine = ", regridEngine
+print "regridInSlabs = ", regridInSlabs
+print "workingDtype = ", workingDtype
+print "fcstVariableTasks = ", fcstVariableTasks
+print "maxWorkers = ", maxWorkers
+print "memoryBudget = ", memoryBudget
+print "watchInFiles = ", watchInFiles
+if watchInFiles: 
+    print "watchInterval = ", watchInterval
+    print "watchTimeout = ", watchTimeout
+print "resumeConversion = ", resumeConversion
+print "recordTimings = ", recordTimings
+print "profileWorkers = ", profileWorkers
 print "soilFirstSecondFixedSurfaceUnit = ", soilFirstSecondFixedSurfaceUnit
 print "fillFullyMaskedVars = ", fillFullyMaskedVars
 if anlOutGrib2FilesNameStructure: print "anlOutGrib2FilesNameStructure = ", anlOutGrib2FilesNameStructure
@@ -267,13 +304,18 @@ if fcstOutGrib2FilesNameStructure: print "fcstOutGrib2FilesNameStructure = ", fc
 if write2NetcdfFile:
     print "write2NetcdfFile = ", write2NetcdfFile
 else:
+    print "writeGrib2Shards = ", writeGrib2Shards
+    print "reorderGrib2Bytes = ", reorderGrib2Bytes
     print "createGrib2CtlIdxFiles = ", createGrib2CtlIdxFiles
+    print "renderCtlFiles = ", renderCtlFiles
     print "convertGrib2FilestoGrib1Files = ", convertGrib2FilestoGrib1Files
+    if convertGrib2FilestoGrib1Files: print "grib1Workers = ", grib1Workers
     print "grib1FilesNameSuffix = ", grib1FilesNameSuffix
     print "createGrib1CtlIdxFiles = ", createGrib1CtlIdxFiles
     print "removeGrib2FilesAfterGrib1FilesCreated = ", removeGrib2FilesAfterGrib1FilesCreated
     if setGrib2TableParameters: print "setGrib2TableParameters = ", setGrib2TableParameters
     if wgrib2Arguments: print "wgrib2Arguments = ", wgrib2Arguments
+    if wgrib2Arguments: print "packGrib2InProcess = ", packGrib2InProcess
 
 if callBackScript: print "callBackScript = ", callBackScript
 if ensemble_member: print "ensemble_member = ", ensemble_member
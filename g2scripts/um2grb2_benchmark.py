@@ -0,0 +1,428 @@
+"""
+This is simple benchmark script to measure the throughput of the UM to GRIB2
+conversion (um2grb2, umeps2grb2, um2grb2tigge) on synthetic UM like fields,
+without the need of real UM fieldsfiles. The convert and ensemble stages run
+the real entry points (convertFcstFiles) on synthetic UM PP infiles, so that
+the workers pool, the grib2 shards merge, the re-order and the members
+loading are measured as like the operational run.
+
+Stages :
+    regrid   : regridutils.regridCube ('sparse', 'weights' engines) and iris
+               Linear regrid (as used by regridAnlFcstFiles) of the synthetic
+               fields. If regridCube returns None (i.e. the engine can not
+               regrid the cube), then it is reported as error of the engine.
+    convert  : um2grb2.convertFcstFiles of the synthetic umglaa_pd000 and
+               umglaa_pe000 infiles (forecast hours 6 to 24), i.e. the
+               regridAnlFcstFiles tasks in the workers pool, mergeGrib2Shards
+               and doShuffleVarsInOrder by raw byte re-ordering ('bytes') and
+               by iris re-load ('iris'). No of fields and bytes are of the
+               out files in the done marker, and the wall time of every phase
+               is summed from the timing log (workers time, not elapsed).
+    ensemble : umeps2grb2.convertFcstFiles of the synthetic member files
+               (NNN_pd000 and NNN_pg000, forecast hours 0 and 6), i.e.
+               packEnsemblesInParallel and packEnsembles, by 'sparse' and
+               'iris' regrid engines.
+    tigge    : um2grb2tigge.save_tigge_tweaked_messages of the members, which
+               are regridded (by regridCube, otherwise by iris as like
+               regridAnlFcstFiles) and packed by umeps2grb2._getEnsembleCube.
+
+Resolutions :
+    Synthetic source fields are created at 0.17, 0.25 (global) and 0.04
+    (regional, 5-40N, 65-100E) degree resolutions, on (time, pressure, lat,
+    lon) dimensions. They are regridded to the data/*.grib2 sample grids
+    (or to the user passed target grid file / resolution).
+
+Every stage (and variant) runs in its own child process. Its peak RSS is
+reported as the increase of ru_maxrss over its value at the child start (so
+that the forked parent memory is not counted) and the workersPeakRSSMB is of
+the largest worker process of the stage. Throughput is reported as fields/s
+(no of 2D lat-lon fields) and MB/s (input data size for regrid, out files
+size for others).
+
+Usage :
+    python um2grb2_benchmark.py --stages=regrid,convert --resolutions=0.25 \\
+            --levels=4 --members=4 --repeat=3 --engine=sparse --workers=4 \\
+            --outfile=bench.json --baseline=old_bench.json --tolerance=0.2
+
+    --outfile appends the results as json lines. If --baseline (json lines of
+    previous run) is passed, then the fields/s of every stage is compared
+    against baseline and exit with status 1, if any stage is slower than
+    baseline by more than tolerance fraction.
+
+Date : 18.Oct.2026
+"""
+
+import os, sys, time, shutil, json, resource, tempfile
+import multiprocessing as mp
+import numpy
+import iris
+import gribapi
+# checkutils puts the local (modified) g2utils into sys.path, so that the
+# benchmark measures it instead of system installed g2utils.
+from checkutils import dataPath, checkDate, makeUMCube, parseOptions, writeResults
+import um2grb2
+import umeps2grb2
+from regridutils import regridCube, irisRegrid
+
+# (south, north, west, east) domain of the synthetic source fields
+_benchDomains_ = {'0.17': (-90.0, 90.0, 0.0, 360.0),
+                  '0.25': (-90.0, 90.0, 0.0, 360.0),
+                  '0.04': (5.0, 40.0, 65.0, 100.0)}
+# default target grid of the synthetic source fields
+_benchTargetGrids_ = {'0.17': 'sample_global_0p36x0p45.grib2',
+                      '0.25': 'sample_global_0p36x0p45.grib2',
+                      '0.04': 'sample_ind_7-38N_67-98E_0p04X0p04.grib2'}
+# (varName, varSTASH, units, isPressureLevelVar, um2grb2 infile, umeps2grb2
+# infile)
+_benchVars_ = [('geopotential_height', 'm01s16i202', 'm', True, 'umglaa_pd', 'pd'),
+               ('air_temperature', 'm01s16i203', 'K', True, 'umglaa_pd', 'pd'),
+               ('air_pressure_at_sea_level', 'm01s16i222', 'Pa', False, 'umglaa_pe', 'pg')]
+# (offset, amplitude) of the synthetic fields
+_benchVarsRange_ = {'geopotential_height': (5000.0, 500.0),
+                    'air_temperature': (260.0, 30.0),
+                    'air_pressure_at_sea_level': (101000.0, 1500.0)}
+_benchPressureLevels_ = [1000.0, 850.0, 700.0, 500.0, 300.0, 250.0, 200.0, 100.0]
+# forecast hours of the 000 infile of 6 hourly global forecast (um2grb2) and
+# of the 000 member files (umeps2grb2)
+_benchFcstHours_ = [6, 12, 18, 24]
+_benchEnsFcstHours_ = [0, 6]
+_benchDate_ = checkDate.strftime('%Y%m%d')
+
+
+def _getFieldFunc(varName, member=0):
+    # smooth field varies over lat, lon and slightly over time, level, member
+    offset, amplitude = _benchVarsRange_[varName]
+
+    def fieldFunc(rlats, rlons, shape):
+        field = numpy.cos(rlats) * numpy.sin(rlons * 3.0)
+        scale = numpy.arange(1, numpy.prod(shape[:-2]) + 1, dtype=numpy.float32)
+        scale = 1.0 + 0.01 * scale.reshape(shape[:-2] + (1, 1)) + 0.001 * member
+        return offset + amplitude * field * scale
+    # end of def fieldFunc(rlats, rlons, shape):
+
+    return fieldFunc
+# end of def _getFieldFunc(varName, member=0):
+
+def _makeBenchCubes(res, opts, fcstHours, member=0):
+    # synthetic UM like cubes of all the _benchVars_
+    levels = _benchPressureLevels_[:opts['levels']]
+    return [makeUMCube(varName, varSTASH, units, _benchDomains_[res], res,
+                       fcstHours, _getFieldFunc(varName, member),
+                       levels=levels if isPressureVar else None)
+            for varName, varSTASH, units, isPressureVar, _, _ in _benchVars_]
+# end of def _makeBenchCubes(res, opts, fcstHours, member=0):
+
+def _writeUMInFiles(path, res, opts, fcstHours, fileIdx, prefix='', member=0):
+    # save the synthetic cubes into UM like PP infiles of path, whose names
+    # are prefix + _benchVars_ infile (fileIdx) + '000'.
+    infiles = {}
+    for cube, benchVar in zip(_makeBenchCubes(res, opts, fcstHours, member), _benchVars_):
+        infile = os.path.join(path, prefix + benchVar[fileIdx] + '000')
+        infiles.setdefault(infile, []).extend(cube.slices(['latitude', 'longitude']))
+    # end of for cube, benchVar in ...:
+    for infile, cubes in infiles.iteritems():
+        iris.save(cubes, infile + '.pp')
+        os.rename(infile + '.pp', infile)
+    # end of for infile, cubes in infiles.iteritems():
+# end of def _writeUMInFiles(...):
+
+def _getTargetGridKwargs(res, opts):
+    # targetGridFile (sample grib2 file) or targetGridResolution (and the
+    # domain) kwargs of convertFcstFiles as per user passed target grid.
+    targetGrid = opts['targetGrid'] or _benchTargetGrids_[res]
+    gridFile = targetGrid if os.path.isfile(targetGrid) else \
+                        os.path.join(dataPath, targetGrid)
+    if os.path.isfile(gridFile): return {'targetGridFile': gridFile}
+    south, north, west, east = _benchDomains_[res]
+    return {'targetGridResolution': float(targetGrid),
+            'latitude': (south, north), 'longitude': (west, east)}
+# end of def _getTargetGridKwargs(res, opts):
+
+def _getTargetGrid(res, opts):
+    # returns either target grid cube (sample grib2 file) or sample points
+    # of the user passed target resolution (as like convertFcstFiles).
+    kwargs = _getTargetGridKwargs(res, opts)
+    if 'targetGridFile' in kwargs: return iris.load(kwargs['targetGridFile'])[0]
+    south, north, west, east = _benchDomains_[res]
+    tres = kwargs['targetGridResolution']
+    latpoints = numpy.arange(south + tres / 2., north, tres)
+    lonpoints = numpy.arange(west + tres / 2., east, tres)
+    return [('latitude', latpoints), ('longitude', lonpoints)]
+# end of def _getTargetGrid(res, opts):
+
+def _irisRegrid(cube, targetGrid):
+    # iris Linear regrid as like regridAnlFcstFiles (cached regridder of
+    # the target grid file, otherwise interpolate to the sample points)
+    if isinstance(targetGrid, iris.cube.Cube):
+        return irisRegrid(cube, targetGrid, 'linear')
+    return cube.interpolate(targetGrid, iris.analysis.Linear(extrapolation_mode='linear'))
+# end of def _irisRegrid(cube, targetGrid):
+
+def _nFields(cube):
+    # no of 2D lat-lon fields (grib2 messages) of the cube
+    return int(cube.data.size / (len(cube.coord('latitude').points) *
+                                 len(cube.coord('longitude').points)))
+# end of def _nFields(cube):
+
+def _countMessages(fpath):
+    with open(fpath, 'rb') as gfile:
+        return gribapi.grib_count_in_file(gfile)
+# end of def _countMessages(fpath):
+
+def _getPhaseTimings(timingfile):
+    # sum of the wall time (seconds) of every phase of the timing log
+    phases = {}
+    if not os.path.isfile(timingfile): return phases
+    for line in open(timingfile):
+        if not line.strip(): continue
+        record = json.loads(line)
+        phases[record['phase']] = phases.get(record['phase'], 0.0) + record['wall']
+    # end of for line in open(timingfile):
+    return phases
+# end of def _getPhaseTimings(timingfile):
+
+def _makeBenchPaths(path):
+    # in (with date directory), out and tmp paths of convertFcstFiles
+    inPath, outPath, tmpPath = [os.path.join(path, name) for name in ('in', 'out', 'tmp')]
+    os.makedirs(os.path.join(inPath, _benchDate_))
+    return inPath, outPath, tmpPath
+# end of def _makeBenchPaths(path):
+
+def benchRegrid(res, variant, opts, path):
+    targetGrid = _getTargetGrid(res, opts)
+    cubes = _makeBenchCubes(res, opts, _benchFcstHours_)
+    fields = sum([_nFields(cube) for cube in cubes])
+    nbytes = sum([cube.data.nbytes for cube in cubes])
+    timings = []
+    for rpt in range(opts['repeat']):
+        startT = time.time()
+        for cube in cubes:
+            if variant == 'iris':
+                regdCube = _irisRegrid(cube, targetGrid)
+            else:
+                regdCube = regridCube(cube, targetGrid, engine=variant)
+            # end of if variant == 'iris':
+            if regdCube is None:
+                # regridAnlFcstFiles falls back to iris for this cube
+                raise ValueError("regridCube %s engine can not regrid %s" % (variant,
+                                                                  cube.name()))
+            regdCube.data
+        # end of for cube in cubes:
+        timings.append(time.time() - startT)
+    # end of for rpt in range(opts['repeat']):
+    # first repeat includes the weights computation of regridutils.
+    warmT = min(timings[1:]) if len(timings) > 1 else timings[0]
+    return {'fields': fields, 'bytes': nbytes, 'seconds': warmT,
+            'coldSeconds': timings[0]}
+# end of def benchRegrid(res, variant, opts, path):
+
+def benchConvert(res, variant, opts, path):
+    inPath, outPath, tmpPath = _makeBenchPaths(path)
+    _writeUMInFiles(os.path.join(inPath, _benchDate_), res, opts, _benchFcstHours_, 4)
+    kwargs = _getTargetGridKwargs(res, opts)
+    kwargs.update({'UMInLongFcstFiles': sorted(set(benchVar[4] for benchVar in _benchVars_)),
+                   'convertVars': [benchVar[:2] for benchVar in _benchVars_],
+                   'date': _benchDate_, 'utc': '00', 'overwrite': True,
+                   'fcst_step_hour': 6, 'start_long_fcst_hour': _benchFcstHours_[0],
+                   'end_long_fcst_hour': _benchFcstHours_[-1],
+                   'createGrib2CtlIdxFiles': False, 'wgrib2Arguments': None,
+                   'recordTimings': True, 'regridEngine': opts['engine'],
+                   'reorderGrib2Bytes': variant == 'bytes',
+                   'maxWorkers': opts['workers'] or None})
+    startT = time.time()
+    um2grb2.convertFcstFiles(os.path.join(inPath, '*YYYYMMDD*'),
+                    os.path.join(outPath, '*YYYYMMDD*'), tmpPath, **kwargs)
+    seconds = time.time() - startT
+    donepath = um2grb2.__getDoneMarkerPath__('00')
+    if not os.path.isfile(donepath):
+        raise ValueError("convertFcstFiles didnt write done marker %s" % donepath)
+    outFiles = json.load(open(donepath))['outFiles']
+    timingfile = os.path.join(tmpPath, _benchDate_, 'um2grb2_fcst_timing_%s_00Z.json' % _benchDate_)
+    return {'fields': sum([info['messages'] for info in outFiles.values()]),
+            'bytes': sum([info['size'] for info in outFiles.values()]),
+            'seconds': seconds, 'phases': _getPhaseTimings(timingfile)}
+# end of def benchConvert(res, variant, opts, path):
+
+def benchEnsemble(res, variant, opts, path):
+    inPath, outPath, tmpPath = _makeBenchPaths(path)
+    for member in range(opts['members']):
+        _writeUMInFiles(os.path.join(inPath, _benchDate_), res, opts,
+                        _benchEnsFcstHours_, 5, '%03d_' % member, member)
+    # end of for member in range(opts['members']):
+    umeps2grb2._ensemble_count_ = opts['members'] - 1
+    kwargs = _getTargetGridKwargs(res, opts)
+    kwargs.update({'convertVars': [benchVar[:2] for benchVar in _benchVars_],
+                   'date': _benchDate_, 'utc': '00', 'overwrite': True,
+                   'fcst_step_hour': 6, 'start_long_fcst_hour': _benchEnsFcstHours_[0],
+                   'end_long_fcst_hour': _benchEnsFcstHours_[-1],
+                   'fcstFileNameStructure': umeps2grb2.__fcstFileNameStructure__,
+                   'createGrib2CtlIdxFiles': False, 'regridEngine': variant})
+    startT = time.time()
+    umeps2grb2.convertFcstFiles(inPath, outPath, tmpPath, **kwargs)
+    seconds = time.time() - startT
+    opPath = os.path.join(outPath, _benchDate_)
+    donepath = os.path.join(opPath, 'umeps2grb2_fcst_%s_00Z.done' % _benchDate_)
+    if not os.path.isfile(donepath):
+        raise ValueError("convertFcstFiles didnt write done marker %s" % donepath)
+    outFiles = json.load(open(donepath))['outFiles']
+    return {'fields': sum([_countMessages(os.path.join(opPath, fname)) for fname in outFiles]),
+            'bytes': sum([info['size'] for info in outFiles.values()]),
+            'seconds': seconds}
+# end of def benchEnsemble(res, variant, opts, path):
+
+def benchTigge(res, variant, opts, path):
+    import um2grb2tigge
+    um2grb2tigge._opPath_ = path
+    targetGrid = _getTargetGrid(res, opts)
+    regdMembers = []
+    for member in range(opts['members']):
+        regdCubes = []
+        for cube in _makeBenchCubes(res, opts, _benchFcstHours_, member):
+            regdCube = regridCube(cube, targetGrid)
+            # regridCube can not regrid the cube, so fall back to iris (as
+            # like regridAnlFcstFiles)
+            if regdCube is None: regdCube = _irisRegrid(cube, targetGrid)
+            regdCubes.append(regdCube)
+        # end of for cube in _makeBenchCubes(...):
+        regdMembers.append(regdCubes)
+    # end of for member in range(opts['members']):
+    # pack the members of every variable into realization dimension
+    infiles = ['%03d_bench' % member for member in range(opts['members'])]
+    ensCubes = []
+    for regdCubes in zip(*regdMembers):
+        data = numpy.ma.array([regdCube.data for regdCube in regdCubes])
+        ensCubes.append(umeps2grb2._getEnsembleCube(regdCubes[0], numpy.ma.getdata(data),
+                                            numpy.ma.getmaskarray(data), infiles))
+    # end of for regdCubes in zip(*regdMembers):
+    fields = sum([_nFields(cube) for cube in ensCubes])
+    startT = time.time()
+    um2grb2tigge.save_tigge_tweaked_messages(ensCubes)
+    seconds = time.time() - startT
+    nbytes = sum([os.path.getsize(os.path.join(root, f))
+                  for root, dirs, files in os.walk(path) for f in files])
+    return {'fields': fields, 'bytes': nbytes, 'seconds': seconds}
+# end of def benchTigge(res, variant, opts, path):
+
+# (stage, variants, benchmark function) in the execution order
+_benchStages_ = [('regrid', ('sparse', 'weights', 'iris'), benchRegrid),
+                 ('convert', ('bytes', 'iris'), benchConvert),
+                 ('ensemble', ('sparse', 'iris'), benchEnsemble),
+                 ('tigge', ('save',), benchTigge)]
+
+def _runBenchmark(func, res, variant, opts, path, queue):
+    # runs in its own child process. ru_maxrss of the forked child starts
+    # with the parent memory, so take the baseline now.
+    baseRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    try:
+        result = func(res, variant, opts, path)
+    except Exception as e:
+        result = {'error': '%s: %s' % (e.__class__.__name__, str(e))}
+    # end of try:
+    # convertFcstFiles redirects stdout into its log file
+    sys.stdout = sys.__stdout__
+    # ru_maxrss is in kilobytes on linux. RUSAGE_CHILDREN is of the largest
+    # (waited) worker process of this stage.
+    result['peakRSSMB'] = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseRSS) / 1024.0
+    result['workersPeakRSSMB'] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024.0
+    queue.put(result)
+# end of def _runBenchmark(func, res, variant, opts, path, queue):
+
+def runBenchmarks(opts):
+    results = []
+    for stage, variants, func in _benchStages_:
+        if stage not in opts['stages']: continue
+        for res in opts['resolutions']:
+            for variant in variants:
+                path = tempfile.mkdtemp(prefix='%s_%s_%s_' % (stage, res, variant),
+                                                            dir=opts['tmpPath'])
+                queue = mp.Queue()
+                proc = mp.Process(target=_runBenchmark,
+                                  args=(func, res, variant, opts, path, queue))
+                proc.start()
+                result = queue.get()
+                proc.join()
+                shutil.rmtree(path, ignore_errors=True)
+                result.update({'stage': stage, 'resolution': res, 'variant': variant})
+                if 'error' not in result:
+                    result['fieldsPerSec'] = result['fields'] / result['seconds']
+                    result['MBPerSec'] = result['bytes'] / 1048576.0 / result['seconds']
+                # end of if 'error' not in result:
+                _printResult(result)
+                results.append(result)
+            # end of for variant in variants:
+        # end of for res in opts['resolutions']:
+    # end of for stage, variants, func in _benchStages_:
+    return results
+# end of def runBenchmarks(opts):
+
+def _printResult(result):
+    name = '%-9s %-5s %-8s' % (result['stage'], result['resolution'], result['variant'])
+    rss = "peak RSS %9.1f MB (workers %.1f MB)" % (result['peakRSSMB'],
+                                                   result['workersPeakRSSMB'])
+    if 'error' in result:
+        print "%s ERROR : %s %s" % (name, result['error'], rss)
+        return
+    print "%s %6d fields %9.2f s %10.2f fields/s %9.2f MB/s %s" % (name,
+          result['fields'], result['seconds'], result['fieldsPerSec'],
+          result['MBPerSec'], rss)
+    if result.get('phases'):
+        print "%s phases : %s" % (' ' * len(name), ', '.join('%s %.2f s' % item
+                                      for item in sorted(result['phases'].items())))
+# end of def _printResult(result):
+
+def compareWithBaseline(results, baselineFile, tolerance):
+    # returns list of regressed results (slower than baseline by tolerance)
+    baseline = {}
+    for line in open(baselineFile):
+        if not line.strip(): continue
+        result = json.loads(line)
+        if 'fieldsPerSec' not in result: continue
+        baseline[(result['stage'], result['resolution'], result['variant'])] = result
+    # end of for line in open(baselineFile):
+    regressed = []
+    for result in results:
+        key = (result['stage'], result['resolution'], result['variant'])
+        if key not in baseline or 'fieldsPerSec' not in result: continue
+        ratio = result['fieldsPerSec'] / baseline[key]['fieldsPerSec']
+        if ratio < 1.0 - tolerance:
+            print "REGRESSION : %s %s %s is %.1f%% slower than baseline" % (key +
+                                                       ((1.0 - ratio) * 100,))
+            regressed.append(result)
+        # end of if ratio < 1.0 - tolerance:
+    # end of for result in results:
+    return regressed
+# end of def compareWithBaseline(results, baselineFile, tolerance):
+
+helpmsg = """um2grb2_benchmark.py --stages=regrid,convert,ensemble,tigge
+    --resolutions=0.17,0.25,0.04 --targetgrid=sample_global_0p36x0p45.grib2
+    --levels=4 --members=4 --repeat=3 --engine=sparse --workers=4
+    --tmppath=/tmp --outfile=bench.json --baseline=old_bench.json
+    --tolerance=0.2"""
+
+if __name__ == '__main__':
+
+    # workers 0 means decided by um2grb2 as per cpu cores and memory
+    opts = {'stages': [stage for stage, _, _ in _benchStages_],
+            'resolutions': ['0.17', '0.25', '0.04'], 'targetGrid': None,
+            'levels': 4, 'members': 4, 'repeat': 3, 'engine': 'sparse',
+            'workers': 0, 'tmpPath': tempfile.gettempdir(), 'outFile': None,
+            'baseline': None, 'tolerance': 0.2}
+    parseOptions(opts, helpmsg, listOpts=('stages', 'resolutions'))
+
+    for res in opts['resolutions']:
+        if res not in _benchDomains_:
+            raise ValueError("resolutions must be any of %s" % _benchDomains_.keys())
+    # end of for res in opts['resolutions']:
+    if opts['levels'] > len(_benchPressureLevels_):
+        raise ValueError("levels must be <= %d" % len(_benchPressureLevels_))
+
+    print "Benchmark options", opts
+    results = runBenchmarks(opts)
+    if opts['outFile']: writeResults(results, opts['outFile'])
+
+    if opts['baseline']:
+        if compareWithBaseline(results, opts['baseline'], opts['tolerance']):
+            sys.exit(1)
+        print "No regression found against baseline", opts['baseline']
+    # end of if opts['baseline']:
+# end of if __name__ == '__main__':
@@ -22,7 +22,12 @@ from loadconfigure import inPath, outPath, tmpPath, date, loadg2utils, \
                    callBackScript, setGrib2TableParameters, wgrib2Arguments, \
                    soilFirstSecondFixedSurfaceUnit, UMtype, targetGridFile, \
                    UMInLongFcstFiles, fillFullyMaskedVars, extraPolateMethod, \
-                   write2NetcdfFile
+                   write2NetcdfFile, cacheRegridWeights, regridEngine, \
+                   writeGrib2Shards, reorderGrib2Bytes, maxWorkers, \
+                   memoryBudget, watchInFiles, watchInterval, watchTimeout, \
+                   resumeConversion, recordTimings, profileWorkers, \
+                   packGrib2InProcess, renderCtlFiles, grib1Workers, \
+                   regridInSlabs, workingDtype, fcstVariableTasks
 
 if loadg2utils == 'system':
     # Load g2utils from system python which has installed through setup.py
@@ -104,6 +109,24 @@ soilFirstSecondFixedSurfaceUnit=soilFirstSecondFixedSurfaceUnit,
               setGrib2TableParameters=setGrib2TableParameters,
                               wgrib2Arguments=wgrib2Arguments,
                             write2NetcdfFile=write2NetcdfFile,
+                        cacheRegridWeights=cacheRegridWeights,
+                                    regridEngine=regridEngine,
+                            writeGrib2Shards=writeGrib2Shards,
+                          reorderGrib2Bytes=reorderGrib2Bytes,
+                                        maxWorkers=maxWorkers,
+                                    memoryBudget=memoryBudget,
+                                    watchInFiles=watchInFiles,
+                                  watchInterval=watchInterval,
+                                    watchTimeout=watchTimeout,
+                            resumeConversion=resumeConversion,
+                                  recordTimings=recordTimings,
+                                profileWorkers=profileWorkers,
+                        packGrib2InProcess=packGrib2InProcess,
+                                renderCtlFiles=renderCtlFiles,
+                                    grib1Workers=grib1Workers,
+                                  regridInSlabs=regridInSlabs,
+                                    workingDtype=workingDtype,
+                          fcstVariableTasks=fcstVariableTasks,
                                 callBackScript=callBackScript)
     print "Time lag incremented by 1"
     sDay += lag
@@ -0,0 +1,300 @@
+"""
+This is simple script to check that the optimized code paths of g2utils
+give the same output as the older code paths, which they replaced.
+
+Checks :
+    cummulate : cubeutils.cubeCummulator with inPlace=True (one running sum
+                buffer, as used by um2grb2tigge.makeTotalCummulativeVars)
+                vs inPlace=False (new cube for every time), step by step.
+                The data, mask, time & forecast_period points and bounds,
+                names, units and cell methods of every yielded cube must be
+                same. By default it runs on synthetic TIGGE like 6 hourly
+                accumulation series (with masked points varying over time),
+                or on the TIGGE nc files passed by --tiggefiles (loaded
+                together, as like makeTotalCummulativeVars).
+    ensembles : umeps2grb2 members packed by reading every member file only
+                once per group of outputs (_getEnsembleOutputGroups, 
+                _allocateEnsembleOutputs, _storeEnsembleMember and
+                _getEnsembleCube, as like packEnsemblesInParallel and
+                packEnsembles) vs the older per (variable,
+                hour) loading of every member file, on one NEPS forecast
+                file (say pb 006 of all the members). The data, mask, coords
+                and metadata of every member of every (variable, hour) must
+                be same. It includes the _accumulationVars_ (forecast hour
+                - 3) and reports the no of masked points. By default it runs
+                on synthetic member PP files (with masked points differing
+                over the members), or on the NEPS member files in --inpath.
+                --memorybudget (in GB) splits the outputs into groups.
+
+Usage :
+    python um2grb2_paritycheck.py --checks=cummulate,ensembles --steps=8 \\
+            --tiggefiles=/path/to/tigge_sl_*_tp.nc --inpath=/path/to/neps/date \\
+            --fpname=pb --hour=6 --members=45 --fcststephour=6 --memorybudget=2 \
+            --outfile=parity.json
+
+    --outfile appends the results as json lines. Exit with status 1, if any
+    check fails.
+
+Date : 18.Oct.2026
+"""
+
+import os, glob, shutil, tempfile
+import numpy
+import iris
+from checkutils import (makeUMCube, compareData, runChecks, printResult,
+                        parseOptions, writeResults, exitOnFailure)
+from cubeutils import cubeCummulator
+from um2grb2 import getCubeData
+import umeps2grb2 as umeps
+
+# (south, north, west, east) domain and resolution of the synthetic NEPS
+# member files
+_ensembleDomain_ = (5.0, 40.0, 65.0, 100.0)
+_ensembleRes_ = '0.25'
+# name and value keys of the printed results
+_nameKeys_ = ('check', 'step', 'variable')
+_valueKeys_ = ('maskDiffers', 'maxDiff', 'coordsDiffer', 'metadataDiffers', 'fpBounds',
+               'accumulation', 'maskedPoints')
+
+
+def _makeTiggeSeries(opts):
+    # create synthetic (time, lat, lon) 6 hourly accumulation cube as like
+    # the TIGGE nc files of makeTotalCummulativeVars loaded together.
+    steps = opts['steps']
+    ends = numpy.arange(1, steps + 1) * 6.0
+
+    def fieldFunc(rlats, rlons, shape):
+        rng = numpy.random.RandomState(0)
+        # accumulations are zero over the half of the points
+        data = numpy.clip(rng.gamma(0.5, 4.0, shape) - 1.0, 0, None)
+        mask = numpy.zeros(shape, dtype=bool)
+        # masked points only at few times, so that the mask is union over times
+        mask[min(2, steps - 1), 10:20, 30:60] = True
+        mask[steps - 1, 100:110, 200:230] = True
+        return numpy.ma.masked_array(data, mask=mask)
+    # end of def fieldFunc(rlats, rlons, shape):
+
+    cube = makeUMCube('precipitation_amount', 'm01s05i226', 'kg m-2',
+                      (-90.0, 90.0, 0.0, 360.0), '1', ends, fieldFunc)
+    # 6 hourly accumulation bounds
+    for name in ('time', 'forecast_period'):
+        coord = cube.coord(name)
+        coord.bounds = numpy.column_stack([coord.points - 6.0, coord.points])
+    # end of for name in ('time', 'forecast_period'):
+    return cube
+# end of def _makeTiggeSeries(opts):
+
+def _getTiggeSeries(opts):
+    if not opts['tiggeFiles']: return _makeTiggeSeries(opts), 'synthetic'
+    infiles = sorted(sum([glob.glob(pattern) for pattern in opts['tiggeFiles']], []))
+    if not infiles: raise ValueError("no tigge files found for %s" % opts['tiggeFiles'])
+    return iris.load(infiles)[0], ','.join(infiles)
+# end of def _getTiggeSeries(opts):
+
+def _snapshot(cube):
+    # copy of the yielded cube details (in-place cube gets updated for the
+    # next time, so it must be copied before taking the next one)
+    coords = {}
+    for name in ('time', 'forecast_period'):
+        coord = cube.coord(name)
+        coords[name] = (coord.points.copy(), None if coord.bounds is None
+                                                 else coord.bounds.copy())
+    # end of for name in ('time', 'forecast_period'):
+    metadata = (cube.standard_name, cube.long_name, str(cube.units),
+                cube.cell_methods, sorted(cube.attributes.keys()))
+    return numpy.ma.masked_array(cube.data, copy=True), coords, metadata
+# end of def _snapshot(cube):
+
+def checkCummulate(opts):
+    cubes, source = _getTiggeSeries(opts)
+    # same arguments as um2grb2tigge.makeTotalCummulativeVars of 'tp'
+    kwargs = {'standard_name': 'None', 'long_name': 'time_cummulated_precipitation',
+              'addZerosFirstCube': True, 'removeSTASH': True}
+    olds = [_snapshot(cube) for cube in cubeCummulator(cubes.copy(), **kwargs)]
+    news = [_snapshot(cube) for cube in cubeCummulator(cubes.copy(), inPlace=True, **kwargs)]
+    results = []
+    if len(olds) != len(news):
+        result = {'check': 'cummulate', 'source': source, 'passed': False,
+                  'error': 'inPlace yields %d cubes instead of %d' % (len(news), len(olds))}
+        printResult(result, _nameKeys_, _valueKeys_)
+        results.append(result)
+    # end of if len(olds) != len(news):
+    for step, (old, new) in enumerate(zip(olds, news)):
+        (oldData, oldCoords, oldMeta), (newData, newCoords, newMeta) = old, new
+        maskDiffers, maxDiff, _ = compareData(oldData, newData)
+        coordsDiffer = [name for name in ('time', 'forecast_period')
+                        if not (numpy.array_equal(oldCoords[name][0], newCoords[name][0]) and
+                                numpy.array_equal(oldCoords[name][1], newCoords[name][1]))]
+        fpBounds = newCoords['forecast_period'][1]
+        result = {'check': 'cummulate', 'source': source, 'step': step,
+                  'maskDiffers': maskDiffers, 'maxDiff': maxDiff,
+                  'coordsDiffer': coordsDiffer, 'metadataDiffers': oldMeta != newMeta,
+                  'fpBounds': fpBounds.tolist() if fpBounds is not None else None,
+                  'passed': (maskDiffers == 0 and maxDiff == 0.0 and
+                             not coordsDiffer and oldMeta == newMeta)}
+        printResult(result, _nameKeys_, _valueKeys_)
+        results.append(result)
+    # end of for step, (old, new) in enumerate(zip(olds, news)):
+    return results
+# end of def checkCummulate(opts):
+
+def _getEnsembleOutputKeys(fpname, hr):
+    # (varName, varSTASH, fhr) of the forecast file as like 
+    # umeps2grb2.packEnsemblesInParallel
+    varNamesSTASH, fcstHours, doMultiHourlyMean, infile = \
+        umeps.getVarInOutFilesDetails(umeps._inDataPath_, '000_' + fpname, hr)
+    keys = []
+    for varName, varSTASH in varNamesSTASH:
+        for fhr in fcstHours:
+            # the following vars doesnt have value at 00th instantaneous
+            if not fhr and (varName, varSTASH) in [('air_temperature_maximum', 'm01s03i236'),
+                    ('air_temperature_minimum', 'm01s03i236'), ('relative_humidity', 'm01s03i245'),
+                    ('precipitation_amount', 'm01s05i226'), ('specific_humidity', 'm01s03i237'),]: continue
+            if not fhr and 'flux' in varName: continue
+            keys.append((varName, varSTASH, fhr))
+    # end of for varName, varSTASH in varNamesSTASH:
+    return keys
+# end of def _getEnsembleOutputKeys(fpname, hr):
+
+def _makeEnsembleFiles(infiles, keys):
+    # create synthetic NEPS member PP files of the keys, i.e. every variable
+    # at its forecast hours (forecast hour - 3 of the _accumulationVars_).
+    # Every member differs in data and masked points.
+    fcstHours = {}
+    for varName, varSTASH, fhr in keys:
+        if (varName, varSTASH) in umeps._accumulationVars_: fhr -= 3
+        fcstHours.setdefault((varName, varSTASH), []).append(fhr)
+    # end of for varName, varSTASH, fhr in keys:
+    for idx, infile in enumerate(infiles):
+        cubes = []
+        for vidx, ((varName, varSTASH), hours) in enumerate(sorted(fcstHours.items())):
+
+            def fieldFunc(rlats, rlons, shape):
+                data = numpy.cos(rlats * (1 + vidx)) * numpy.sin(rlons * 3.0 + 0.1 * idx)
+                data = numpy.array([data + 0.01 * t for t in range(shape[0])])
+                # masked points move over the members
+                mask = numpy.cos(rlats * 5.0 + 0.2 * idx) * numpy.cos(rlons * 5.0) > 0.8
+                return numpy.ma.masked_array(data, mask=numpy.array([mask] * shape[0]))
+            # end of def fieldFunc(rlats, rlons, shape):
+
+            # units are set by STASH while loading
+            cube = makeUMCube(varName, varSTASH, '1', _ensembleDomain_, 
+                              _ensembleRes_, sorted(hours), fieldFunc)
+            cubes.extend(cube.slices_over('time'))
+        # end of for vidx, ((varName, varSTASH), hours) in ...:
+        iris.save(cubes, infile + '.pp')
+        os.rename(infile + '.pp', infile)
+    # end of for idx, infile in enumerate(infiles):
+# end of def _makeEnsembleFiles(infiles, keys):
+
+def _loadMemberPerVariable(infile, varName, varSTASH, fhr):
+    # load the variable at fhr from the member file by its own constraints,
+    # as like packEnsembles did before every member file was read only once.
+    if (varName, varSTASH) in umeps._accumulationVars_:
+        # precipitation_amount is accumulated var, not instantaneous one.
+        fhr -= 3
+    # end of if (varName, varSTASH) in umeps._accumulationVars_:
+    loadConstraints = iris.Constraint(name=varName) & \
+                      iris.AttributeConstraint(STASH=varSTASH) & \
+                      iris.Constraint(forecast_period=fhr)
+    ensCube = getCubeData(infile, constraints=loadConstraints)
+    if not ensCube: raise ValueError("unable to extract variable %s %s %d from %s" % (varName, varSTASH, fhr, infile))
+    return ensCube[0]
+# end of def _loadMemberPerVariable(infile, varName, varSTASH, fhr):
+
+def _compareMember(oldCube, newCube):
+    # returns (no of points of different mask, max abs difference, names of
+    # the differing coords, metadata differs)
+    maskDiffers, maxDiff, _ = compareData(oldCube.data, newCube.data)
+    coordsDiffer = []
+    for coord in oldCube.coords():
+        match = newCube.coords(coord.name())
+        if not (match and numpy.array_equal(coord.points, match[0].points) and
+                numpy.array_equal(coord.bounds, match[0].bounds)):
+            coordsDiffer.append(coord.name())
+    # end of for coord in oldCube.coords():
+    metadataDiffers = (oldCube.standard_name, oldCube.long_name, str(oldCube.units),
+                       oldCube.cell_methods, str(oldCube.attributes.get('STASH'))) != \
+                      (newCube.standard_name, newCube.long_name, str(newCube.units),
+                       newCube.cell_methods, str(newCube.attributes.get('STASH')))
+    return maskDiffers, maxDiff, coordsDiffer, metadataDiffers
+# end of def _compareMember(oldCube, newCube):
+
+def checkEnsembles(opts):
+    umeps.__fcst_step_hour__ = opts['fcstStepHour']
+    fexthr = str(opts['hour']).zfill(3)
+    packDir = tempfile.mkdtemp(prefix='ensembles_%s%s_' % (opts['fpname'], fexthr),
+                                                           dir=opts['tmpPath'])
+    umeps._inDataPath_ = opts['inPath'] or packDir
+    infiles = [os.path.join(umeps._inDataPath_, str(ens).zfill(3) + '_' + 
+                   opts['fpname'] + fexthr) for ens in range(opts['members'])]
+    keys = _getEnsembleOutputKeys(opts['fpname'], opts['hour'])
+    source = opts['inPath'] or 'synthetic'
+    results = []
+    try:
+        if not opts['inPath']: _makeEnsembleFiles(infiles, keys)
+        umeps._memoryBudget_ = opts['memoryBudget']
+        # every member file is read only once for all the keys of the group
+        for group in umeps._getEnsembleOutputGroups(infiles, keys):
+            umeps._ensembleOutputs_ = umeps._allocateEnsembleOutputs(infiles, 
+                                     group, os.path.join(packDir, 'outputs'))
+            for idx, infile in list(enumerate(infiles))[1:]:
+                umeps._storeEnsembleMember((idx, infile))
+            # end of for idx, infile in ...:
+            for varName, varSTASH, fhr in group:
+                template, values, masks = umeps._ensembleOutputs_[(varName, varSTASH, fhr)]
+                memberCube = umeps._getEnsembleCube(template, values, masks, infiles)
+                maskDiffers, maxDiff, coordsDiffer, metadataDiffers = 0, 0.0, set(), []
+                for idx, infile in enumerate(infiles):
+                    oldCube = _loadMemberPerVariable(infile, varName, varSTASH, fhr)
+                    mdiff, diff, cdiff, metaDiffers = _compareMember(oldCube, memberCube[idx])
+                    maskDiffers += mdiff
+                    maxDiff = max(maxDiff, diff)
+                    coordsDiffer.update(cdiff)
+                    if metaDiffers: metadataDiffers.append(idx)
+                # end of for idx, infile in enumerate(infiles):
+                result = {'check': 'ensembles', 'source': source, 
+                          'file': opts['fpname'] + fexthr,
+                          'variable': '%s %s %d' % (varName, varSTASH, fhr),
+                          'accumulation': (varName, varSTASH) in umeps._accumulationVars_,
+                          'maskDiffers': maskDiffers, 'maxDiff': maxDiff,
+                          'coordsDiffer': sorted(coordsDiffer),
+                          'metadataDiffers': metadataDiffers,
+                          'maskedPoints': int(masks.sum()),
+                          'passed': (maskDiffers == 0 and maxDiff == 0.0 and
+                                     not coordsDiffer and not metadataDiffers)}
+                printResult(result, _nameKeys_, _valueKeys_)
+                results.append(result)
+            # end of for varName, varSTASH, fhr in group:
+            umeps._ensembleOutputs_ = {}
+            shutil.rmtree(os.path.join(packDir, 'outputs'), ignore_errors=True)
+        # end of for group in ...:
+    finally:
+        umeps._ensembleOutputs_ = {}
+        shutil.rmtree(packDir, ignore_errors=True)
+    # end of try:
+    return results
+# end of def checkEnsembles(opts):
+
+# (check, check function) in the execution order
+_checks_ = [('cummulate', checkCummulate), ('ensembles', checkEnsembles)]
+
+helpmsg = """um2grb2_paritycheck.py --checks=cummulate,ensembles --steps=8
+    --tiggefiles=/path/to/tigge_sl_*_tp.nc --inpath=/path/to/neps/date
+    --fpname=pb --hour=6 --members=45 --fcststephour=6 --tmppath=/tmp
+    --memorybudget=2 --outfile=parity.json"""
+
+if __name__ == '__main__':
+
+    opts = {'checks': [check for check, _ in _checks_], 'steps': 8,
+            'tiggeFiles': None, 'inPath': None, 'fpname': 'pb', 'hour': 6,
+            'members': umeps._ensemble_count_ + 1, 'fcstStepHour': 6,
+            'tmpPath': tempfile.gettempdir(), 'memoryBudget': None, 
+            'outFile': None}
+    parseOptions(opts, helpmsg, listOpts=('checks', 'tiggeFiles'))
+
+    print "Parity check options", opts
+    results = runChecks(_checks_, opts['checks'], opts)
+    if opts['outFile']: writeResults(results, opts['outFile'])
+    exitOnFailure(results, 'parity checks')
+# end of if __name__ == '__main__':
@@ -0,0 +1,291 @@
+"""
+This is simple script to check the regridutils engines ('sparse', 'weights')
+against iris.analysis.Linear regrid (the 'iris' regridEngine) on the data/
+sample target grids, using synthetic UM like fields. So that the regrid
+engine of the conversion can be switched from 'iris' to 'sparse' only after
+this check passes on the target grid of the user.
+
+Checks :
+    engines : regridCube of every engine vs iris Linear regrid of the same
+              field, for the extraPolateMethod 'mask', 'linear' and 'auto'.
+              The extrapolation mode of every variable is chosen as like
+              um2grb2.regridAnlFcstFiles, i.e. 'auto' takes 'linear' for the
+              precipitation variables and 'mask' for others, and the
+              _maskOverOceanVars_ (soil variables, masked over ocean by
+              land_binary_mask) are always regridded with 'mask'.
+    precision : float32 vs float64 working dtype (see um2grb2 workingDtype)
+              of every engine (including 'iris'). The field is cast by
+              um2grb2.__castToWorkingDtype__, regridded and then masked as
+              like regridAnlFcstFiles, including the soil moisture / sea ice
+              clamp (<= 1e-15 into 0) and soil temperature mask (<= 1e-15).
+              No of points where the 1e-15 threshold decision differs
+              between float32 and float64 is reported as clampDiffers.
+
+Both regridded data must have same mask and the data of unmasked points must
+be same within tolerance (fraction of the data range of the reference, i.e.
+iris regrid for engines check and float64 for precision check). The default
+precision tolerance 2**-16 is below the packing resolution of 16 bits grib2.
+
+Usage :
+    python um2grb2_regridcheck.py --checks=engines,precision \\
+            --resolutions=0.25,0.04 --grids=sample_global_0p36x0p45.grib2 \\
+            --exmodes=mask,linear,auto --engines=sparse,weights \\
+            --tolerance=1e-5 --precisiontolerance=1.5e-5 --outfile=check.json
+
+    --outfile appends the results as json lines. Exit with status 1, if any
+    check fails.
+
+Date : 18.Oct.2026
+"""
+
+import os, shutil, tempfile
+import numpy
+import iris
+from checkutils import (dataPath, makeUMCube, compareData, runChecks,
+                        printResult, parseOptions, writeResults, exitOnFailure)
+import um2grb2
+from regridutils import regridCube
+
+# (south, north, west, east) domain of the synthetic source fields
+_checkDomains_ = {'0.25': (-90.0, 90.0, 0.0, 360.0),
+                  '0.04': (5.0, 40.0, 65.0, 100.0)}
+# sample target grids of the synthetic source fields. Regional source is
+# checked against the regional grids, which partly needs extrapolation.
+_checkTargetGrids_ = {'0.25': ['sample_global_0p36x0p45.grib2',
+                               'sample_global_0p5_hysplit.grib2',
+                               'sample_global_2p5X2p5_73X144.grib2',
+                               'sample_global_751X1000.grib2',
+                               'sample_trop_15S-45N_30-120E_0p12x0p12.grib2',
+                               'sample_ind_7-38N_67-98E_0p04X0p04.grib2'],
+                      '0.04': ['sample_ind_7-38N_67-98E_0p04X0p04.grib2',
+                               'sample_ind_reg_full_0p04X0p04.grib2']}
+# (varName, varSTASH, units, kind of synthetic field)
+_checkVars_ = [('air_temperature', 'm01s16i203', 'K', 'smooth'),
+               ('precipitation_amount', 'm01s05i226', 'kg m-2', 'precip'),
+               ('moisture_content_of_soil_layer', 'm01s08i223', 'kg m-2', 'soil'),
+               ('soil_temperature', 'm01s03i238', 'K', 'soiltemp'),
+               ('sea_ice_area_fraction', 'm01s00i031', '1', 'seaice')]
+# variables whose <= 1e-15 values are set to 0 / masked after 'mask' regrid
+# (as like um2grb2.regridAnlFcstFiles)
+_clampVars_ = [('soil_moisture_content', 'm01s08i208'),
+               ('moisture_content_of_soil_layer', 'm01s08i223'),
+               ('sea_ice_area_fraction', 'm01s00i031'),
+               ('sea_ice_thickness', 'm01s00i032')]
+_maskTinyVars_ = [('soil_temperature', 'm01s03i238'),
+                  ('soil_temperature', 'm01s08i225')]
+# name and value keys of the printed results
+_nameKeys_ = ('check', 'resolution', 'grid', 'variable', 'exmode', 'engine')
+_valueKeys_ = ('maskDiffers', 'maxDiff', 'allowedDiff', 'clampDiffers')
+
+
+def _makeField(kind):
+    # returns fieldFunc (see checkutils.makeUMCube) of the kind of field.
+    # soil variables are masked over ocean (as like land_binary_mask).
+
+    def fieldFunc(rlats, rlons, shape):
+        # smooth pattern (-1 to 1) over lat, lon and slightly over time
+        pattern = numpy.cos(rlats) * numpy.sin(rlons * 3.0) + 0.3 * numpy.sin(rlats * 4.0)
+        pattern = numpy.array([numpy.roll(pattern, 3 * t, axis=-1)
+                               for t in range(shape[0])]) / 1.3
+        land = numpy.cos(rlats * 2.0) * numpy.cos(rlons * 2.0) > 0.2
+        if kind == 'smooth':
+            data = 260.0 + 30.0 * pattern
+        elif kind == 'precip':
+            # zero over the half of the domain
+            data = 20.0 * numpy.clip(pattern, 0, 1)
+        elif kind == 'soil':
+            # zero and tiny (around 1e-15) values near the dry edge
+            data = 40.0 * numpy.clip(pattern, 0, 1) ** 8
+        elif kind == 'soiltemp':
+            data = 280.0 + 15.0 * pattern
+        elif kind == 'seaice':
+            # zero below 60 deg and tiny fraction near the ice edge
+            data = numpy.clip((numpy.abs(numpy.rad2deg(rlats)) - 60.0) / 25.0, 0, 1) ** 8
+            data = data * (1.0 + 0.1 * pattern)
+        # end of if kind == 'smooth':
+        if kind in ('soil', 'soiltemp'):
+            data = numpy.ma.masked_array(data, mask=numpy.array([~land] * shape[0]))
+        return data
+    # end of def fieldFunc(rlats, rlons, shape):
+    return fieldFunc
+# end of def _makeField(kind):
+
+def _makeCheckCube(varName, varSTASH, units, kind, res, targetGrid):
+    # synthetic 6, 12 hour UM like field on the coord system of targetGrid
+    return makeUMCube(varName, varSTASH, units, _checkDomains_[res], res,
+                      [6.0, 12.0], _makeField(kind),
+                      targetGrid.coord('latitude').coord_system)
+# end of def _makeCheckCube(varName, varSTASH, units, kind, res, targetGrid):
+
+def _getExMode(varName, varSTASH, extraPolateMethod):
+    # extrapolation mode of the variable as like um2grb2.regridAnlFcstFiles
+    if (varName, varSTASH) in um2grb2._precipVars_:
+        exmode = 'linear'
+    else:
+        exmode = 'mask'
+    exmode = extraPolateMethod if extraPolateMethod != 'auto' else exmode
+    return 'mask' if varName in um2grb2._maskOverOceanVars_ else exmode
+# end of def _getExMode(varName, varSTASH, extraPolateMethod):
+
+def _regrid(cube, targetGrid, exmode, engine, cacheDir):
+    if engine == 'iris':
+        scheme = iris.analysis.Linear(extrapolation_mode=exmode)
+        return cube.regrid(targetGrid, scheme)
+    # end of if engine == 'iris':
+    regdCube = regridCube(cube, targetGrid, exmode, cacheDir=cacheDir, engine=engine)
+    if regdCube is None:
+        raise ValueError("regridCube doesnt support %s with %s" % (cube.name(), exmode))
+    return regdCube
+# end of def _regrid(cube, targetGrid, exmode, engine, cacheDir):
+
+def _targetGrids(check, opts):
+    # yields (resolution, grid file, target grid cube, fresh regrid weights
+    # cache directory) of every selected target grid.
+    for res in opts['resolutions']:
+        for gridFile in _checkTargetGrids_[res]:
+            if opts['grids'] and gridFile not in opts['grids']: continue
+            path = tempfile.mkdtemp(prefix='%s_%s_' % (check, res),
+                                                dir=opts['tmpPath'])
+            try:
+                targetGrid = iris.load_cube(os.path.join(dataPath, gridFile))
+                yield res, gridFile, targetGrid, path
+            finally:
+                shutil.rmtree(path, ignore_errors=True)
+            # end of try:
+        # end of for gridFile in _checkTargetGrids_[res]:
+    # end of for res in opts['resolutions']:
+# end of def _targetGrids(check, opts):
+
+def checkEngines(opts):
+    results = []
+    for res, gridFile, targetGrid, path in _targetGrids('engines', opts):
+        for varName, varSTASH, units, kind in _checkVars_:
+            cube = _makeCheckCube(varName, varSTASH, units, kind, res, targetGrid)
+            for extraPolateMethod in opts['exmodes']:
+                exmode = _getExMode(varName, varSTASH, extraPolateMethod)
+                refCube = _regrid(cube, targetGrid, exmode, 'iris', None)
+                for engine in opts['engines']:
+                    result = {'check': 'engines', 'resolution': res, 'grid': gridFile,
+                              'variable': varName, 'extraPolateMethod': extraPolateMethod,
+                              'exmode': exmode, 'engine': engine}
+                    try:
+                        regdCube = _regrid(cube, targetGrid, exmode, engine, path)
+                        for name in ('latitude', 'longitude'):
+                            if not numpy.allclose(regdCube.coord(name).points,
+                                                  refCube.coord(name).points):
+                                raise ValueError("%s points differ from iris" % name)
+                        # end of for name in ('latitude', 'longitude'):
+                        maskDiffers, maxDiff, allowed = compareData(refCube.data,
+                                                   regdCube.data, opts['tolerance'])
+                        result.update({'maskDiffers': maskDiffers, 'maxDiff': maxDiff,
+                                       'allowedDiff': allowed,
+                                       'passed': maskDiffers == 0 and maxDiff <= allowed})
+                    except Exception as e:
+                        result.update({'error': '%s: %s' % (e.__class__.__name__, str(e)),
+                                       'passed': False})
+                    # end of try:
+                    printResult(result, _nameKeys_, _valueKeys_)
+                    results.append(result)
+                # end of for engine in opts['engines']:
+            # end of for extraPolateMethod in opts['exmodes']:
+        # end of for varName, varSTASH, units, kind in _checkVars_:
+    # end of for res, gridFile, targetGrid, path in ...:
+    return results
+# end of def checkEngines(opts):
+
+def _maskAsUM2GRB2(regdCube, varName, varSTASH, exmode):
+    # clamp and mask the regridded data in working dtype as like
+    # um2grb2.regridAnlFcstFiles. Returns (data, tiny) where tiny is True
+    # for the points which are <= 1e-15 (before clamp / mask).
+    data = regdCube.data
+    if (varName, varSTASH) in um2grb2._precipVars_:
+        data[data < 0.0] = 0.0
+    tiny = numpy.ma.getdata(data) <= 1e-15
+    if exmode == 'mask':
+        data = numpy.ma.masked_array(data, dtype=um2grb2._workingDtype_,
+                                                   fill_value=9.999e+20)
+        if (varName, varSTASH) in _clampVars_:
+            data[data <= 1e-15] = 0.0
+            data[data < 0.0] = 0.0
+        elif (varName, varSTASH) in _maskTinyVars_:
+            data = numpy.ma.masked_less_equal(data, 1e-15)
+    # end of if exmode == 'mask':
+    return data, tiny
+# end of def _maskAsUM2GRB2(regdCube, varName, varSTASH, exmode):
+
+def checkPrecision(opts):
+    results = []
+    for res, gridFile, targetGrid, path in _targetGrids('precision', opts):
+        for varName, varSTASH, units, kind in _checkVars_:
+            cube = _makeCheckCube(varName, varSTASH, units, kind, res, targetGrid)
+            for extraPolateMethod in opts['exmodes']:
+                exmode = _getExMode(varName, varSTASH, extraPolateMethod)
+                for engine in ['iris'] + opts['engines']:
+                    result = {'check': 'precision', 'resolution': res, 'grid': gridFile,
+                              'variable': varName, 'extraPolateMethod': extraPolateMethod,
+                              'exmode': exmode, 'engine': engine}
+                    try:
+                        masked = {}
+                        for dtype in ('float64', 'float32'):
+                            um2grb2._workingDtype_ = dtype
+                            tmpCube = cube.copy()
+                            um2grb2.__castToWorkingDtype__(tmpCube)
+                            regdCube = _regrid(tmpCube, targetGrid, exmode, engine, path)
+                            result['%sRegriddedDtype' % dtype] = str(regdCube.dtype)
+                            masked[dtype] = _maskAsUM2GRB2(regdCube, varName, varSTASH, exmode)
+                        # end of for dtype in ('float64', 'float32'):
+                        (data64, tiny64), (data32, tiny32) = masked['float64'], masked['float32']
+                        maskDiffers, maxDiff, allowed = compareData(data64, data32,
+                                                       opts['precisionTolerance'])
+                        valid = ~(numpy.ma.getmaskarray(data64) | numpy.ma.getmaskarray(data32))
+                        clampDiffers = int((tiny64 != tiny32)[valid].sum())
+                        result.update({'maskDiffers': maskDiffers, 'maxDiff': maxDiff,
+                                       'allowedDiff': allowed, 'clampDiffers': clampDiffers,
+                                       'passed': maskDiffers == 0 and maxDiff <= allowed})
+                    except Exception as e:
+                        result.update({'error': '%s: %s' % (e.__class__.__name__, str(e)),
+                                       'passed': False})
+                    finally:
+                        # restore the default working dtype
+                        um2grb2._workingDtype_ = 'float32'
+                    # end of try:
+                    printResult(result, _nameKeys_, _valueKeys_)
+                    results.append(result)
+                # end of for engine in ['iris'] + opts['engines']:
+            # end of for extraPolateMethod in opts['exmodes']:
+        # end of for varName, varSTASH, units, kind in _checkVars_:
+    # end of for res, gridFile, targetGrid, path in ...:
+    return results
+# end of def checkPrecision(opts):
+
+# (check, check function) in the execution order
+_checks_ = [('engines', checkEngines), ('precision', checkPrecision)]
+
+helpmsg = """um2grb2_regridcheck.py --checks=engines,precision --resolutions=0.25,0.04
+    --grids=sample_global_0p36x0p45.grib2 --exmodes=mask,linear,auto
+    --engines=sparse,weights --tolerance=1e-5 --precisiontolerance=1.5e-5
+    --tmppath=/tmp --outfile=check.json"""
+
+if __name__ == '__main__':
+
+    opts = {'checks': [check for check, _ in _checks_],
+            'resolutions': ['0.25', '0.04'], 'grids': None,
+            'exmodes': ['mask', 'linear', 'auto'], 'engines': ['sparse', 'weights'],
+            'tolerance': 1e-5, 'precisionTolerance': 2.0 ** -16,
+            'tmpPath': tempfile.gettempdir(), 'outFile': None}
+    parseOptions(opts, helpmsg, listOpts=('checks', 'resolutions', 'grids',
+                                          'exmodes', 'engines'))
+    for res in opts['resolutions']:
+        if res not in _checkDomains_:
+            raise ValueError("resolutions must be any of %s" % _checkDomains_.keys())
+    # end of for res in opts['resolutions']:
+    for exmode in opts['exmodes']:
+        if exmode not in ('mask', 'linear', 'auto'):
+            raise ValueError("exmodes must be any of 'mask', 'linear', 'auto'")
+    # end of for exmode in opts['exmodes']:
+
+    print "Regrid check options", opts
+    results = runChecks(_checks_, opts['checks'], opts)
+    if opts['outFile']: writeResults(results, opts['outFile'])
+    exitOnFailure(results, 'regrid checks')
+# end of if __name__ == '__main__':
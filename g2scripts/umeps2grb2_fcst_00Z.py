@@ -20,7 +20,9 @@ from loadconfigure import inPath, outPath, tmpPath, date, loadg2utils, \
                  start_long_fcst_hour, fcst_step_hour, grib1FilesNameSuffix, \
                  removeGrib2FilesAfterGrib1FilesCreated, pressureLevels, \
                  callBackScript, setGrib2TableParameters, targetGridFile, \
-                 fillFullyMaskedVars, extraPolateMethod, wgrib2Arguments
+                 fillFullyMaskedVars, extraPolateMethod, wgrib2Arguments, \
+                 regridInSlabs, workingDtype, cacheRegridWeights, regridEngine, \
+                 memoryBudget
 
 if loadg2utils == 'system':
     # Load g2utils from system python which has installed through setup.py
@@ -99,6 +101,11 @@ while sDay <= eDay:
                        overwrite=overwriteFiles, lprint=debug,
               setGrib2TableParameters=setGrib2TableParameters,
                               wgrib2Arguments=wgrib2Arguments,
+                                  regridInSlabs=regridInSlabs,
+                                    workingDtype=workingDtype,
+                        cacheRegridWeights=cacheRegridWeights,
+                                    regridEngine=regridEngine,
+                                    memoryBudget=memoryBudget,
                                 callBackScript=callBackScript)
     print "Time lag incremented by 1"
     sDay += lag
@@ -0,0 +1,186 @@
+"""
+GrADS ctl files from the write-time grib2 message metadata.
+
+g2ctl.pl (and grib2ctl.pl for grib1 files) scans the whole out file by
+wgrib2 (wgrib) to create the ctl file, for every out file. But all the out
+files of a cycle share few structures (variables, levels, grid), and the ctl
+files of same structure differs only by its file name and tdef. So the keys
+of every message which decides the GrADS variable, level, grid and time are
+collected (by getMessageKeys) while the messages are written into the out
+file. The ctl file created by g2ctl.pl for the first out file of each
+structure is kept as template and the ctl files of the remaining out files
+are rendered from it by replacing the file name and tdef from the collected
+keys, without forking g2ctl.pl / wgrib2 again.
+
+The GrADS index (idx) file is binary and its layout is specific to the
+GrADS version, so it is still created by gribmap from the ctl file.
+"""
+
+import os, json, hashlib, datetime, subprocess
+import gribapi
+
+# keys which decides the GrADS variable, level and grid of the message
+_structureKeys_ = ('discipline', 'parameterCategory', 'parameterNumber',
+    'productDefinitionTemplateNumber', 'typeOfStatisticalProcessing',
+    'typeOfFirstFixedSurface', 'scaleFactorOfFirstFixedSurface',
+    'scaledValueOfFirstFixedSurface', 'typeOfSecondFixedSurface',
+    'scaleFactorOfSecondFixedSurface', 'scaledValueOfSecondFixedSurface',
+    'perturbationNumber', 'gridDefinitionTemplateNumber', 'Ni', 'Nj',
+    'latitudeOfFirstGridPoint', 'longitudeOfFirstGridPoint',
+    'latitudeOfLastGridPoint', 'longitudeOfLastGridPoint')
+# keys of reference time and verification (end of statistical process) time
+_timeKeys_ = ('dataDate', 'dataTime', 'validityDate', 'validityTime')
+# GrADS month abbreviations (independent of locale)
+_months_ = ('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep',
+            'oct', 'nov', 'dec')
+
+
+def getMessageKeys(gid):
+    """
+    :param gid: gribapi grib2 message id (before it is released).
+    :return: (structure, times) keys of the message, which are small enough
+             to be collected for all the messages of the out file.
+    """
+    structure = tuple(gribapi.grib_get_long(gid, key)
+                      if gribapi.grib_is_defined(gid, key) else None
+                      for key in _structureKeys_)
+    times = tuple(gribapi.grib_get_long(gid, key) for key in _timeKeys_)
+    return structure, times
+# end of def getMessageKeys(gid):
+
+
+def _getTimes(messageKeys, idx):
+    # idx 0 for reference times and 2 for verification times
+    return sorted(set(datetime.datetime.strptime('%08d%04d' % (times[idx], times[idx+1]),
+                      '%Y%m%d%H%M') for structure, times in messageKeys))
+# end of def _getTimes(messageKeys, idx):
+
+
+def _parseGradsTime(gtime):
+    # 'HH[:MM]Zddmmmyyyy' into datetime
+    hhmm, dmy = gtime.lower().split('z')
+    hour, minute = (hhmm.split(':') + ['0'])[:2] if hhmm else ('0', '0')
+    month = _months_.index(dmy[-7:-4]) + 1
+    return datetime.datetime(int(dmy[-4:]), month, int(dmy[:-7]),
+                             int(hour), int(minute))
+# end of def _parseGradsTime(gtime):
+
+
+def _formatGradsTime(dtime):
+    # datetime into 'HH[:MM]Zddmmmyyyy'
+    gtime = '%02d' % dtime.hour
+    if dtime.minute: gtime += ':%02d' % dtime.minute
+    return gtime + 'Z%02d%s%04d' % (dtime.day, _months_[dtime.month-1], dtime.year)
+# end of def _formatGradsTime(dtime):
+
+
+def getStructureSignature(messageKeys, ctlCmd):
+    """
+    :param messageKeys: list of getMessageKeys of all the messages.
+    :param ctlCmd: g2ctl.pl / grib2ctl.pl command list without data path.
+    :return: signature of the GrADS structure of the out file.
+    """
+    structures = sorted(set(structure for structure, times in messageKeys))
+    return hashlib.md5(json.dumps([structures, ctlCmd])).hexdigest()
+# end of def getStructureSignature(messageKeys, ctlCmd):
+
+
+def saveCtlTemplate(templatePath, ctlpath, datapath, messageKeys):
+    # keep the ctl file (created by g2ctl.pl) along with its data path and
+    # the first reference, verification time to render the other ctl files.
+    with open(ctlpath) as ctlfile:
+        ctl = ctlfile.read()
+    if not [line for line in ctl.splitlines() if line.lower().startswith('tdef')]:
+        print "WARNING : no tdef in %s. So not keeping it as ctl template" % ctlpath
+        return
+    # end of if not [...]:
+    template = {'datapath': datapath, 'ctl': ctl,
+                'refTime': _formatGradsTime(_getTimes(messageKeys, 0)[0]),
+                'verfTime': _formatGradsTime(_getTimes(messageKeys, 2)[0])}
+    tmppath = '%s.%d.tmp' % (templatePath, os.getpid())
+    with open(tmppath, 'w') as tfile:
+        json.dump(template, tfile)
+    os.rename(tmppath, templatePath)
+# end of def saveCtlTemplate(templatePath, ctlpath, datapath, messageKeys):
+
+
+def renderCtlFile(templatePath, ctlpath, datapath, messageKeys, tstepHour):
+    """
+    Render the ctl file of datapath from the ctl template by replacing the
+    data path (dset, index, title) and tdef (from the message keys).
+    The tdef of template tells that either verification time or reference
+    time is used by g2ctl.pl (as per its options), same will be used here.
+    """
+    with open(templatePath) as tfile:
+        template = json.load(tfile)
+
+    oldpath = template['datapath']
+    oldname = os.path.basename(oldpath)
+    lines = []
+    for line in template['ctl'].splitlines():
+        if line.lower().startswith('tdef'):
+            ntimes, start, incr = line.split()[1], line.split()[3], line.split()[4]
+            start = _parseGradsTime(start)
+            if start == _parseGradsTime(template['verfTime']):
+                times = _getTimes(messageKeys, 2)
+            else:
+                # reference time (analysis) and its offset in template
+                offset = start - _parseGradsTime(template['refTime'])
+                times = [t + offset for t in _getTimes(messageKeys, 0)]
+            # end of if start == ...:
+            ntimes = int((times[-1] - times[0]).total_seconds() / 3600. / tstepHour) + 1
+            if ntimes > 1: incr = '%dhr' % tstepHour
+            line = 'tdef %d linear %s %s' % (ntimes, _formatGradsTime(times[0]), incr)
+        elif oldpath in line:
+            line = line.replace(oldpath, datapath)
+        else:
+            line = line.replace(oldname, os.path.basename(datapath))
+        # end of if line.lower().startswith('tdef'):
+        lines.append(line)
+    # end of for line in template['ctl'].splitlines():
+
+    tmppath = ctlpath + '.tmp'
+    with open(tmppath, 'w') as ctlfile:
+        ctlfile.write('\n'.join(lines) + '\n')
+    os.rename(tmppath, ctlpath)
+# end of def renderCtlFile(templatePath, ctlpath, datapath, messageKeys, tstepHour):
+
+
+def createCtlFile(datapath, ctlCmd, messageKeys, tstepHour, templateDir):
+    """
+    Create the ctl file (datapath + '.ctl') of datapath. If ctl template of
+    same structure is available in templateDir, then the ctl file is rendered
+    from it. Otherwise ctlCmd (g2ctl.pl / grib2ctl.pl) is executed and its
+    ctl file is kept as template for the other out files.
+
+    :param datapath: grib2 / grib1 out file path.
+    :param ctlCmd: g2ctl.pl / grib2ctl.pl command list without data path.
+                   say [g2ctl, '-ts6hr', '-verf'].
+    :param messageKeys: list of getMessageKeys of all the messages, which
+                        are collected while writing datapath. None or empty
+                        list executes ctlCmd always.
+    :param tstepHour: time step hour of the tdef.
+    :param templateDir: directory (already exists) to keep the ctl templates.
+    :return: True if ctl file is rendered from template, False if it is
+             created by ctlCmd.
+    """
+    ctlpath = datapath + '.ctl'
+    templatePath = None
+    if messageKeys:
+        templatePath = os.path.join(templateDir,
+                   getStructureSignature(messageKeys, ctlCmd) + '.json')
+        if os.path.isfile(templatePath):
+            try:
+                renderCtlFile(templatePath, ctlpath, datapath, messageKeys, tstepHour)
+                return True
+            except Exception as e:
+                print "WARNING : Unable to render ctl file from template", e
+            # end of try:
+        # end of if os.path.isfile(templatePath):
+    # end of if messageKeys:
+
+    with open(ctlpath, 'w') as ctlfile:
+        subprocess.call(ctlCmd + [datapath], stdout=ctlfile)
+    if templatePath: saveCtlTemplate(templatePath, ctlpath, datapath, messageKeys)
+    return False
+# end of def createCtlFile(datapath, ctlCmd, messageKeys, tstepHour, templateDir):
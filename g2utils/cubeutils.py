@@ -1,5 +1,34 @@
 import numpy, iris  
 
+def _getTimeDim(cube):
+    # returns the data dimension of forecast_period, if only the time and
+    # forecast_period coords are spanning on it and its points are unique. 
+    # So that it can be reduced by single numpy call. Otherwise None.
+    fcstAx = cube.coord('forecast_period')
+    tdims = cube.coord_dims(fcstAx)
+    if len(tdims) != 1 or len(set(fcstAx.points)) != len(fcstAx.points): return None
+    for coord in cube.coords():
+        if coord.name() in ('time', 'forecast_period'): continue
+        if tdims[0] in cube.coord_dims(coord): return None
+    # end of for coord in cube.coords():
+    return tdims[0]
+# end of def _getTimeDim(cube):
+
+def _maskAlongAxis(result, data, axis):
+    # Masked point of any slice along axis gets masked in the result (same 
+    # as adding the masked arrays of every slice).
+    if not numpy.ma.isMaskedArray(data): return result
+    return numpy.ma.masked_array(result, fill_value=data.fill_value,
+                        mask=numpy.ma.getmaskarray(data).any(axis=axis))
+# end of def _maskAlongAxis(result, data, axis):
+
+def _reduceAlongAxis(data, axis, action):
+    # sum / mean of data along axis.
+    total = numpy.ma.filled(data, 0).sum(axis=axis)
+    if action == 'mean': total = total / float(data.shape[axis])
+    return _maskAlongAxis(total, data, axis)
+# end of def _reduceAlongAxis(data, axis, action):
+
 def cubeAverager(tmpCube, action='mean', dt='1 hour', 
                 actionIntervals='6 hour', tpoint='cbound', fpoint='cbound',
                 tbounds=True, fbounds=True):
@@ -16,41 +45,64 @@ def cubeAverager(tmpCube, action='mean', dt='1 hour',
                         averaged or summed.
     Arulalan.T
     16-Nov-2015    
+    
+    If forecast_period is a data dimension (spanned by time coord only), 
+    then all the time points are reduced by single numpy sum along that 
+    dimension (fast path), instead of extracting and adding every time point
+    cube.
     """
 
+    if action not in ('mean', 'sum'):
+        raise ValueError('argument "%s" not support' % action)
     # extract time points 
     tpoints = tmpCube.coord('forecast_period').points
-    # assign first time point data to mean data 
-    meanCube = tmpCube.extract(iris.Constraint(forecast_period=tpoints[0]))
-    # get the time coord of first time cube and set to mean
-    timeAxFirst = meanCube.coords('time')[0]
-    # get the fcst time coord of first time cube and set to mean
-    fcstAxFirst = meanCube.coords('forecast_period')[0]
-    
-    # loop through remaining time points 
-    for tp in tpoints[1:]:
-        # extract remaining time points and add to meanCube
-        lastCube = tmpCube.extract(iris.Constraint(forecast_period=tp))
-        meanCube = iris.analysis.maths.add(meanCube, lastCube) 
-    # end of for tp in tpoints[1:]:
-    
-    # get the time coord of last time cube and set to mean
-    timeAxLast = lastCube.coords('time')[0]
-    # get the fcst time coord of last time cube and set to mean
-    fcstAxLast = tmpCube[-1].coords('forecast_period')[0]
+    tdim = _getTimeDim(tmpCube)
+    if tdim is not None:
+        # get the time, fcst time coords of first and last time points
+        timeAx = tmpCube.coords('time')[0]
+        fcstAx = tmpCube.coords('forecast_period')[0]
+        timeAxFirst, timeAxLast = timeAx[0], timeAx[-1]
+        fcstAxFirst, fcstAxLast = fcstAx[0], fcstAx[-1]
+        # first time point cube (without time coords) holds the mean data
+        slicer = [slice(None)] * tmpCube.ndim
+        slicer[tdim] = 0
+        meanCube = tmpCube[tuple(slicer)]
+        meanCube.remove_coord('time')
+        meanCube.remove_coord('forecast_period')
+        meanCube.data = _reduceAlongAxis(tmpCube.data, tdim, action)
+    else:
+        # assign first time point data to mean data 
+        meanCube = tmpCube.extract(iris.Constraint(forecast_period=tpoints[0]))
+        # get the time coord of first time cube and set to mean
+        timeAxFirst = meanCube.coords('time')[0]
+        # get the fcst time coord of first time cube and set to mean
+        fcstAxFirst = meanCube.coords('forecast_period')[0]
+        
+        # loop through remaining time points 
+        for tp in tpoints[1:]:
+            # extract remaining time points and add to meanCube
+            lastCube = tmpCube.extract(iris.Constraint(forecast_period=tp))
+            meanCube = iris.analysis.maths.add(meanCube, lastCube) 
+        # end of for tp in tpoints[1:]:
+        
+        # get the time coord of last time cube and set to mean
+        timeAxLast = lastCube.coords('time')[0]
+        # get the fcst time coord of last time cube and set to mean
+        fcstAxLast = tmpCube[-1].coords('forecast_period')[0]
+        
+        if action == 'mean':
+            # to compute mean value of meanCube divide it by length of time
+            # points which we added before 
+            meanCube = iris.analysis.maths.divide(meanCube, float(len(tpoints)))
+    # end of if tdim is not None:
     
     if action == 'mean':
-        # to compute mean value of meanCube divide it by length of time
-        # points which we added before 
-        meanCube = iris.analysis.maths.divide(meanCube, float(len(tpoints)))
         print "Converted cube to %s mean : %s" % (actionIntervals, tmpCube.standard_name)
     elif action == 'sum':
         # for sum action, we no need to do here anything, because already 
         # we computed accumulation only!
         print "Converted cube to %s accumulation : %s" % (actionIntervals, tmpCube.standard_name)
-    else:
-        raise ValueError('argument "%s" not support' % action)
-    # end of if not isAccumulation:
+    # end of if action == 'mean':
 
     # get the reference time bounds and time points from two extremes    
     rbounds = [timeAxFirst.bounds[0][0], timeAxLast.bounds[-1][-1]]
@@ -162,12 +214,100 @@ def cubeAddSubtractor(cube, otherCube, action, standard_name=None,
     return resultant
 # end of def cubeAddSubtractor(...):
 
+def _timeSliceData(cube, idx):
+    # data of idx time point (first dimension) without slicing the cube
+    # (i.e. without copying its coords & metadata).
+    if not cube.has_lazy_data(): return cube.data[idx]
+    data = cube.lazy_data()[idx].masked_array()
+    if not numpy.ma.count_masked(data): data = data.data
+    return data
+# end of def _timeSliceData(cube, idx):
+
+def _cummulatedTimeCoord(coord, firstCoord):
+    # coord with bounds from start of firstCoord to end of coord and its 
+    # center as point
+    bounds = [firstCoord.bounds[0][0], coord.bounds[-1][-1]]
+    coord.points = [bounds[0] + ((bounds[-1] - bounds[0]) / 2.0)]
+    coord.bounds = bounds
+    return coord
+# end of def _cummulatedTimeCoord(coord, firstCoord):
+
+def _cubeCummulatorInPlace(cubes, sname, lname, unit, attr, cm, 
+                                                  addZerosFirstCube):
+    # cubeCummulator with one running sum buffer (updated in place) and one
+    # cube template, whose data & time coords are updated for every time.
+    template = cubes[0]
+    template.standard_name = sname
+    template.long_name = lname
+    template.units = unit
+    template.attributes = attr
+    template.cell_methods = (cm,)
+    
+    timeAx = cubes.coords('time')[0]
+    fcstAx = cubes.coords('forecast_period')[0]
+    timeAxFirst, fcstAxFirst = timeAx[0], fcstAx[0]
+    
+    first = _timeSliceData(cubes, 0)
+    # running sum buffer and its mask
+    values = numpy.zeros(first.shape, first.dtype)
+    mask = numpy.ma.nomask
+    
+    if addZerosFirstCube:
+        # zero bounds of the first time
+        for coord, firstAx in [(timeAx[0], timeAxFirst), (fcstAx[0], fcstAxFirst)]:
+            coord.points = [firstAx.bounds[0][0]]
+            coord.bounds = [firstAx.bounds[0][0], firstAx.bounds[0][0]]
+            template.replace_coord(coord)
+        # end of for coord, firstAx in [...]:
+        # first cube filled with zeros (for TIGGE cummulate standard)
+        template.data = numpy.ma.masked_array(values, fill_value=9.999e+20)
+        # yeilding zeros cube 
+        yield template
+    # end of if addZerosFirstCube:
+    
+    values[...] = numpy.ma.getdata(first)
+    if numpy.ma.isMaskedArray(first): mask = numpy.ma.getmaskarray(first).copy()
+    del first
+    template.replace_coord(timeAxFirst)
+    template.replace_coord(fcstAxFirst)
+    template.data = values
+    if mask is not numpy.ma.nomask:
+        template.data = numpy.ma.masked_array(values, mask=mask, fill_value=9.999e+20)
+    # yielding first cube 
+    yield template
+    
+    for idx in range(1, timeAx.shape[0], 1):
+        # loop through over time index from second time onwards and add it
+        # into the running sum
+        data = _timeSliceData(cubes, idx)
+        values += numpy.ma.getdata(data)
+        if numpy.ma.isMaskedArray(data):
+            if mask is numpy.ma.nomask: 
+                mask = numpy.ma.getmaskarray(data).copy()
+            else:
+                mask |= numpy.ma.getmaskarray(data)
+        # end of if numpy.ma.isMaskedArray(data):
+        template.replace_coord(_cummulatedTimeCoord(timeAx[idx], timeAxFirst))
+        template.replace_coord(_cummulatedTimeCoord(fcstAx[idx], fcstAxFirst))
+        template.data = values
+        if mask is not numpy.ma.nomask:
+            template.data = numpy.ma.masked_array(values, mask=mask, fill_value=9.999e+20)
+        # yeilding contious time-cummulated cubes
+        yield template
+    # end of for idx in range(1, timeAx.shape[0], 1):
+# end of def _cubeCummulatorInPlace(...):
+
 def cubeCummulator(cubes, standard_name=None, long_name=None, unit=None,
-                    removeSTASH=False, addZerosFirstCube=True):
+                    removeSTASH=False, addZerosFirstCube=True, inPlace=False):
     '''
     cubeCummulator : It cummulate the data over time from starting cube.
     addZerosFirstCube : True | False. It does add zeros cubes begining of the 
       cummulated cubes (For the tigge purpose).
+    inPlace : True | False. True keeps one running sum buffer (updated in 
+      place) and yields the same cube template (its data is view of the 
+      buffer and time coords are updated) for every time. So the yielded 
+      cube must be used (say saved into grib2 file) before taking the next
+      one from the generator. False creates new cube for every time.
     Return : Generators | Yields the cummulated cubes
     
     Arulalan.T
@@ -188,6 +328,13 @@ def cubeCummulator(cubes, standard_name=None, long_name=None, unit=None,
     cm = iris.coords.CellMethod('sum', ('time',), intervals=('1 hour',), 
                      comments=(' accumulation',))
     
+    if inPlace:
+        for cube in _cubeCummulatorInPlace(cubes, sname, lname, unit, attr,
+                                               cm, addZerosFirstCube):
+            yield cube
+        return
+    # end of if inPlace:
+    
     precube.cell_methods = (cm,)
     precube.standard_name = sname
     precube.long_name = lname
@@ -289,32 +436,27 @@ def cubeRealizationAverager(tmpCube, action='mean', dr='1 ENS'):
 
     # extract realization points 
     rpoints = tmpCube.coord('realization').points
-    # get the time coord of first time cube and set to mean
-    timeAxFirst = tmpCube.coords('time')[0]
-    fcstAxFirst = tmpCube.coords('forecast_period')[0]
-    # assign first realization point data to mean data 
-    meanCube = tmpCube.extract(iris.Constraint(realization=rpoints[0]))
-    if meanCube.has_lazy_data():
-        print "Loaded", meanCube.standard_name, "into memory",
-        ## By accessing meanCube.data (even for printing), the full 
+    rdims = tmpCube.coord_dims(tmpCube.coord('realization'))
+    if tmpCube.has_lazy_data():
+        print "Loaded", tmpCube.standard_name, "into memory",
+        ## By accessing tmpCube.data (even for printing), the full 
         ## data has been loaded into memory instead of being lazy 
         ## data. Otherwise while making average over realization it gets filled
         ## with 1e+20. So it is must one.
-        print "- min", meanCube.data.min(), "max", meanCube.data.max(),
-        print "has_lazy_data =", meanCube.has_lazy_data()
+        print "- min", tmpCube.data.min(), "max", tmpCube.data.max(),
+        print "has_lazy_data =", tmpCube.has_lazy_data()
     # end of if tmpCube.has_lazy_data():
 
-    # loop through remaining realization points 
-    for rp in rpoints[1:]:
-        # extract remaining realization points and add to meanCube
-        lastCube = tmpCube.extract(iris.Constraint(realization=rp))
-        meanCube = iris.analysis.maths.add(meanCube, lastCube) 
-    # end of for rp in rpoints[1:]:
+    # reduce all the realization points by single numpy sum along 
+    # realization dimension, instead of extracting and adding every member.
+    if rdims:
+        data = _reduceAlongAxis(tmpCube.data, rdims[0], action)
+    else:
+        # single member with scalar realization coord
+        data = tmpCube.data
+    # end of if rdims:
     
     if action == 'mean':
-        # to compute mean value of meanCube divide it by length of time
-        # points which we added before 
-        meanCube = iris.analysis.maths.divide(meanCube, float(len(rpoints)))
         print "Converting cube to realization mean : %s" % (tmpCube.standard_name)
     elif action == 'sum':
         # for sum action, we no need to do here anything, because already 
@@ -331,7 +473,7 @@ def cubeRealizationAverager(tmpCube, action='mean', dr='1 ENS'):
         cm = iris.coords.CellMethod('sum', ('realization',), intervals=(dr,), 
                                      comments=('accumulation of (1 control run + %d ensemble members)' % (len(rpoints)-1)))
         
-    meanCube = iris.cube.Cube(data=meanCube.data, 
+    meanCube = iris.cube.Cube(data=data, 
                        units=tmpCube.units, 
                        standard_name=tmpCube.standard_name, 
                        long_name=tmpCube.long_name, 
@@ -360,3 +502,140 @@ def cubeRealizationAverager(tmpCube, action='mean', dr='1 ENS'):
     # return mean cube 
     return meanCube
 # end of def cubeRealizationAverager(...):
+
+# cell method (over realization) of the ensemble statistics
+_realizationStatistics_ = {'mean': 'mean', 'std': 'standard_deviation', 
+                            'min': 'minimum', 'max': 'maximum'}
+
+def _percentilesOfSorted(sortedData, percentiles, axis):
+    # linear interpolation between the closest ranks of the sorted members
+    # (same as numpy.percentile), for all the percentiles from single sort.
+    nmembers = sortedData.shape[axis]
+    for pc in percentiles:
+        rank = pc / 100.0 * (nmembers - 1)
+        lower = int(numpy.floor(rank))
+        upper = min(lower + 1, nmembers - 1)
+        low = sortedData.take(lower, axis=axis)
+        high = sortedData.take(upper, axis=axis)
+        yield low + (high - low) * (rank - lower)
+    # end of for pc in percentiles:
+# end of def _percentilesOfSorted(sortedData, percentiles, axis):
+
+def cubeRealizationStatistics(tmpCube, stats=('mean',), percentiles=(), 
+                                            thresholds=(), dr='1 ENS'):
+    """
+    :param tmpCube: The temporary cube data (in Iris format) with 
+                    realization dimension.
+    :param stats: ensemble statistics among 'mean', 'std' (spread i.e. 
+                  standard deviation of all members), 'min', 'max'.
+    :param percentiles: percentiles (0 to 100) of the members.
+    :param thresholds: probability (%) of members exceeding (>) the 
+                       thresholds (in units of tmpCube).
+    :param dr: A standard string representing realization step intervals.
+    
+    :return: CubeList of the statistics cubes (in order of stats, 
+             percentiles and then thresholds) without realization coord.
+
+    All the statistics are computed from the (realization, ...) array of
+    tmpCube in one go (members are sorted once for min, max, percentiles)
+    instead of extracting every member. Masked point of any member gets
+    masked in all the statistics. 
+    
+    Every statistics cube has realization cell method ('mean', 
+    'standard_deviation', 'minimum', 'maximum', 'percentile', 'probability')
+    before the cell methods of tmpCube, and 'ensemble_members' attribute. 
+    Percentile cube has 'percentile_over_realization' scalar coord and 
+    probability cube has 'threshold' scalar coord with '%' units. 
+    getRealizationStatistic gives these details of the cube, which are used
+    to set the ensemble derived / percentile / probability product 
+    definition templates (4.2 / 4.6 / 4.5 and its time interval templates 
+    4.12 / 4.10 / 4.9) of the grib2 message.
+    """
+    
+    for stat in stats:
+        if stat not in _realizationStatistics_:
+            raise ValueError('argument "%s" not support' % stat)
+    # end of for stat in stats:
+    rdim = tmpCube.coord_dims(tmpCube.coord('realization'))[0]
+    nmembers = tmpCube.shape[rdim]
+    data = tmpCube.data
+    values = numpy.ma.filled(data, 0)
+    
+    # first realization point cube (without realization) as template
+    slicer = [slice(None)] * tmpCube.ndim
+    slicer[rdim] = 0
+    template = tmpCube[tuple(slicer)]
+    template.remove_coord('realization')
+    template.attributes['ensemble_members'] = nmembers
+    comments = '(1 control run + %d ensemble members)' % (nmembers - 1)
+    
+    def statCube(result, method, units=None, coord=None):
+        # keep the float dtype (say float32) of members
+        if values.dtype.kind == 'f': result = result.astype(values.dtype, copy=False)
+        cube = template.copy(data=_maskAlongAxis(result, data, rdim))
+        cm = iris.coords.CellMethod(method, ('realization',), intervals=(dr,),
+                                    comments=('%s of %s' % (method, comments)))
+        cube.cell_methods = (cm,) + tmpCube.cell_methods
+        if units is not None: cube.units = units
+        if coord is not None: cube.add_aux_coord(coord)
+        print "Converted cube to realization %s : %s" % (method, tmpCube.standard_name)
+        return cube
+    # end of def statCube(result, method, units=None, coord=None):
+    
+    statCubes = iris.cube.CubeList()
+    mean = None
+    if 'mean' in stats or 'std' in stats:
+        mean = values.mean(axis=rdim)
+    sortedData = None
+    if percentiles or 'min' in stats or 'max' in stats:
+        sortedData = numpy.sort(values, axis=rdim)
+    
+    for stat in stats:
+        if stat == 'mean':
+            result = mean
+        elif stat == 'std':
+            result = numpy.sqrt(((values - numpy.expand_dims(mean, rdim))**2).mean(axis=rdim))
+        elif stat == 'min':
+            result = sortedData.take(0, axis=rdim)
+        elif stat == 'max':
+            result = sortedData.take(-1, axis=rdim)
+        # end of if stat == 'mean':
+        statCubes.append(statCube(result, _realizationStatistics_[stat]))
+    # end of for stat in stats:
+    
+    for pc, result in zip(percentiles, _percentilesOfSorted(sortedData, 
+                                                     percentiles, rdim)):
+        coord = iris.coords.AuxCoord(pc, long_name='percentile_over_realization', units='%')
+        statCubes.append(statCube(result, 'percentile', coord=coord))
+    # end of for pc, result in zip(...):
+    
+    for threshold in thresholds:
+        result = (values > threshold).sum(axis=rdim) * (100.0 / nmembers)
+        coord = iris.coords.AuxCoord(threshold, long_name='threshold', units=tmpCube.units)
+        statCubes.append(statCube(result, 'probability', units='%', coord=coord))
+    # end of for threshold in thresholds:
+    
+    return statCubes
+# end of def cubeRealizationStatistics(...):
+
+def getRealizationStatistic(cube):
+    """
+    :param cube: statistics cube of cubeRealizationStatistics.
+    :return: (method, value, nmembers) of the realization cell method, where
+             value is percentile of 'percentile' method, threshold of 
+             'probability' method and None for others. 
+             None, if cube is not created by cubeRealizationStatistics.
+    """
+    if 'ensemble_members' not in cube.attributes: return None
+    for cm in cube.cell_methods:
+        if cm.coord_names != ('realization',): continue
+        value = None
+        if cm.method == 'percentile':
+            value = cube.coord('percentile_over_realization').points[0]
+        elif cm.method == 'probability':
+            value = cube.coord('threshold').points[0]
+        # end of if cm.method == 'percentile':
+        return cm.method, value, int(cube.attributes['ensemble_members'])
+    # end of for cm in cube.cell_methods:
+    return None
+# end of def getRealizationStatistic(cube):
@@ -0,0 +1,475 @@
+"""
+Bilinear regrid of iris cubes with cached interpolation weights.
+
+iris.analysis.Linear recomputes its index/weight tables for every call, even
+though the source (model) grid and target grid are the same for all the
+variables, forecast hours and cycles. Here we compute the bilinear weights
+of the source -> target grid only once, store it in a numpy npz file under
+the cache directory (say tmpPath/regridWeights) and reuse it across the
+processes and across the daily cycles.
+
+The weights are keyed by source grid signature (latitude, longitude points
+and longitude circular flag), target grid points and extrapolation mode.
+
+The weights can be applied either as scipy.sparse operator ('sparse' engine),
+which regrids the whole stacked (time, level, lat, lon) block of a variable by
+single matrix multiplication, or by numpy index/weight arrays ('weights').
+The weights are applied in the precision of the source data (float32 data
+is regridded in float32, without promoting the whole block into float64),
+except the linear extrapolation which is applied in float64.
+
+The sparse operators and the target masks (of the source masks, say land/sea
+mask of soil variables) are also built only once and stored as .npy arrays
+under the cache directory, which are loaded by numpy memory map (read only).
+So all the worker processes share the same pages of the page cache instead
+of keeping its own copy, and the per task setup is just a cache lookup.
+
+Supported extrapolation modes are 'linear', 'mask', 'nan' and 'error' (same
+meaning as iris.analysis.Linear). For any other mode or unsupported cubes
+(say 2D latitude/longitude, aux factories), regridCube returns None. So that
+caller can fallback to iris regrid/interpolate.
+
+For the iris regrid ('iris' engine), irisRegrid keeps one
+iris.analysis.Linear regridder per source grid, target grid and extrapolation
+mode in the process. It is not stored in the cache directory, and iris still
+computes its interpolation indices/weights on every call, only the regridder
+setup (grid checks and snapshot) is reused.
+"""
+
+import os, hashlib, shutil
+import numpy, iris
+import scipy.sparse
+
+# supported extrapolation modes
+_exModes_ = ('linear', 'mask', 'nan', 'error')
+# supported regrid engines
+_engines_ = ('sparse', 'weights')
+# in-process weights cache to avoid re-reading npz files
+_weightsCache_ = {}
+# in-process sparse regrid operators cache
+_operatorCache_ = {}
+# in-process target masks cache
+_maskCache_ = {}
+# in-process iris regridders cache
+_regridderCache_ = {}
+
+
+def _axisWeights(src, tgt, circular=False):
+    """
+    :param src: source 1D coordinate points
+    :param tgt: target 1D coordinate points
+    :param circular: True for circular longitude (wrap around 360 degree)
+    :return: (idx0, idx1, wgt, inside) arrays of target shape, where
+             interpolated value = (1 - wgt) * src[idx0] + wgt * src[idx1].
+             inside is False for the target points which are out of
+             source coordinate range (i.e. extrapolated points).
+    """
+    src = numpy.asarray(src, dtype=numpy.float64)
+    tgt = numpy.asarray(tgt, dtype=numpy.float64)
+    order = numpy.arange(src.size)
+    if src.size > 1 and src[0] > src[-1]:
+        # make source coordinate ascending order
+        src = src[::-1]
+        order = order[::-1]
+    # end of if src.size > 1 and src[0] > src[-1]:
+
+    if src.size == 1:
+        idx = numpy.zeros(tgt.shape, dtype=numpy.int64)
+        wgt = numpy.zeros(tgt.shape, dtype=numpy.float64)
+        inside = (tgt == src[0])
+        return idx, idx.copy(), wgt, inside
+    # end of if src.size == 1:
+
+    if circular:
+        # append first point as last point (+360) and move the target
+        # points inside the source range, like iris does for circular coords.
+        src = numpy.append(src, src[0] + 360.0)
+        order = numpy.append(order, order[0])
+        tgt = src[0] + numpy.mod(tgt - src[0], 360.0)
+    # end of if circular:
+
+    inside = (tgt >= src[0]) & (tgt <= src[-1])
+    # left neighbour index, out of range points take edge cell, which
+    # gives linear extrapolation by its weights (< 0 or > 1).
+    idx = numpy.searchsorted(src, tgt, side='right') - 1
+    idx = numpy.clip(idx, 0, src.size - 2)
+    wgt = (tgt - src[idx]) / (src[idx + 1] - src[idx])
+    return order[idx], order[idx + 1], wgt, inside
+# end of def _axisWeights(src, tgt, circular=False):
+
+
+def _gridKey(srcLat, srcLon, tgtLat, tgtLon, exmode):
+    # unique key of source grid signature, target grid & extrapolation mode
+    sha = hashlib.sha1()
+    sha.update(numpy.ascontiguousarray(srcLat.points, dtype=numpy.float64))
+    sha.update(numpy.ascontiguousarray(srcLon.points, dtype=numpy.float64))
+    sha.update(str(bool(getattr(srcLon, 'circular', False))))
+    sha.update(numpy.ascontiguousarray(tgtLat.points, dtype=numpy.float64))
+    sha.update(numpy.ascontiguousarray(tgtLon.points, dtype=numpy.float64))
+    sha.update(str(exmode))
+    return sha.hexdigest()
+# end of def _gridKey(srcLat, srcLon, tgtLat, tgtLon, exmode):
+
+
+def _loadArrays(adir, names):
+    # memory map (read only) the .npy arrays of the directory, so that all
+    # the processes share the same pages. Returns None if not stored yet.
+    if not os.path.isdir(adir): return None
+    try:
+        return dict((name, numpy.load(os.path.join(adir, name + '.npy'), 
+                                         mmap_mode='r')) for name in names)
+    except (IOError, OSError, ValueError) as e:
+        print "unable to load regrid arrays from %s. %s" % (adir, str(e))
+        return None
+    # end of try:
+# end of def _loadArrays(adir, names):
+
+
+def _storeArrays(adir, arrays):
+    # write into process specific temporary directory and rename it, so that
+    # other processes never read partially written arrays. Returns True if 
+    # the arrays are stored (or stored already by other process).
+    tdir = '%s.%d.tmp' % (adir, os.getpid())
+    try:
+        if not os.path.isdir(tdir): os.makedirs(tdir)
+        for name, arr in arrays.iteritems():
+            numpy.save(os.path.join(tdir, name + '.npy'), arr)
+        os.rename(tdir, adir)
+        print "stored regrid arrays into", adir
+    except (IOError, OSError) as e:
+        if os.path.isdir(tdir): shutil.rmtree(tdir, ignore_errors=True)
+        if not os.path.isdir(adir):
+            print "unable to store regrid arrays into %s. %s" % (adir, str(e))
+            return False
+    # end of try:
+    return True
+# end of def _storeArrays(adir, arrays):
+
+
+def getRegridWeights(srcLat, srcLon, tgtLat, tgtLon, exmode, cacheDir=None):
+    """
+    :param srcLat: source latitude coordinate
+    :param srcLon: source longitude coordinate
+    :param tgtLat: target latitude coordinate
+    :param tgtLon: target longitude coordinate
+    :param exmode: extrapolation mode ('linear' | 'mask' | 'nan' | 'error')
+    :param cacheDir: directory to store/load the weights npz files.
+                     None keeps the weights in memory of this process only.
+    :return: dictionary of bilinear weights arrays (see _axisWeights) of
+             both latitude (y) and longitude (x) axes.
+    """
+    key = _gridKey(srcLat, srcLon, tgtLat, tgtLon, exmode)
+    if key in _weightsCache_: return _weightsCache_[key]
+
+    cfile = os.path.join(cacheDir, key + '.npz') if cacheDir else None
+    weights = None
+    if cfile and os.path.isfile(cfile):
+        try:
+            npz = numpy.load(cfile)
+            weights = dict((k, npz[k]) for k in npz.files)
+            npz.close()
+        except Exception as e:
+            print "corrupted regrid weights file %s, recomputing it. %s" % (cfile, str(e))
+            weights = None
+        # end of try:
+    # end of if cfile and os.path.isfile(cfile):
+
+    if weights is None:
+        y0, y1, wy, yin = _axisWeights(srcLat.points, tgtLat.points)
+        x0, x1, wx, xin = _axisWeights(srcLon.points, tgtLon.points,
+                               bool(getattr(srcLon, 'circular', False)))
+        weights = {'y0': y0, 'y1': y1, 'wy': wy, 'yin': yin,
+                   'x0': x0, 'x1': x1, 'wx': wx, 'xin': xin}
+        if cfile:
+            # write into process specific temporary file and rename it, so
+            # that other processes never read partially written weights file.
+            tfile = os.path.join(cacheDir, '%s.%d.tmp.npz' % (key, os.getpid()))
+            try:
+                numpy.savez(tfile, **weights)
+                os.rename(tfile, cfile)
+                print "stored regrid weights into", cfile
+            except (IOError, OSError) as e:
+                print "unable to store regrid weights into %s. %s" % (cfile, str(e))
+                if os.path.isfile(tfile): os.remove(tfile)
+            # end of try:
+        # end of if cfile:
+    # end of if weights is None:
+
+    _weightsCache_[key] = weights
+    return weights
+# end of def getRegridWeights(...):
+
+
+def getRegridOperator(srcLat, srcLon, tgtLat, tgtLon, exmode, cacheDir=None,
+                      dtype=numpy.float64):
+    """
+    :param srcLat, srcLon, tgtLat, tgtLon, exmode, cacheDir: same as
+                     getRegridWeights arguments.
+    :param dtype: dtype of the operator weights (same as the data dtype, so
+                     that the matrix multiplication will not promote it).
+    :return: (operator, absOperator, weights) where operator is scipy.sparse
+             csr matrix of shape (target lat*lon, source lat*lon) built from
+             the bilinear weights. absOperator has absolute weights, which
+             used to propagate the source mask into target grid points.
+             If cacheDir is passed, then the csr arrays are memory mapped
+             from cacheDir (shared by all the processes).
+    """
+    gkey = _gridKey(srcLat, srcLon, tgtLat, tgtLon, exmode)
+    dtype = numpy.dtype(dtype)
+    key = (gkey, dtype.str)
+    if key in _operatorCache_: return _operatorCache_[key]
+
+    weights = getRegridWeights(srcLat, srcLon, tgtLat, tgtLon, exmode, cacheDir)
+    y0, y1, wy = weights['y0'], weights['y1'], weights['wy']
+    x0, x1, wx = weights['x0'], weights['x1'], weights['wx']
+    nty, ntx, nsx = y0.size, x0.size, srcLon.points.size
+    shape = (nty * ntx, srcLat.points.size * nsx)
+    names = ('data', 'absdata', 'indices', 'indptr')
+    odir = os.path.join(cacheDir, '%s.%s.operator' % (gkey, dtype.name)) if cacheDir else None
+    arrays = _loadArrays(odir, names) if odir else None
+    if arrays is None:
+        # four source corner points of every target point
+        rows = numpy.arange(nty * ntx).repeat(4)
+        cols = numpy.column_stack([
+                    (y0[:, None] * nsx + x0[None, :]).ravel(),
+                    (y0[:, None] * nsx + x1[None, :]).ravel(),
+                    (y1[:, None] * nsx + x0[None, :]).ravel(),
+                    (y1[:, None] * nsx + x1[None, :]).ravel()]).ravel()
+        vals = numpy.column_stack([
+                    ((1.0 - wy)[:, None] * (1.0 - wx)[None, :]).ravel(),
+                    ((1.0 - wy)[:, None] * wx[None, :]).ravel(),
+                    (wy[:, None] * (1.0 - wx)[None, :]).ravel(),
+                    (wy[:, None] * wx[None, :]).ravel()]).ravel()
+        # duplicate (row, col) entries (single point axis) are summed up by csr.
+        operator = scipy.sparse.coo_matrix((vals, (rows, cols)), shape=shape).tocsr()
+        operator = operator.astype(dtype)
+        arrays = {'data': operator.data, 'absdata': numpy.abs(operator.data),
+                  'indices': operator.indices, 'indptr': operator.indptr}
+        if odir and _storeArrays(odir, arrays):
+            arrays = _loadArrays(odir, names) or arrays
+    # end of if arrays is None:
+    operator = scipy.sparse.csr_matrix((arrays['data'], arrays['indices'], 
+                                 arrays['indptr']), shape=shape, copy=False)
+    absOperator = scipy.sparse.csr_matrix((arrays['absdata'], arrays['indices'], 
+                                 arrays['indptr']), shape=shape, copy=False)
+    _operatorCache_[key] = (operator, absOperator, weights)
+    return _operatorCache_[key]
+# end of def getRegridOperator(...):
+
+
+def _weightsDtype(dtype, weights, exmode):
+    # dtype to apply the weights, i.e. data precision (at least float32).
+    # But linear extrapolation weights grow with the distance from the source
+    # edge (say -120 and 121 at 4.8 deg out of 0.04 deg source grid), which
+    # cancels the float32 precision. So it is applied in float64.
+    rtype = numpy.result_type(dtype, numpy.float32)
+    if exmode == 'linear' and not (weights['yin'].all() and weights['xin'].all()):
+        return numpy.result_type(rtype, numpy.float64)
+    return rtype
+# end of def _weightsDtype(dtype, weights, exmode):
+
+
+def _targetLatLon(srcLat, srcLon, targetGrid):
+    # get the target latitude and longitude coordinates either from target
+    # grid cube or from list of sample points (as passed to cube.interpolate)
+    if isinstance(targetGrid, iris.cube.Cube):
+        return targetGrid.coord('latitude').copy(), targetGrid.coord('longitude').copy()
+    # end of if isinstance(targetGrid, iris.cube.Cube):
+    points = dict(targetGrid)
+    tgtLat = srcLat.copy(points=numpy.asarray(points['latitude'], dtype=srcLat.dtype))
+    tgtLon = srcLon.copy(points=numpy.asarray(points['longitude'], dtype=srcLon.dtype))
+    return tgtLat, tgtLon
+# end of def _targetLatLon(srcLat, srcLon, targetGrid):
+
+
+def _targetMask(mask, bilinear, rtype, gridKey=None, cacheDir=None):
+    """
+    :return: target mask of the source mask, i.e. the target points which get
+             any contribution from masked source points (absolute weights, 
+             since linear extrapolation has negative weights). If all the 
+             (time, level) slices have same source mask (say land/sea mask),
+             then it is computed only once per grid & mask and cached (in 
+             this process and in cacheDir, memory mapped by all processes).
+    """
+    slices = mask.reshape((-1,) + mask.shape[-2:])
+    if gridKey is None or not (slices == slices[0]).all():
+        return bilinear(mask.astype(rtype), absolute=True) > 0
+    # end of if gridKey is None or ...:
+
+    key = (gridKey, hashlib.sha1(numpy.packbits(slices[0])).hexdigest())
+    if key not in _maskCache_:
+        mdir = os.path.join(cacheDir, '%s.%s.mask' % key) if cacheDir else None
+        arrays = _loadArrays(mdir, ('mask',)) if mdir else None
+        if arrays is None:
+            arrays = {'mask': bilinear(slices[0].astype(rtype), absolute=True) > 0}
+            if mdir and _storeArrays(mdir, arrays):
+                arrays = _loadArrays(mdir, ('mask',)) or arrays
+        # end of if arrays is None:
+        _maskCache_[key] = arrays['mask']
+    # end of if key not in _maskCache_:
+    tmask = _maskCache_[key]
+    # writable mask of all the slices
+    result = numpy.empty(mask.shape[:-2] + tmask.shape, dtype=bool)
+    result[...] = tmask
+    return result
+# end of def _targetMask(mask, bilinear, rtype, gridKey=None, cacheDir=None):
+
+
+def _applyWeights(data, weights, exmode, operators=None, gridKey=None, cacheDir=None):
+    """
+    :param data: numpy (masked) array whose last two dimensions are
+                 latitude and longitude.
+    :param weights: bilinear weights dictionary from getRegridWeights.
+    :param exmode: extrapolation mode.
+    :param operators: (operator, absOperator) from getRegridOperator. If it
+                 is passed, then regrid whole data block by single sparse
+                 matrix multiplication, otherwise by numpy index/weights.
+    :param gridKey, cacheDir: to cache the target mask (see _targetMask).
+    :return: regridded numpy (masked) array
+    """
+    y0, y1, wy = weights['y0'], weights['y1'], weights['wy'][:, None]
+    x0, x1, wx = weights['x0'], weights['x1'], weights['wx']
+    outside = ~(weights['yin'][:, None] & weights['xin'][None, :])
+    if exmode == 'error' and outside.any():
+        raise ValueError("One or more of the target points are out of bounds")
+    # apply the weights in data precision (at least float32), except the
+    # linear extrapolation (see _weightsDtype)
+    rtype = numpy.result_type(data.dtype, numpy.float32)
+    wtype = _weightsDtype(data.dtype, weights, exmode)
+    wy, wx = wy.astype(wtype), wx.astype(wtype)
+
+    if operators:
+        nsrc = data.shape[-2] * data.shape[-1]
+
+        def bilinear(arr, absolute=False):
+            # stack all the leading (time, level) slices as columns and
+            # regrid them together by single matrix multiplication
+            op = operators[1] if absolute else operators[0]
+            block = arr.reshape(-1, nsrc).T
+            return op.dot(block).T.reshape(arr.shape[:-2] + outside.shape)
+        # end of def bilinear(arr, absolute=False):
+    else:
+
+        def bilinear(arr, absolute=False):
+            # interpolate along latitude then along longitude
+            ay, ax = (numpy.abs(wy), numpy.abs(wx)) if absolute else (wy, wx)
+            by, bx = (numpy.abs(1.0 - wy), numpy.abs(1.0 - wx)) if absolute else (1.0 - wy, 1.0 - wx)
+            rows = arr[..., y0, :] * by + arr[..., y1, :] * ay
+            return rows[..., x0] * bx + rows[..., x1] * ax
+        # end of def bilinear(arr, absolute=False):
+    # end of if operators:
+
+    result = bilinear(numpy.ma.getdata(data)).astype(rtype, copy=False)
+    mask = numpy.ma.getmaskarray(data) if numpy.ma.isMaskedArray(data) else None
+    if mask is not None and mask.any():
+        # mask the target points which get any contribution from masked
+        # source points
+        mask = _targetMask(mask, bilinear, rtype, gridKey, cacheDir)
+    else:
+        mask = numpy.zeros(result.shape, dtype=bool)
+    # end of if mask is not None and mask.any():
+
+    if exmode == 'mask':
+        mask |= outside
+    elif exmode == 'nan':
+        result[..., outside] = numpy.nan
+    # end of if exmode == 'mask':
+
+    if mask.any() or numpy.ma.isMaskedArray(data):
+        fill_value = data.fill_value if numpy.ma.isMaskedArray(data) else None
+        result = numpy.ma.masked_array(result, mask=mask, fill_value=fill_value)
+    return result
+# end of def _applyWeights(data, weights, exmode, operators=None, ...):
+
+
+def regridCube(cube, targetGrid, exmode='linear', cacheDir=None, engine='sparse'):
+    """
+    :param cube: source iris cube on rectilinear latitude, longitude grid
+    :param targetGrid: either target grid iris cube (as passed to cube.regrid)
+               or list of sample points (as passed to cube.interpolate) like
+               [('latitude', latpoints), ('longitude', lonpoints)]
+    :param exmode: extrapolation mode ('linear' | 'mask' | 'nan' | 'error')
+    :param cacheDir: directory to store/load the regrid weights.
+    :param engine: 'sparse' (single scipy.sparse matrix multiplication over 
+               all the slices) | 'weights' (numpy index/weights arrays)
+    :return: regridded cube using bilinear interpolation (same as
+             iris.analysis.Linear) or None if this cube is not supported here.
+    """
+    if exmode not in _exModes_: return None
+    if engine not in _engines_: return None
+    if cube.aux_factories: return None
+
+    srcLat = cube.coords('latitude', dim_coords=True)
+    srcLon = cube.coords('longitude', dim_coords=True)
+    if not (srcLat and srcLon): return None
+    srcLat, srcLon = srcLat[0], srcLon[0]
+    latDim, = cube.coord_dims(srcLat)
+    lonDim, = cube.coord_dims(srcLon)
+    for coord in cube.aux_coords:
+        # aux coords over latitude / longitude needs iris interpolation
+        if set(cube.coord_dims(coord)) & set([latDim, lonDim]): return None
+    # end of for coord in cube.aux_coords:
+
+    # move latitude, longitude as last two dimensions to regrid
+    others = [d for d in range(cube.ndim) if d not in (latDim, lonDim)]
+    order = others + [latDim, lonDim]
+    data = cube.data.transpose(order)
+
+    tgtLat, tgtLon = _targetLatLon(srcLat, srcLon, targetGrid)
+    weights = getRegridWeights(srcLat, srcLon, tgtLat, tgtLon, exmode, cacheDir)
+    operators = None
+    if engine == 'sparse':
+        operator, absOperator, weights = getRegridOperator(srcLat, srcLon, 
+                                    tgtLat, tgtLon, exmode, cacheDir, 
+                          _weightsDtype(data.dtype, weights, exmode))
+        operators = (operator, absOperator)
+    # end of if engine == 'sparse':
+
+    gridKey = _gridKey(srcLat, srcLon, tgtLat, tgtLon, exmode)
+    data = _applyWeights(data, weights, exmode, operators, gridKey, cacheDir)
+    # move back the dimensions as per source cube order
+    data = data.transpose(numpy.argsort(order))
+
+    regdCube = iris.cube.Cube(data)
+    regdCube.metadata = cube.metadata
+    for coord in cube.dim_coords:
+        dim, = cube.coord_dims(coord)
+        if dim == latDim:
+            regdCube.add_dim_coord(tgtLat, dim)
+        elif dim == lonDim:
+            regdCube.add_dim_coord(tgtLon, dim)
+        else:
+            regdCube.add_dim_coord(coord.copy(), dim)
+    # end of for coord in cube.dim_coords:
+    for coord in cube.aux_coords:
+        regdCube.add_aux_coord(coord.copy(), cube.coord_dims(coord))
+    # end of for coord in cube.aux_coords:
+    return regdCube
+# end of def regridCube(...):
+
+
+def irisRegrid(cube, targetGrid, exmode='linear'):
+    """
+    :param cube: source iris cube on latitude, longitude grid
+    :param targetGrid: target grid iris cube (as passed to cube.regrid)
+    :param exmode: extrapolation mode of iris.analysis.Linear
+    :return: regridded cube by iris.analysis.Linear(exmode) regridder of the
+             source grid to the targetGrid, which is created only once per
+             grids and exmode in this process.
+    """
+    key = _gridKey(cube.coord('latitude'), cube.coord('longitude'), 
+                   targetGrid.coord('latitude'), targetGrid.coord('longitude'), exmode)
+    regridder = _regridderCache_.get(key)
+    if regridder is not None:
+        try:
+            return regridder(cube)
+        except ValueError:
+            # cube grid coords differs from the cached regridder (say bounds
+            # or coord system), so create new one.
+            pass
+        # end of try:
+    # end of if regridder is not None:
+    scheme = iris.analysis.Linear(extrapolation_mode=exmode)
+    regridder = _regridderCache_[key] = scheme.regridder(cube, targetGrid)
+    return regridder(cube)
+# end of def irisRegrid(cube, targetGrid, exmode='linear'):
@@ -0,0 +1,193 @@
+"""
+Structured timing and profiling of the conversion phases.
+
+Every phase (load, extract, average, regrid, mask, encode, write, reorder,
+repack, grib1, ctlidx) of the conversion pipeline can be wrapped by
+timePhase, which records the wall time, CPU time, bytes read/written (from
+/proc/self/io) and peak RSS of the process along with the user tags (say
+file, variable, STASH and hour) and appends it as one JSON line into the
+timing log file. Every record is written by single append, so that all the
+worker processes can share the same log file.
+
+CPU time includes the waited child processes (say wgrib2, g2ctl), but the
+bytes read/written are of this process only.
+
+Optionally every worker process can be profiled by cProfile (or by
+pyinstrument, if it is installed) from its start to exit and dumped into
+the profile directory as <pid>.prof (or <pid>.txt for pyinstrument).
+
+By default the timing log file is None, so that timePhase does nothing.
+"""
+
+import os, time, json, resource
+from contextlib import contextmanager
+from multiprocessing import util as mputil
+
+# timing log file (json lines). None disables the timing records
+_timingLogFile_ = None
+# None | 'cProfile' | 'pyinstrument'
+_profiler_ = None
+# directory to dump the per worker profiles
+_profileDir_ = None
+# profiler object of this process
+_processProfile_ = None
+
+
+def configure(timingLogFile=None, profiler=None, profileDir=None):
+    """
+    :param timingLogFile: json lines file path to append the phase records.
+                          None disables the timing records.
+    :param profiler: None | 'cProfile' | 'pyinstrument', to profile every
+                     worker process (started by startWorkerProfile).
+    :param profileDir: directory to dump the per worker profiles.
+    """
+    global _timingLogFile_, _profiler_, _profileDir_
+
+    if profiler not in (None, 'cProfile', 'pyinstrument'):
+        raise ValueError("profiler must be either None or 'cProfile' or 'pyinstrument'")
+    if profiler and not profileDir:
+        raise ValueError("profileDir must be passed to dump the profiles")
+    _timingLogFile_ = timingLogFile
+    _profiler_ = profiler
+    _profileDir_ = profileDir
+    if _timingLogFile_:
+        logDir = os.path.dirname(os.path.abspath(_timingLogFile_))
+        if not os.path.isdir(logDir): os.makedirs(logDir)
+    # end of if _timingLogFile_:
+    if _profiler_ and not os.path.isdir(_profileDir_): os.makedirs(_profileDir_)
+# end of def configure(timingLogFile=None, profiler=None, profileDir=None):
+
+
+def _getIOBytes():
+    # returns (read, written) bytes of this process so far
+    try:
+        io = dict(line.split(':') for line in open('/proc/self/io'))
+        return int(io['rchar']), int(io['wchar'])
+    except Exception:
+        return 0, 0
+    # end of try:
+# end of def _getIOBytes():
+
+
+def _getCPUTime():
+    # user + system time of this process and its waited child processes
+    t = os.times()
+    return t[0] + t[1] + t[2] + t[3]
+# end of def _getCPUTime():
+
+
+def _toJson(obj):
+    # numpy arrays / scalars (say forecast hours) into json
+    if hasattr(obj, 'tolist'): return obj.tolist()
+    return str(obj)
+# end of def _toJson(obj):
+
+
+def startPhase(phase, **tags):
+    """
+    :param phase: name of the phase (say 'load', 'regrid', 'write').
+    :param tags: tags of this record (say file, variable, STASH, hour).
+    :return: phase record to be passed to endPhase or None if timing
+             records are disabled.
+    """
+    if not _timingLogFile_: return None
+    readBytes, writtenBytes = _getIOBytes()
+    record = {'phase': phase, 'pid': os.getpid(), 'start': time.time(),
+              'cpu': _getCPUTime(), 'readBytes': readBytes,
+              'writtenBytes': writtenBytes}
+    record.update(tags)
+    return record
+# end of def startPhase(phase, **tags):
+
+
+def endPhase(record, **tags):
+    """
+    :param record: phase record returned by startPhase.
+    :param tags: tags known only at end of the phase (say outBytes, error).
+    """
+    if record is None: return
+    readBytes, writtenBytes = _getIOBytes()
+    record['wall'] = time.time() - record['start']
+    record['cpu'] = _getCPUTime() - record['cpu']
+    record['readBytes'] = readBytes - record['readBytes']
+    record['writtenBytes'] = writtenBytes - record['writtenBytes']
+    # ru_maxrss is in kilobytes on linux
+    record['peakRSSMB'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    record.update(tags)
+    # single write in append mode, so that the records of all the worker
+    # processes will not be interleaved.
+    line = json.dumps(record, default=_toJson) + '\n'
+    fd = os.open(_timingLogFile_, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+    # end of try:
+# end of def endPhase(record, **tags):
+
+
+@contextmanager
+def timePhase(phase, **tags):
+    """
+    Context manager to record the phase, which wraps startPhase & endPhase.
+    If the phase raises an exception, it will be recorded as error tag and
+    re-raised.
+
+    with timePhase('regrid', file=infile, variable=varName, STASH=varSTASH, hour=fhr):
+        regdCube = regridCube(...)
+    """
+    record = startPhase(phase, **tags)
+    try:
+        yield record
+    except Exception as e:
+        endPhase(record, error=str(e))
+        raise
+    # end of try:
+    endPhase(record)
+# end of def timePhase(phase, **tags):
+
+
+def startWorkerProfile():
+    """
+    Start profiling this (worker) process, if profiler has configured.
+    It is used as initializer of the workers pool. The profile will be
+    dumped into profileDir when this process exits normally (i.e. pool
+    close & join).
+    """
+    global _processProfile_
+
+    if not _profiler_ or _processProfile_ is not None: return
+    if _profiler_ == 'pyinstrument':
+        try:
+            import pyinstrument
+            _processProfile_ = pyinstrument.Profiler()
+            _processProfile_.start()
+        except ImportError:
+            print "WARNING : pyinstrument is not installed. So using cProfile"
+            _processProfile_ = None
+        # end of try:
+    # end of if _profiler_ == 'pyinstrument':
+    if _processProfile_ is None:
+        import cProfile
+        _processProfile_ = cProfile.Profile()
+        _processProfile_.enable()
+    # end of if _processProfile_ is None:
+    mputil.Finalize(None, dumpWorkerProfile, exitpriority=10)
+# end of def startWorkerProfile():
+
+
+def dumpWorkerProfile():
+    # stop profiling and dump the profile of this process into profileDir
+    global _processProfile_
+
+    if _processProfile_ is None: return
+    if hasattr(_processProfile_, 'dump_stats'):
+        _processProfile_.disable()
+        _processProfile_.dump_stats(os.path.join(_profileDir_, '%d.prof' % os.getpid()))
+    else:
+        _processProfile_.stop()
+        with open(os.path.join(_profileDir_, '%d.txt' % os.getpid()), 'w') as pfile:
+            pfile.write(_processProfile_.output_text())
+    # end of if hasattr(_processProfile_, 'dump_stats'):
+    _processProfile_ = None
+# end of def dumpWorkerProfile():
@@ -58,7 +58,7 @@ latest Update : 29-Aug-2016
 """
 
 # -- Start importing necessary modules
-import os, sys, time, subprocess, errno
+import os, sys, time, subprocess, errno, shutil, hashlib, json
 import numpy 
 import iris
 import gribapi
@@ -69,7 +69,11 @@ import multiprocessing.pool as mppool
 # by the top-level multiprocessing module.
 import datetime
 from iris.time import PartialDateTime
-from cubeutils import cubeAverager, cubeAddSubtractor
+from cubeutils import cubeAverager, cubeAddSubtractor, getRealizationStatistic
+from regridutils import regridCube, irisRegrid
+import timingutils
+import ctlutils
+from timingutils import timePhase, startPhase, endPhase, startWorkerProfile
 from ncum_load_rules import update_cf_standard_name
 # End of importing business
 
@@ -148,7 +152,70 @@ _createGrib1CtlIdxFiles_ = False
 _convertGrib2FilestoGrib1Files_ = False
 __setGrib2TableParameters__ = None
 __wgrib2Arguments__ = None
+# (packingType, orderOfSpatialDifferencing, bitsPerValue) to pack the grib2
+# messages in tweaked_messages itself, instead of re-writing by wgrib2
+_grib2Packing_ = None
 _extraPolateMethod_ = 'auto'
+# reuse regrid weights stored in tmpPath instead of iris Linear regrid
+_cacheRegridWeights_ = True
+# regrid engine 'sparse' | 'weights' | 'iris' (see regridutils module)
+_regridEngine_ = 'iris'
+# write grib2 messages into per worker shard files instead of _lock_-ed append
+_writeGrib2Shards_ = True
+# re-order the merged grib2 messages by raw byte copy, without decoding into 
+# iris cubes (except _grib2DecodeVars_, which doShuffleVarsInOrder has to process)
+_reorderGrib2Bytes_ = True
+# variables to be decoded while re-ordering by byte copy (see __getGrib2DecodeVars__)
+_grib2DecodeVars_ = []
+# ocean masks (land_binary_mask < 1) keyed by out grid and no of soil layers
+# (see __getOceanMask__)
+_oceanMasks_ = {}
+# persistent workers pool of current conversion cycle (see __getWorkerPool__)
+_workerPool_ = None
+# no of workers in the pool. If None, no of cpu cores.
+_maxWorkers_ = None
+# no of concurrent cnvgrib (grib1 stage). If None, half of the pool workers.
+_grib1Workers_ = None
+# memory budget (in GB) of all the running tasks. If None, 80% of available 
+# memory of the node (see __mapInMemoryBudget__)
+_memoryBudget_ = None
+# approximate resident memory (in GB) of one idle worker (python + iris)
+__workerBaseMemoryGB__ = 0.5
+# no of copies of the variable data alive while regridding / saving it
+# (loaded data, masked & regridded data, grib2 message)
+__taskMemoryFactor__ = 3.0
+# fields header details of infiles (see __getFieldsHeaderInfo__)
+_fieldsHeaderInfo_ = {}
+# watch the inpath and convert the files as soon as infiles arrive
+_watchInFiles_ = False
+# seconds between polling the inpath (infile size must be stable for it)
+_watchInterval_ = 60
+# max seconds to wait for infiles of one hour group to arrive
+_watchTimeout_ = 21600
+# infile as key and (size, time since size not changed) as value
+_inFilesSize_ = {}
+# convert only the missing / stale out files as per the manifest of previous
+# conversion (only if overwrite is True)
+_resumeConversion_ = False
+# manifest of the conversion (see __loadManifest__)
+_manifest_ = {'configHash': None, 'tasks': {}, 'outFiles': {}}
+# record wall/cpu time, io bytes, peak memory of every phase as json lines
+_recordTimings_ = False
+# profile every worker process by None | 'cProfile' | 'pyinstrument'
+_profileWorkers_ = None
+# render ctl files from the write-time message keys and ctl template of same
+# structure (stored in tmpPath), instead of g2ctl.pl for every out file
+_renderCtlFiles_ = True
+# regrid, encode and write the pressure levels of the variable one by one 
+# (see __getCubeSlabs__), instead of realizing all its levels at once
+_regridInSlabs_ = True
+# dtype of the data while averaging, regridding, masking and encoding. 
+# 'float32' is enough for the 12-16 bits packed grib2 fields.
+_workingDtype_ = 'float32'
+# convert every variable of the forecast infile as separate task, so that 
+# single big infile is spread across all the workers. But every task reads 
+# (fields headers of) the infile again, so it is off by default.
+_fcstVariableTasks_ = False
 __UMtype__ = 'global'
 _write2NetcdfFile_ = False
 # By default __soilFirstSecondFixedSurfaceUnit__ takes as 'cm', suggested for
@@ -457,6 +524,25 @@ def createDirWhileParallelRacing(folder_location):
             raise
 # end of def createDirWhileParallelRacing(folder_location):
 
+def __fsyncFile__(fpath):
+    # flush the written file (or directory entries) into disk, so that the 
+    # next stage / other nodes see the complete file, without sleep & hope.
+    fd = os.open(fpath, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    # end of try:
+# end of def __fsyncFile__(fpath):
+
+def __renameCompletedFile__(tmppath, fpath):
+    # fsync the completely written tmppath and atomically rename it as fpath.
+    # So fpath is either not exists or complete, never partially written.
+    __fsyncFile__(tmppath)
+    os.rename(tmppath, fpath)
+    __fsyncFile__(os.path.dirname(os.path.abspath(fpath)))
+# end of def __renameCompletedFile__(tmppath, fpath):
+
 class myLog():
     """
     A simple class with destructor and construtor for logging the standatd I/O
@@ -494,11 +580,67 @@ def getCubeData(umFname, **kwarg):
 
     allconstraints = kwarg.get('constraints', None)        
     # check cf_standard_name of cubes and update it if necessary while loading 
-    cubes = iris.load(umFname, constraints=allconstraints, 
-                         callback=update_cf_standard_name)    
+    with timePhase('load', file=umFname):
+        cubes = iris.load(umFname, constraints=allconstraints, 
+                             callback=update_cf_standard_name)    
     return cubes
 # end of def getCubeData(umFname, **kwarg):
 
+def getCubesIndex(cubes):
+    """
+    This definition builds an index of the loaded cubes in one pass over the
+    CubeList, keyed by (name, STASH) and each key points to CubeList of that
+    variable only. So that per variable lookup (and its forecast_period, 
+    forecast_reference_time, lat, lon extraction) need not to walk through 
+    all the cubes of the file every time (pf files has hundreds of cubes).
+
+    :param cubes: iris CubeList (say returned by getCubeData)
+    :return: dictionary of {(varName, varSTASH): CubeList}
+    """
+    
+    cubesIndex = {}
+    for cube in cubes:
+        key = (cube.name(), str(cube.attributes.get('STASH', '')))
+        cubesIndex.setdefault(key, iris.cube.CubeList()).append(cube)
+    # end of for cube in cubes:
+    return cubesIndex
+# end of def getCubesIndex(cubes):
+
+def __getCubeSlabs__(cube, inSlabs=True):
+    """
+    Returns iterator of the pressure level slabs of the cube. The slabs are 
+    still lazy, so only one level is realized (loaded from the fieldsfile),
+    regridded, encoded and written at a time, and the peak memory of the 
+    worker is bounded by single level instead of all the levels x times of
+    the variable. If inSlabs is False or the cube has no multiple pressure 
+    levels, the cube itself is the only slab.
+    """
+    
+    pressure = cube.coords('pressure', dim_coords=True)
+    if not inSlabs or not pressure or len(pressure[0].points) < 2: 
+        return iter([cube])
+    return cube.slices_over(pressure[0])
+# end of def __getCubeSlabs__(cube, inSlabs=True):
+
+def __castToWorkingDtype__(cube):
+    # cast the (realized) floating point data of the cube into working dtype.
+    # Integer data (say land_binary_mask) is kept as it is.
+    global _workingDtype_
+    
+    dtype = numpy.dtype(_workingDtype_)
+    if cube.data.dtype.kind == 'f' and cube.data.dtype != dtype:
+        cube.data = cube.data.astype(dtype)
+# end of def __castToWorkingDtype__(cube):
+
+def __setGribLoaderDtype__():
+    # ncmrwf patched iris grib loader (others/ncmrwfIRIS) unpacks the grib 
+    # message values in this dtype. No effect on the original iris.
+    global _workingDtype_
+    
+    if hasattr(iris.fileformats.grib, 'values_dtype'):
+        iris.fileformats.grib.values_dtype = numpy.dtype(_workingDtype_)
+# end of def __setGribLoaderDtype__():
+
 def getYdayStr(today):
     """
     This module returns yesterday's date-time string 
@@ -1549,6 +1691,202 @@ class _MyPool(mppool.Pool):
     Process = _NoDaemonProcess
 # end of class #3
 
+def __getAvailableMemoryGB__():
+    # returns available memory (in GB) of this node, otherwise None.
+    try:
+        with open('/proc/meminfo') as mfile:
+            for line in mfile:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / (1024. * 1024.)
+            # end of for line in mfile:
+    except (IOError, OSError, ValueError):
+        pass
+    return None
+# end of def __getAvailableMemoryGB__():
+
+def __getWorkerPoolSize__():
+    # user defined no of workers, otherwise no of cpu cores. Memory of the 
+    # node is taken care by __mapInMemoryBudget__ scheduler.
+    global _maxWorkers_
+    
+    if _maxWorkers_: return int(_maxWorkers_)
+    return mp.cpu_count()
+# end of def __getWorkerPoolSize__():
+
+def __getGrib1WorkersCount__():
+    # user defined no of concurrent cnvgrib, otherwise half of the workers, 
+    # since the grib1 stage runs along with re-order workers.
+    global _grib1Workers_
+    
+    if _grib1Workers_: return int(_grib1Workers_)
+    return max(1, __getWorkerPoolSize__() / 2)
+# end of def __getGrib1WorkersCount__():
+
+def __getMemoryBudgetGB__():
+    # user defined memory budget, otherwise 80% of available memory of this 
+    # node. If both are not known, then there is no limit.
+    global _memoryBudget_
+    
+    if _memoryBudget_: return float(_memoryBudget_)
+    memory = __getAvailableMemoryGB__()
+    return memory * 0.8 if memory is not None else float('inf')
+# end of def __getMemoryBudgetGB__():
+
+def __getWorkerPool__():
+    """
+    Returns the persistent workers pool of current conversion cycle. It will
+    be created at first use (i.e. after convertFcstFiles / convertAnlFiles 
+    has set all the global variables, since the workers are forked and 
+    inherit it) and re-used by regrid, merge and re-order stages, instead of
+    creating nested pools per file and per hour.
+    """
+    global _workerPool_
+    
+    if _workerPool_ is None:
+        nprocesses = __getWorkerPoolSize__()
+        _workerPool_ = mp.Pool(nprocesses, initializer=startWorkerProfile)
+        print "Creating %d (persistent) workers pool." % nprocesses
+    # end of if _workerPool_ is None:
+    return _workerPool_
+# end of def __getWorkerPool__():
+
+def __mapInMemoryBudget__(func, tasks, estimates, onResult=None):
+    """
+    Apply func on every task in the persistent workers pool, but admit the 
+    next task only while the estimated resident memory of all the running 
+    tasks (including the next one) fits into the memory budget. One task is 
+    always admitted, even if its estimate alone exceeds the budget.
+    
+    :param func: function to be applied on each task.
+    :param tasks: list of tasks (in the feeding order).
+    :param estimates: list of estimated memory (in GB) of each task.
+    :param onResult: function to be called with (task, result) of every task
+                     as soon as it is finished (in the finishing order).
+    :return: list of results in the tasks order.
+    """
+    pool = __getWorkerPool__()
+    budget = __getMemoryBudgetGB__()
+    print "Feeding %d tasks into workers pool with memory budget %.2f GB" % (len(tasks), budget)
+    
+    pending = range(len(tasks))
+    running = []
+    results = [None] * len(tasks)
+    while pending or running:
+        used = sum([estimates[idx] for idx, _ in running])
+        while pending and (not running or used + estimates[pending[0]] <= budget):
+            idx = pending.pop(0)
+            running.append((idx, pool.apply_async(func, (tasks[idx],))))
+            used += estimates[idx]
+        # end of while pending and ...:
+        # wait till any one of the running task has finished
+        running[0][1].wait(0.2)
+        for idx, result in running[:]:
+            if not result.ready(): continue
+            results[idx] = result.get()
+            running.remove((idx, result))
+            if onResult is not None: onResult(tasks[idx], results[idx])
+        # end of for idx, result in running[:]:
+    # end of while pending or running:
+    return results
+# end of def __mapInMemoryBudget__(func, tasks, estimates, onResult=None):
+
+def __getFieldsHeaderInfo__(infile):
+    """
+    Returns dictionary of STASH as key and (no of fields, max grid points of
+    the field, no of pressure levels) as value, by reading only the fields 
+    header (without data) of the fieldsfile / pp file. Returns None if header
+    couldn't be read.
+    """
+    global _fieldsHeaderInfo_
+    
+    if infile in _fieldsHeaderInfo_: return _fieldsHeaderInfo_[infile]
+    fieldsInfo = None
+    for loader in (iris.fileformats.um.um_to_pp, iris.fileformats.pp.load):
+        try:
+            fieldsInfo, levels = {}, {}
+            for field in loader(infile):
+                stash = str(field.stash)
+                count, npts = fieldsInfo.get(stash, (0, 0))
+                fieldsInfo[stash] = (count + 1, max(npts, field.lbrow * field.lbnpt))
+                # lbvc 8 is pressure level
+                if field.lbvc == 8: levels.setdefault(stash, set()).add(field.blev)
+            # end of for field in loader(infile):
+            fieldsInfo = dict((stash, (count, npts, len(levels.get(stash, [])) or 1)) 
+                              for stash, (count, npts) in fieldsInfo.iteritems())
+            break
+        except Exception:
+            fieldsInfo = None
+        # end of try:
+    # end of for loader in (...):
+    _fieldsHeaderInfo_[infile] = fieldsInfo
+    return fieldsInfo
+# end of def __getFieldsHeaderInfo__(infile):
+
+def __estimateRegridTaskMemoryGB__(arg):
+    """
+    Estimate the resident memory (in GB) of regridAnlFcstFiles task by 
+    grid shape x levels x times of the variables (from fields header). 
+    Variables are regridded one by one, so the biggest variable of the task 
+    decides its memory need. If the pressure levels are regridded one by one
+    (see __getCubeSlabs__), then single level x times decides it.
+    """
+    global _inDataPath_, _convertVars_, __workerBaseMemoryGB__, \
+           __taskMemoryFactor__, _regridInSlabs_
+    
+    fpname, hr, varIdx = arg
+    fileName = __getInFileName__(fpname, hr)
+    varNamesSTASH, _, _, infile, _ = getVarInOutFilesDetails(_inDataPath_, fileName, hr)
+    if _convertVars_:
+        varNamesSTASH = [vns for vns in varNamesSTASH if vns in _convertVars_]
+    if varIdx is not None: varNamesSTASH = [varNamesSTASH[varIdx]]
+    
+    fieldsInfo = __getFieldsHeaderInfo__(infile) if os.path.isfile(infile) else None
+    if fieldsInfo:
+        # no of fields (levels x times) x grid points of float32 data
+        nbytes = 0
+        for (_, varSTASH) in varNamesSTASH:
+            count, npts, nlevels = fieldsInfo.get(varSTASH, (0, 0, 1))
+            if _regridInSlabs_: count = max(1, count / nlevels)
+            nbytes = max(nbytes, count * npts * 4)
+        # end of for (_, varSTASH) in varNamesSTASH:
+    elif os.path.isfile(infile):
+        # couldn't read header, so lets take unpacked size of whole file
+        nbytes = os.path.getsize(infile) * 2
+    else:
+        nbytes = 0
+    # end of if fieldsInfo:
+    return __workerBaseMemoryGB__ + nbytes * __taskMemoryFactor__ / 1024.**3
+# end of def __estimateRegridTaskMemoryGB__(arg):
+
+def __estimateShuffleTaskMemoryGB__(fpath):
+    # doShuffleVarsInOrder loads all the variables of the grib2 file into iris
+    # cubes (16 bit packed into float32), unless it re-orders by byte copy, 
+    # which loads only the _grib2DecodeVars_.
+    global _reorderGrib2Bytes_, __workerBaseMemoryGB__, __taskMemoryFactor__, \
+           _grib2DecodeVars_
+    
+    if not os.path.isfile(fpath): return __workerBaseMemoryGB__
+    nbytes = os.path.getsize(fpath)
+    if _reorderGrib2Bytes_ and os.path.isfile(fpath + '.shardidx'):
+        nbytes = 0
+        for line in open(fpath + '.shardidx'):
+            start, size, varName, varSTASH = line.split()
+            if (varName, varSTASH) in _grib2DecodeVars_: nbytes += int(size)
+        # end of for line in open(fpath + '.shardidx'):
+    # end of if _reorderGrib2Bytes_ and os.path.isfile(fpath + '.shardidx'):
+    return __workerBaseMemoryGB__ + nbytes * 2 * __taskMemoryFactor__ / 1024.**3
+# end of def __estimateShuffleTaskMemoryGB__(fpath):
+
+def __closeWorkerPool__():
+    # close and join the persistent workers pool of current conversion cycle.
+    global _workerPool_
+    
+    if _workerPool_ is None: return
+    _workerPool_.close()
+    _workerPool_.join()
+    _workerPool_ = None
+# end of def __closeWorkerPool__():
+
 def _createDepthBelowLandSurfaceCoords1Lev(cube):
     # Dr. Saji / UM_Model_DOC suggested that UM produce Root zone soil model
     # level number is equivalent to 0 to 2m. (i.e. from 1 to 4 layer no)
@@ -1716,6 +2054,25 @@ def _convert2WEASD(cube):
     
 
 # start definition #5
+def __getInFileName__(fpname, hr):
+    # returns the infile name of partial file name fpname and hour hr
+    global __UMReanalysis__, __UMtype__
+    
+    if __UMReanalysis__:
+        fileName = fpname # keep filename for IMDAA reanalysis
+    elif  __UMtype__ == 'global':
+        ### if fileName has some extension, then do not add hr to it.
+        fileName = fpname + hr.zfill(3) if not '.' in fpname else fpname
+    elif  __UMtype__ == 'regional':
+        if '.' in fpname:
+            fileName = fpname 
+        else:
+           fileName = fpname if '.' in fpname else fpname + hr.zfill(3) 
+        # end of if '.' in pfname:
+    # end of if  __UMtype__ == 'global':
+    return fileName
+# end of def __getInFileName__(fpname, hr):
+
 def regridAnlFcstFiles(arg):
     """
     New Module by AAT:
@@ -1723,9 +2080,11 @@ def regridAnlFcstFiles(arg):
     parallel problem! It also checks the std names from Iris cube format with the
     CF-convention and it regrids the data to 0.25x0.25 regular grid using linear
     interpolation methods.
-    :param arg: tuple(fname, hr)
+    :param arg: tuple(fname, hr, varIdx)
             fname: common filename
             hr: forecast hour
+            varIdx: index of the only variable to be converted (None for 
+                    all the variables of the file)
     :return: regridded cube saved as GRIB2 file! TANGIBLE!
     ACK:
     This module has been entirely revamped & improved by AAT based on an older and
@@ -1739,22 +2098,13 @@ def regridAnlFcstFiles(arg):
            _precipVars_, _requiredPressureLevels_, __anl_aavars_reference_time__, \
            __anl_aavars_time_bounds__, _extraPolateMethod_, _maskOverOceanVars_, \
            __fillFullyMaskedVars__,  _reverseLatitude_, __outFileType__, \
-           _write2NetcdfFile_, __UMReanalysis__, __end_long_fcst_hour__ 
+           _write2NetcdfFile_, __UMReanalysis__, __end_long_fcst_hour__, \
+           _cacheRegridWeights_, _tmpDir_, _regridEngine_, _writeGrib2Shards_, \
+           _reorderGrib2Bytes_, _regridInSlabs_, _workingDtype_, _grib2DecodeVars_
    
     fpname, hr, varIdx = arg 
     
-    if __UMReanalysis__:
-        fileName = fpname # keep filename for IMDAA reanalysis
-    elif  __UMtype__ == 'global':
-        ### if fileName has some extension, then do not add hr to it.
-        fileName = fpname + hr.zfill(3) if not '.' in fpname else fpname
-    elif  __UMtype__ == 'regional':
-        if '.' in fpname:
-            fileName = fpname 
-        else:
-           fileName = fpname if '.' in fpname else fpname + hr.zfill(3) 
-        # end of if '.' in pfname:
-    # end of if  __UMtype__ == 'global':
+    fileName = __getInFileName__(fpname, hr)
     
     fname = os.path.join(_inDataPath_, fileName)        
     inDataPathHour = _inDataPath_.split('/')[-1]  
@@ -1772,7 +2122,7 @@ def regridAnlFcstFiles(arg):
         varNamesSTASH = [vns for vns in varNamesSTASH if vns in _convertVars_]
     
     # load only one varNamesSTASH (used for variable wise parallel conversion) 
-    if varIdx: varNamesSTASH = [varNamesSTASH[varIdx]]
+    if varIdx is not None: varNamesSTASH = [varNamesSTASH[varIdx]]
     
     if not varNamesSTASH:
         print "No varibale selected to load from the file '%s' " % fname
@@ -1786,10 +2136,20 @@ def regridAnlFcstFiles(arg):
     # end of if not varNamesSTASH:
     
     print "Started Processing the file: %s.. \n" %infile
+    # (out file name, varName, varSTASH, no of messages) written by this task
+    written = []
     
     # call definition to get cube data
-    cubes = getCubeData(infile)
+    if varIdx is not None and not __UMReanalysis__:
+        # variable wise forecast task needs only the fields of its variable
+        # (reanalysis needs snowfall_amount along with accumulation vars)
+        cubes = getCubeData(infile, 
+                 constraints=iris.AttributeConstraint(STASH=varNamesSTASH[0][1]))
+    else:
+        cubes = getCubeData(infile)
     nVars = len(cubes)
+    # index the cubes by (name, STASH) in one pass
+    cubesIndex = getCubesIndex(cubes)
         
     if fpname.startswith(('umglaa', 'umnsaa')) or __outFileType__ == 'fcst':
         dtype = 'fcst'         
@@ -1877,12 +2237,14 @@ def regridAnlFcstFiles(arg):
         # define varibale stash code constraint
         STASHConstraint = iris.AttributeConstraint(STASH=varSTASH)
         
-        if not cubes.extract(varConstraint & STASHConstraint): 
+        # get the cubes of this variable name & stash code from index
+        varCubes = cubesIndex.get((varName, varSTASH))
+        if not varCubes: 
             raise ValueError("unable to extract variable %s %s %s" % (varName, varSTASH, infile))
         
         # get the standard_name of variable 
-        stdNm = cubes.extract(varConstraint & STASHConstraint)[0].standard_name
-        longNm = cubes.extract(varConstraint & STASHConstraint)[0].long_name
+        stdNm = varCubes[0].standard_name
+        longNm = varCubes[0].long_name
         print "stdNm", stdNm, infile
         if stdNm is None and longNm is None:
             print "Unknown variable standard_name for '%s' of %s. So skipping it" % (varName, infile)
@@ -1902,6 +2264,7 @@ def regridAnlFcstFiles(arg):
                 if dtype == 'ana':
                     ana_soil_infile = os.path.join(_inDataPath_, fileName)
                     cubes = getCubeData(ana_soil_infile)   
+                    cubesIndex = getCubesIndex(cubes)
                     simulated_hr = int(ana_soil_infile.split('/')[-2])                
                     # get instantaneous forecast hours to be extracted.
                     fcstHours = numpy.array([0,])
@@ -1948,6 +2311,7 @@ def regridAnlFcstFiles(arg):
                             # get next day file to access next day 03z hour data 
                             infile2 = infile[:-3] + str(int(hr)+24).zfill(3)
                             cubes = getCubeData([infile, infile2])
+                            cubesIndex = getCubesIndex(cubes)
                             
                     elif __UMtype__ == 'regional':
                         fhr1 = int(fileName[-3:])
@@ -1965,6 +2329,7 @@ def regridAnlFcstFiles(arg):
                         ana_precip_infile, simulated_hr = __getTodayOrYesterdayInfile__(_inDataPath_, fileName)    
                         if ana_precip_infile != infile: 
                             cubes = getCubeData(ana_precip_infile)
+                            cubesIndex = getCubesIndex(cubes)
                             print varName, "loaded from file, ", ana_precip_infile
                             print "simulated_hr = ", simulated_hr
                     # end of if ana_infile != infile:               
@@ -2016,7 +2381,10 @@ def regridAnlFcstFiles(arg):
                         umrfhr = [1., 2., 3., 4., 5., 6.]
                         fpConstraint = iris.Constraint(forecast_period=umrfhr)
                 # end of if __UMReanalysis__:
-                       
+            
+            # tags of the timing records of this variable & hour
+            tags = dict(file=infile, variable=varName, STASH=varSTASH, hour=fhr)
+            phase = startPhase('extract', **tags)
             if __anl_step_hour__ == 3 and fhr == 1.5:
                 # Load from current date instead of yesterday date 
                 ana_today_infile = os.path.join(_inDataPath_, fileName)                 
@@ -2033,10 +2401,11 @@ def regridAnlFcstFiles(arg):
                     print varName, "loaded from today infile, ", ana_today_infile
                     print "simulated_hr = ", simulated_hr            
             else:
-                # extract cube with possible and required constraints
-                tmpCube = cubes.extract(varConstraint & STASHConstraint & 
-                                    fcstRefTimeConstraint & fpConstraint &
-                                    latConstraint & lonConstraint)
+                # extract cube with possible and required constraints from
+                # the indexed cubes of this variable (name & stash code)
+                varCubes = cubesIndex.get((varName, varSTASH), iris.cube.CubeList())
+                tmpCube = varCubes.extract(fcstRefTimeConstraint & fpConstraint &
+                                             latConstraint & lonConstraint)
             # end of if __anl_step_hour__ == 3 and fhr == 1.5:
             print varConstraint , STASHConstraint ,  fcstRefTimeConstraint , fpConstraint ,       latConstraint , lonConstraint
             if not tmpCube: raise ValueError("unable to extract variable %s %s %s %s" % (varName, varSTASH, str(fhr), infile))
@@ -2051,7 +2420,13 @@ def regridAnlFcstFiles(arg):
             
             if __LPRINT__: print "extract end", infile, fhr, varName
             if __LPRINT__: print "tmpCube =>", tmpCube
-            if tmpCube.has_lazy_data():
+            # process the pressure levels one by one, unless the variable 
+            # needs all its levels together (nc file, IMDAA accumulation, 
+            # fill fully masked vars).
+            inSlabs = _regridInSlabs_ and not (__UMReanalysis__ or 
+                        _write2NetcdfFile_ or (varName, varSTASH) in _ncfilesVars_ 
+                                      or __fillFullyMaskedVars__ is not None)
+            if tmpCube.has_lazy_data() and (not inSlabs or tmpCube.coords('pseudo_level')):
                 print "Loaded", tmpCube.standard_name, "into memory",
                 ## By accessing tmpCube.data (even for printing), the full 
                 ## data has been loaded into memory instead of being lazy 
@@ -2061,6 +2436,7 @@ def regridAnlFcstFiles(arg):
                 print "- min", tmpCube.data.min(), "max", tmpCube.data.max(),
                 print "has_lazy_data =", tmpCube.has_lazy_data()
             # end of if tmpCube.has_lazy_data():
+            endPhase(phase)
             
             if not __UMReanalysis__:            
                 if (varName, varSTASH) == ('snowfall_amount', 'm01s00i023'):
@@ -2085,314 +2461,374 @@ def regridAnlFcstFiles(arg):
                     # model, it forecast every one hour. so we must pass as 
                     # '1 hour' to dt intervals argument. 
                     if __LPRINT__: print "action = ", action
-                    tmpCube = cubeAverager(tmpCube, action, dt='1 hour', 
-                                actionIntervals=str(start_step_fcst_hour)+' hour', 
-                                               tpoint=timepoint, fpoint=fcstpoint, 
-                                             tbounds=timebound, fbounds=fcstbound)
+                    with timePhase('average', **tags):
+                        __castToWorkingDtype__(tmpCube)
+                        tmpCube = cubeAverager(tmpCube, action, dt='1 hour', 
+                                    actionIntervals=str(start_step_fcst_hour)+' hour', 
+                                                   tpoint=timepoint, fpoint=fcstpoint, 
+                                                 tbounds=timebound, fbounds=fcstbound)
                 # end of if doMultiHourlyMean and tmpCube.coords('forecast_period')[0].shape[0] > 1:     
             # end of if not __UMReanalysis__:
-            print "before regrid", varName, tmpCube.data.min(), tmpCube.data.max()             
-            exmode = None # required, when user didnt do any regrid
-            # interpolate it as per targetGridResolution deg resolution by 
-            # setting up sample points based on coord            
-            if _doRegrid_:
-                if __LPRINT__: print "From shape", tmpCube.shape                    
-                if (varName, varSTASH) in _precipVars_:
-                    # DO NOT APPLY iris.analysis.Linear(extrapolation_mode='mask'), 
-                    # which writes nan every where for the snowfall_flux,  
-                    # rainfall_flux, precipitation_flux. So donot apply that.         
-                    exmode = 'linear'
-                else:
-                    # In general all the other variables should not be 
-                    # extrapolated over masked grid points.
-                    exmode = 'mask'
-                # end of if (...):
-                # However, if user specified custom method do that!                
-                exmode = _extraPolateMethod_ if _extraPolateMethod_ != 'auto' else exmode
-                # but make sure that soil variables (or whichever variables do not have values over ocean)
-                # do not extrapolate over ocean/masked regions. Otherwise, it will write only nan.
-                exmode = 'mask' if varName in _maskOverOceanVars_ else exmode
+            # regrid, encode & write level by level (see __getCubeSlabs__)
+            varCube = tmpCube
+            for tmpCube in __getCubeSlabs__(varCube, inSlabs):
+                __castToWorkingDtype__(tmpCube)
+                print "before regrid", varName, tmpCube.data.min(), tmpCube.data.max()             
+                exmode = None # required, when user didnt do any regrid
+                phase = startPhase('regrid', **tags)
+                # interpolate it as per targetGridResolution deg resolution by 
+                # setting up sample points based on coord            
+                if _doRegrid_:
+                    if __LPRINT__: print "From shape", tmpCube.shape                    
+                    if (varName, varSTASH) in _precipVars_:
+                        # DO NOT APPLY iris.analysis.Linear(extrapolation_mode='mask'), 
+                        # which writes nan every where for the snowfall_flux,  
+                        # rainfall_flux, precipitation_flux. So donot apply that.         
+                        exmode = 'linear'
+                    else:
+                        # In general all the other variables should not be 
+                        # extrapolated over masked grid points.
+                        exmode = 'mask'
+                    # end of if (...):
+                    # However, if user specified custom method do that!                
+                    exmode = _extraPolateMethod_ if _extraPolateMethod_ != 'auto' else exmode
+                    # but make sure that soil variables (or whichever variables do not have values over ocean)
+                    # do not extrapolate over ocean/masked regions. Otherwise, it will write only nan.
+                    exmode = 'mask' if varName in _maskOverOceanVars_ else exmode
+                
+                    regdCube = None
+                    if _regridEngine_ != 'iris':
+                        # Do regrid by reusing the bilinear weights of this source 
+                        # to target grid which computed only once and stored in 
+                        # tmpPath (shared across vars, hours, processes and cycles).
+                        # 'sparse' engine regrids all the time/level slices of this
+                        # variable by single sparse matrix multiplication.
+                        weightsDir = os.path.join(_tmpDir_, 'regridWeights') if _cacheRegridWeights_ else None
+                        regdCube = regridCube(tmpCube, _targetGrid_, exmode, 
+                                       cacheDir=weightsDir, engine=_regridEngine_)
+                    # end of if _regridEngine_ != 'iris':
                     
-                if os.path.isfile(_targetGridFile_):
-                    print "\n Regridding data to %s degree spatial resolution based on file %s\n" % (_targetGrid_.shape, _targetGridFile_) 
-                    # Do regrid based on user specfied target grid file.
-                    scheme = iris.analysis.Linear(extrapolation_mode=exmode)
-                    regdCube = tmpCube.regrid(_targetGrid_, scheme)
-                    print "regrid data shape", regdCube.shape 
-                else:           
-                    # Do regrid based on user specfied target grid resolution number.
-                    print "\n Regridding data to %sx%s degree spatial resolution \n" % (_targetGridRes_, _targetGridRes_)                    
-                    try:
-                        # This lienar interpolate will do extra polate over ocean even 
-                        # though original data doesnt have values over ocean and wise versa.
-                        # So lets be aware of this.                    
-                        regdCube = tmpCube.interpolate(_targetGrid_, iris.analysis.Linear(extrapolation_mode=exmode))
-                    except Exception as e:
-                        print "ALERT !!! Error while regridding!! %s" % str(e)
-                        print " So skipping this without saving data"
-                        continue
-                    # end of try:      
-            else:
-                # do not apply regrid. this is temporary fix. 
-                regdCube = tmpCube
-            # end of if _doRegrid_:
+                    if regdCube is not None:
+                        print "\n Regridded data using %s engine, shape %s" % (_regridEngine_, str(regdCube.shape))
+                    elif os.path.isfile(_targetGridFile_):
+                        print "\n Regridding data to %s degree spatial resolution based on file %s\n" % (_targetGrid_.shape, _targetGridFile_) 
+                        # Do regrid based on user specfied target grid file.
+                        if _cacheRegridWeights_:
+                            # reuse the iris regridder of this grid & exmode (see 
+                            # regridutils.irisRegrid)
+                            regdCube = irisRegrid(tmpCube, _targetGrid_, exmode)
+                        else:
+                            scheme = iris.analysis.Linear(extrapolation_mode=exmode)
+                            regdCube = tmpCube.regrid(_targetGrid_, scheme)
+                        # end of if _cacheRegridWeights_:
+                        print "regrid data shape", regdCube.shape 
+                    else:           
+                        # Do regrid based on user specfied target grid resolution number.
+                        print "\n Regridding data to %sx%s degree spatial resolution \n" % (_targetGridRes_, _targetGridRes_)                    
+                        try:
+                            # This lienar interpolate will do extra polate over ocean even 
+                            # though original data doesnt have values over ocean and wise versa.
+                            # So lets be aware of this.                    
+                            regdCube = tmpCube.interpolate(_targetGrid_, iris.analysis.Linear(extrapolation_mode=exmode))
+                        except Exception as e:
+                            print "ALERT !!! Error while regridding!! %s" % str(e)
+                            print " So skipping this without saving data"
+                            endPhase(phase, error=str(e))
+                            continue
+                        # end of try:      
+                else:
+                    # do not apply regrid. this is temporary fix. 
+                    regdCube = tmpCube
+                # end of if _doRegrid_:
+                endPhase(phase)
             
-            if _reverseLatitude_:
-                # Need to reverse latitude from SN to NS
-                rcsh = len(regdCube.data.shape)
-                if rcsh == 3:
-                    regdCube.data = regdCube.data[:,::-1,:]
-                elif rcsh == 2:
-                    regdCube.data = regdCube.data[::-1,:]
-                lat = regdCube.coords('latitude')[0]
-                lat.points = lat.points[::-1]
-            # end of if _reverseLatitude_:
+                if _reverseLatitude_:
+                    # Need to reverse latitude from SN to NS
+                    rcsh = len(regdCube.data.shape)
+                    if rcsh == 3:
+                        regdCube.data = regdCube.data[:,::-1,:]
+                    elif rcsh == 2:
+                        regdCube.data = regdCube.data[::-1,:]
+                    lat = regdCube.coords('latitude')[0]
+                    lat.points = lat.points[::-1]
+                # end of if _reverseLatitude_:
             
-            if (varName, varSTASH) in _precipVars_:
-                # Since we are not using 'mask' option for extrapolate while 
-                # doing linear regrid, which bring -ve values after regrid in 
-                # extrapolated grids. So lets make it as 0 as minimum value.
-                regdCube.data[regdCube.data < 0.0] = 0.0
-            # end of if (varName, varSTASH) in _precipVars_:
+                if (varName, varSTASH) in _precipVars_:
+                    # Since we are not using 'mask' option for extrapolate while 
+                    # doing linear regrid, which bring -ve values after regrid in 
+                    # extrapolated grids. So lets make it as 0 as minimum value.
+                    regdCube.data[regdCube.data < 0.0] = 0.0
+                # end of if (varName, varSTASH) in _precipVars_:
             
-            if (varName, varSTASH) in [('land_binary_mask', 'm01s00i030')]:
-                regdCube.data[regdCube.data > 0] = 1                
-            # end of if (varName, varSTASH) in [('land_binary_mask', 'm01s00i030')]:
+                if (varName, varSTASH) in [('land_binary_mask', 'm01s00i030')]:
+                    regdCube.data[regdCube.data > 0] = 1                
+                # end of if (varName, varSTASH) in [('land_binary_mask', 'm01s00i030')]:
             
-            if exmode == 'mask':
-                # For the above set of variables we shouldnot convert into 
-                # masked array. Otherwise its full data goes as nan.                
-                # convert data into masked array
-                regdCube.data = numpy.ma.masked_array(regdCube.data, 
-                                    dtype=numpy.float64, fill_value=9.999e+20) 
+                phase = startPhase('mask', **tags)
+                if exmode == 'mask':
+                    # For the above set of variables we shouldnot convert into 
+                    # masked array. Otherwise its full data goes as nan.                
+                    # convert data into masked array
+                    regdCube.data = numpy.ma.masked_array(regdCube.data, 
+                                        dtype=_workingDtype_, fill_value=9.999e+20) 
                 
-                if (varName, varSTASH) in [('soil_moisture_content', 'm01s08i208'),
-                                           ('moisture_content_of_soil_layer', 'm01s08i223'),
-                                           ('sea_ice_area_fraction', 'm01s00i031'),
-                                           ('sea_ice_thickness', 'm01s00i032'),]:
-                        # We should assign 0 instead 1e-15 only for this var!
-                        regdCube.data[regdCube.data <= 1e-15] = 0.0
-                        regdCube.data[regdCube.data < 0.0] = 0.0
-                elif (varName, varSTASH) in [('soil_temperature', 'm01s03i238'), 
-                                       ('soil_temperature', 'm01s08i225')]:
-                    # We should mask 1e-15 only for this var!
-                    # because 0 will not make sense when temperature unit is Kelvin
-                    regdCube.data = numpy.ma.masked_less_equal(regdCube.data, 1e-15)
-                # http://www.cpc.ncep.noaa.gov/products/wesley/g2grb.html
-                # Says that 9.999e+20 value indicates as missingValue in grib2
-                # by default g2ctl.pl generate "undefr 9.999e+20", so we must 
-                # keep the fill_value / missingValue as 9.999e+20 only.
-                numpy.ma.set_fill_value(regdCube.data, 9.999e+20)    
-            # end of if exmode == 'mask':
+                    if (varName, varSTASH) in [('soil_moisture_content', 'm01s08i208'),
+                                               ('moisture_content_of_soil_layer', 'm01s08i223'),
+                                               ('sea_ice_area_fraction', 'm01s00i031'),
+                                               ('sea_ice_thickness', 'm01s00i032'),]:
+                            # We should assign 0 instead 1e-15 only for this var!
+                            regdCube.data[regdCube.data <= 1e-15] = 0.0
+                            regdCube.data[regdCube.data < 0.0] = 0.0
+                    elif (varName, varSTASH) in [('soil_temperature', 'm01s03i238'), 
+                                           ('soil_temperature', 'm01s08i225')]:
+                        # We should mask 1e-15 only for this var!
+                        # because 0 will not make sense when temperature unit is Kelvin
+                        regdCube.data = numpy.ma.masked_less_equal(regdCube.data, 1e-15)
+                    # http://www.cpc.ncep.noaa.gov/products/wesley/g2grb.html
+                    # Says that 9.999e+20 value indicates as missingValue in grib2
+                    # by default g2ctl.pl generate "undefr 9.999e+20", so we must 
+                    # keep the fill_value / missingValue as 9.999e+20 only.
+                    numpy.ma.set_fill_value(regdCube.data, 9.999e+20)    
+                # end of if exmode == 'mask':
                         
-            if __fillFullyMaskedVars__ is not None and isinstance(regdCube.data, numpy.ma.masked_array):
-                # yes, it is ma array
-                if regdCube.data.mask.all():
-                    # Now data is fully masked. So lets fill with user passed value.
-                    # And still create ma array
-                    regdCube.data = regdCube.data.filled(__fillFullyMaskedVars__)
-                    print "filled masked vars", regdCube.data
-                    regdCube.data = numpy.ma.masked_array(regdCube.data.filled(__fillFullyMaskedVars__),
-                                                         fill_value=9.999e+20) 
-                elif regdCube.data.min() == regdCube.data.max():
-                    # Both min and max are same value. But its mask is not fully True.
-                    # So previous condition not executed, anyhow lets set 
-                    # fully the value of fillFullyMaskedVars.
-                    print "Both min and max are same. So lets fillFullyMaskedVars as", __fillFullyMaskedVars__ 
-                    regdCube.data = numpy.ma.masked_array(regdCube.data.filled(__fillFullyMaskedVars__), 
-                                                        fill_value=9.999e+20)
-            # end of if __fillFullyMaskedVars__ and ...:
-            print "regrid done"
-            print "after regrid", varName, regdCube.data.min(), regdCube.data.max() 
-            if __LPRINT__: print "To shape", regdCube.shape  
-            regdCube.attributes = tmpCube.attributes
-            if __LPRINT__: print "set the attributes back to regdCube"              
-            if __LPRINT__: print "regdCube => ", regdCube
-            # get the regridded lat/lons
-            stdNm, stash, fcstTm, refTm, lat1, lon1 = getCubeAttr(regdCube)
-            if __LPRINT__: print "Got attributes from regdCube"
-            # save the cube in append mode as a grib2 file       
-            if __UMReanalysis__:
-                hr = '00'
-            elif fcstTm.bounds is not None:
-                # (need this for pf files)
-                if dtype == 'ana':
-                    # this is needed for analysis 00th simulated_hr
-                    # get the first hour from bounds
-                    if __anl_step_hour__ == 1: 
-                        hr = int(fhr)
-                    elif __anl_step_hour__ == 3:                        
-                        # for 3-hourly ana file, we need to subtract 3 to get
-                        # corresponding out hr. 
-                        # i.e. 3 means 0. Do not applicable for instantaneous fields.
-                        if fhr == 1.5:
-                            hr = str(int(fcstTm.bounds[-1][-1]))
-                        elif fhr == 4.5:
-                            hr = str(int(fcstTm.bounds[-1][0]) - 3)
-                    elif __anl_step_hour__ == 6:
-                        hr = str(int(fcstTm.bounds[-1][0]))
-                elif dtype == 'fcst':
-                    # this is needed for forecast 00th simulated_hr
-                    # get the last hour from bounds
-                    hr = str(int(fcstTm.bounds[-1][-1]))
-                    if (varName, varSTASH) in _accumulationVars_ and __fcst_step_hour__ == 24:
-                        # just subtract 3 hour. so that file name will be consistent with other 
-                        # variable, file names.
-                        hr = str(int(fcstTm.bounds[-1][-1]) - 3)   
+                if __fillFullyMaskedVars__ is not None and isinstance(regdCube.data, numpy.ma.masked_array):
+                    # yes, it is ma array
+                    if regdCube.data.mask.all():
+                        # Now data is fully masked. So lets fill with user passed value.
+                        # And still create ma array
+                        regdCube.data = regdCube.data.filled(__fillFullyMaskedVars__)
+                        print "filled masked vars", regdCube.data
+                        regdCube.data = numpy.ma.masked_array(regdCube.data.filled(__fillFullyMaskedVars__),
+                                                             fill_value=9.999e+20) 
+                    elif regdCube.data.min() == regdCube.data.max():
+                        # Both min and max are same value. But its mask is not fully True.
+                        # So previous condition not executed, anyhow lets set 
+                        # fully the value of fillFullyMaskedVars.
+                        print "Both min and max are same. So lets fillFullyMaskedVars as", __fillFullyMaskedVars__ 
+                        regdCube.data = numpy.ma.masked_array(regdCube.data.filled(__fillFullyMaskedVars__), 
+                                                            fill_value=9.999e+20)
+                # end of if __fillFullyMaskedVars__ and ...:
+                endPhase(phase)
+                print "regrid done"
+                print "after regrid", varName, regdCube.data.min(), regdCube.data.max() 
+                if __LPRINT__: print "To shape", regdCube.shape  
+                regdCube.attributes = tmpCube.attributes
+                if __LPRINT__: print "set the attributes back to regdCube"              
+                if __LPRINT__: print "regdCube => ", regdCube
+                # get the regridded lat/lons
+                stdNm, stash, fcstTm, refTm, lat1, lon1 = getCubeAttr(regdCube)
+                if __LPRINT__: print "Got attributes from regdCube"
+                # save the cube in append mode as a grib2 file       
+                if __UMReanalysis__:
+                    hr = '00'
+                elif fcstTm.bounds is not None:
+                    # (need this for pf files)
+                    if dtype == 'ana':
+                        # this is needed for analysis 00th simulated_hr
+                        # get the first hour from bounds
+                        if __anl_step_hour__ == 1: 
+                            hr = int(fhr)
+                        elif __anl_step_hour__ == 3:                        
+                            # for 3-hourly ana file, we need to subtract 3 to get
+                            # corresponding out hr. 
+                            # i.e. 3 means 0. Do not applicable for instantaneous fields.
+                            if fhr == 1.5:
+                                hr = str(int(fcstTm.bounds[-1][-1]))
+                            elif fhr == 4.5:
+                                hr = str(int(fcstTm.bounds[-1][0]) - 3)
+                        elif __anl_step_hour__ == 6:
+                            hr = str(int(fcstTm.bounds[-1][0]))
+                    elif dtype == 'fcst':
+                        # this is needed for forecast 00th simulated_hr
+                        # get the last hour from bounds
+                        hr = str(int(fcstTm.bounds[-1][-1]))
+                        if (varName, varSTASH) in _accumulationVars_ and __fcst_step_hour__ == 24:
+                            # just subtract 3 hour. so that file name will be consistent with other 
+                            # variable, file names.
+                            hr = str(int(fcstTm.bounds[-1][-1]) - 3)   
                 
-                if __LPRINT__: print "Bounds comes in ", hr, fcstTm.bounds, fileName                        
-            else:
-                # get the fcst time point 
-                # this is needed for analysis/forecast 00th simulated_hr
-                hr = str(int(fcstTm.points))
-                if __LPRINT__: print "points comes in ", hr, fileName 
-            # end of if fcstTm.bounds:
-            if dtype == 'ana': hr = str(int(hr) + int(__utc__))   # IMPORTANT
-            # generate the out file name based on actual informations                                 
-            outFn = __genAnlFcstOutFileName__(outFileNameStructure, 
-                                 outFnIndecies, _current_date_, hr, 
-                                           __utc__, _preExtension_) 
-            # get the file full name except last extension, for the purpose
-            # of writing intermediate nc files
-            ofname = outFn.split(fileExtension)[0]                    
-            ncfile = False
-            if regdCube.coords('soil_model_level_number') and __UMReanalysis__:
-                if (varName, varSTASH) == ('downward_heat_flux_in_soil', 'm01s03i202'):
-                    if len(regdCube.coords('soil_model_level_number')[0].points) == 1:
-                        # just remove this single 0th level coords
-                        # reason : couldnt write back properly.
-                        regdCube.remove_coord('soil_model_level_number')
+                    if __LPRINT__: print "Bounds comes in ", hr, fcstTm.bounds, fileName                        
+                else:
+                    # get the fcst time point 
+                    # this is needed for analysis/forecast 00th simulated_hr
+                    hr = str(int(fcstTm.points))
+                    if __LPRINT__: print "points comes in ", hr, fileName 
+                # end of if fcstTm.bounds:
+                if dtype == 'ana': hr = str(int(hr) + int(__utc__))   # IMPORTANT
+                # generate the out file name based on actual informations                                 
+                outFn = __genAnlFcstOutFileName__(outFileNameStructure, 
+                                     outFnIndecies, _current_date_, hr, 
+                                               __utc__, _preExtension_) 
+                # final (ordered) out file name
+                outFileName = outFn.replace(_preExtension_, '')
+                # get the file full name except last extension, for the purpose
+                # of writing intermediate nc files
+                ofname = outFn.split(fileExtension)[0]                    
+                ncfile = False
+                if regdCube.coords('soil_model_level_number') and __UMReanalysis__:
+                    if (varName, varSTASH) == ('downward_heat_flux_in_soil', 'm01s03i202'):
+                        if len(regdCube.coords('soil_model_level_number')[0].points) == 1:
+                            # just remove this single 0th level coords
+                            # reason : couldnt write back properly.
+                            regdCube.remove_coord('soil_model_level_number')
                         
-            if regdCube.coords('soil_model_level_number') or regdCube.coords('depth'):
-                # NOTE : THIS SECTION WILL WORKS ONLY FOR SOIL MOISTURE AND
-                # SOIL TEMPERATUE AT 4 LAYERS, NOT FOR SINGLE LAYER OR 
-                # NOT FOR Root zone Soil Moisture Content !!!
+                if regdCube.coords('soil_model_level_number') or regdCube.coords('depth'):
+                    # NOTE : THIS SECTION WILL WORKS ONLY FOR SOIL MOISTURE AND
+                    # SOIL TEMPERATUE AT 4 LAYERS, NOT FOR SINGLE LAYER OR 
+                    # NOT FOR Root zone Soil Moisture Content !!!
                  
-                # Get soil_model_level_number coords from the cube.
-                # We need to update this variable, which will be replicated
-                # in the cube attributes. By default iris-1.9 will not 
-                # support to handle soil_model_level_number, so we need to 
-                # tweak it by following way.
-                depth_below_land_surface = regdCube.coords('soil_model_level_number')
-                if not depth_below_land_surface:
-                    depth_below_land_surface = regdCube.coords('depth')
+                    # Get soil_model_level_number coords from the cube.
+                    # We need to update this variable, which will be replicated
+                    # in the cube attributes. By default iris-1.9 will not 
+                    # support to handle soil_model_level_number, so we need to 
+                    # tweak it by following way.
+                    depth_below_land_surface = regdCube.coords('soil_model_level_number')
+                    if not depth_below_land_surface:
+                        depth_below_land_surface = regdCube.coords('depth')
                 
-                depth_below_land_surface = depth_below_land_surface[0]
-                _updateDepthBelowLandSurfaceCoords4Levs(depth_below_land_surface)
-                if __LPRINT__: print "depth_below_land_surface", depth_below_land_surface
+                    depth_below_land_surface = depth_below_land_surface[0]
+                    _updateDepthBelowLandSurfaceCoords4Levs(depth_below_land_surface)
+                    if __LPRINT__: print "depth_below_land_surface", depth_below_land_surface
                 
-                if (regdCube.standard_name == 'moisture_content_of_soil_layer') and not __UMReanalysis__:
-                    # pass the vertical layer depth in millimeter
-                    _convert2VolumetricMoisture(regdCube, 
-                                        levels=[100.0, 250.0, 650.0, 2000.0])
-                    print "converted four layer soil moisture to volumetric"                
-                    # We need to save this variable into nc file, why because
-                    # if we saved into grib2 and then re-read it while re-ordering
-                    # variables, iris couldnt load variables with 
-                    # depth_below_land_surfacer properly. We need to touch the 
-                    # _load_rules. So for timebeing, we saved it as seperate nc 
-                    # file. In iris-1.9 we couldnt append more variables into 
-                    # nc file. so we saved into muliple individual nc files, only
-                    # those who have depth_below_land_surface and will be deleted
-                    # after inserted properly into orderd grib2 files.
-                    ncfile = True
-                # end of if regdCube.standard_name == 'moisture_content_of_soil_layer':                
-                print "after soil_model_level_number", regdCube.data 
-            # end of if regdCube.coords('soil_model_level_number'):
+                    if (regdCube.standard_name == 'moisture_content_of_soil_layer') and not __UMReanalysis__:
+                        # pass the vertical layer depth in millimeter
+                        _convert2VolumetricMoisture(regdCube, 
+                                            levels=[100.0, 250.0, 650.0, 2000.0])
+                        print "converted four layer soil moisture to volumetric"                
+                        # We need to save this variable into nc file, why because
+                        # if we saved into grib2 and then re-read it while re-ordering
+                        # variables, iris couldnt load variables with 
+                        # depth_below_land_surfacer properly. We need to touch the 
+                        # _load_rules. So for timebeing, we saved it as seperate nc 
+                        # file. In iris-1.9 we couldnt append more variables into 
+                        # nc file. so we saved into muliple individual nc files, only
+                        # those who have depth_below_land_surface and will be deleted
+                        # after inserted properly into orderd grib2 files.
+                        ncfile = True
+                    # end of if regdCube.standard_name == 'moisture_content_of_soil_layer':                
+                    print "after soil_model_level_number", regdCube.data 
+                # end of if regdCube.coords('soil_model_level_number'):
             
-            if (varName, varSTASH) == ('soil_moisture_content', 'm01s08i208'):
-                # NOTE : THIS SECTION WILL WORKS ONLY FOR SINGLE LAYERED 
-                # Root zone Soil Moisture Content, NOT FOR 4 LAYERS.
+                if (varName, varSTASH) == ('soil_moisture_content', 'm01s08i208'):
+                    # NOTE : THIS SECTION WILL WORKS ONLY FOR SINGLE LAYERED 
+                    # Root zone Soil Moisture Content, NOT FOR 4 LAYERS.
                 
-                # By default this variable doesn't have any vertical coords 
-                # inforomation. So we must add explicitly by ourself.
-                _createDepthBelowLandSurfaceCoords1Lev(regdCube)
-                if not __UMReanalysis__:
-                    # Convert this into volumetirc soil moisture. This varibale
-                    # vertical level at 2meter in millimeter.
-                    _convert2VolumetricMoisture(regdCube, levels=3000.0)
-                    print "converted single layer soil moisture to volumetric"
-                    ncfile = True
-            # end of if (varName, varSTASH) in (...):
+                    # By default this variable doesn't have any vertical coords 
+                    # inforomation. So we must add explicitly by ourself.
+                    _createDepthBelowLandSurfaceCoords1Lev(regdCube)
+                    if not __UMReanalysis__:
+                        # Convert this into volumetirc soil moisture. This varibale
+                        # vertical level at 2meter in millimeter.
+                        _convert2VolumetricMoisture(regdCube, levels=3000.0)
+                        print "converted single layer soil moisture to volumetric"
+                        ncfile = True
+                # end of if (varName, varSTASH) in (...):
             
-            if (varName, varSTASH) in [('convective_rainfall_amount', 'm01s05i201'),
-                            ('convective_snowfall_amount', 'm01s05i202'),
-                            ('precipitation_amount', 'm01s05i226'),
-                            ('stratiform_rainfall_amount', 'm01s04i201'),
-                            ('stratiform_snowfall_amount', 'm01s04i202'),] and __UMReanalysis__:
-                ### This should be done only for IMDAA reanalysis project.
-                print regdCube.data.min(), regdCube.data.max()
-                clength = regdCube.shape[0]
-                # subtract from previously cummulated to make it as hourly accumulated, 
-                # instead of writing as hourly cummulated.
-                for ci in range(clength-1, 1, -1): regdCube.data[ci] -= regdCube.data[ci-1]
+                if (varName, varSTASH) in [('convective_rainfall_amount', 'm01s05i201'),
+                                ('convective_snowfall_amount', 'm01s05i202'),
+                                ('precipitation_amount', 'm01s05i226'),
+                                ('stratiform_rainfall_amount', 'm01s04i201'),
+                                ('stratiform_snowfall_amount', 'm01s04i202'),] and __UMReanalysis__:
+                    ### This should be done only for IMDAA reanalysis project.
+                    print regdCube.data.min(), regdCube.data.max()
+                    clength = regdCube.shape[0]
+                    # subtract from previously cummulated to make it as hourly accumulated, 
+                    # instead of writing as hourly cummulated.
+                    for ci in range(clength-1, 1, -1): regdCube.data[ci] -= regdCube.data[ci-1]
                 
-                # removing cummulative time informations
-                regdCube.remove_coord('forecast_period')
-                regdCube.remove_coord('time')
+                    # removing cummulative time informations
+                    regdCube.remove_coord('forecast_period')
+                    regdCube.remove_coord('time')
                 
-                # here the snowfall_amount extract from 0 to 9 timestep
-                snowvarCon = iris.Constraint(name='snowfall_amount')
-                snowSTASHCon = iris.AttributeConstraint(STASH='m01s00i023')
-                snowVar = cubes.extract(snowvarCon & snowSTASHCon)[0]
-                # adding time information same as snowfall_amount
-                regdCube.add_dim_coord(snowVar.coord('time'), 0)
-                regdCube.add_aux_coord(snowVar.coord('forecast_period'), 0)
+                    # here the snowfall_amount extract from 0 to 9 timestep
+                    snowVar = cubesIndex[('snowfall_amount', 'm01s00i023')][0]
+                    # adding time information same as snowfall_amount
+                    regdCube.add_dim_coord(snowVar.coord('time'), 0)
+                    regdCube.add_aux_coord(snowVar.coord('forecast_period'), 0)
                 
-                # extract only 6 hours (hourly) time steps in all 4 cycles, so that it will become 
-                # 24 hours (hourly) time steps.
-                regdCube = regdCube.extract(iris.Constraint(forecast_period=[1, 2, 3, 4, 5, 6]))
-            # end of if (varName, varSTASH) ... and __UMReanalysis__:
+                    # extract only 6 hours (hourly) time steps in all 4 cycles, so that it will become 
+                    # 24 hours (hourly) time steps.
+                    regdCube = regdCube.extract(iris.Constraint(forecast_period=[1, 2, 3, 4, 5, 6]))
+                # end of if (varName, varSTASH) ... and __UMReanalysis__:
             
             
-            if (varName, varSTASH) in _ncfilesVars_:
-                # other than soil_model_level_number, few variables may be 
-                # need to write into nc file and then convert to grib2. why 
-                # because of duplicate grib param id (but actually not, if 
-                # we implement typeOfFirstFixedSurface). so we are stoing into 
-                # nc file, then load into memory (cf_standard_name) while 
-                # re-ordering, followed by save into grib2 file. cf -> grib2 
-                # dictionary may not throw error, due to different key cfname.
-                ncfile = True                
-            # end of if (varName, varSTASH) in _ncfilesVars_:
+                if (varName, varSTASH) in _ncfilesVars_:
+                    # other than soil_model_level_number, few variables may be 
+                    # need to write into nc file and then convert to grib2. why 
+                    # because of duplicate grib param id (but actually not, if 
+                    # we implement typeOfFirstFixedSurface). so we are stoing into 
+                    # nc file, then load into memory (cf_standard_name) while 
+                    # re-ordering, followed by save into grib2 file. cf -> grib2 
+                    # dictionary may not throw error, due to different key cfname.
+                    ncfile = True                
+                # end of if (varName, varSTASH) in _ncfilesVars_:
             
-            if _write2NetcdfFile_:
-               ncfile = True
-               # store all vars into ncfileVars list
-            # generate intermediate nc filename 
-            if ncfile: outFn = varSTASH + '_'+ ofname + '.nc' 
-            # generate complete outfile path 
-            outFn = os.path.join(_opPath_, outFn)
-            print "Going to be save into ", outFn
-            print "regfCube =====", regdCube
-            if ncfile:
-                try:
-                    # save nc files . writing individual nc files with stash name in paralelly. 
-                    # so no need to lock the file.
-                    iris.fileformats.netcdf.save(regdCube, outFn,netcdf_format="NETCDF4")            
-                except Exception as e:
-                    print "ALERT !!! Error while saving!! %s" % str(e)
-                    print " So skipping this without saving data"
-                    continue            
+                if _write2NetcdfFile_:
+                   ncfile = True
+                   # store all vars into ncfileVars list
+                # generate intermediate nc filename 
+                if ncfile: outFn = varSTASH + '_'+ ofname + '.nc' 
+                # generate complete outfile path 
+                outFn = os.path.join(_opPath_, outFn)
+                print "Going to be save into ", outFn
+                print "regfCube =====", regdCube
+                if ncfile:
+                    try:
+                        # save nc files . writing individual nc files with stash name in paralelly. 
+                        # so no need to lock the file.
+                        with timePhase('write', **tags):
+                            iris.fileformats.netcdf.save(regdCube, outFn,netcdf_format="NETCDF4")            
+                    except Exception as e:
+                        print "ALERT !!! Error while saving!! %s" % str(e)
+                        print " So skipping this without saving data"
+                        continue            
 
-            else:
-                try:                
-                    # _lock_ other threads / processors from being access same file 
-                    # to write other variables
-                    _lock_.acquire() 
-                    iris.fileformats.grib.save_grib2(regdCube, outFn, append=True) # save grib2 file 
-                except Exception as e:
-                    print "ALERT !!! Error while saving!! %s" % str(e)
-                    print " So skipping this without saving data"
-                    continue
-                finally:
-                    # release the _lock_, let other threads/processors access this file.
-                    _lock_.release()
-                # end of try:
-            # end of if ncfile:
-            print "saved"            
-            # make memory free 
-            del regdCube, tmpCube
+                elif _writeGrib2Shards_:
+                    # write into this worker's own shard file, so no need to lock.
+                    # mergeGrib2Shards will concatenate all the shards into outFn 
+                    # in the _orderedVars_ order, once all the workers are done.
+                    shardFn = __genGrib2ShardFileName__(outFn, varName, varSTASH)
+                    try:
+                        if _reorderGrib2Bytes_ and (varName, varSTASH) not in _grib2DecodeVars_:
+                            # doShuffleVarsInOrder will not decode & tweak the 
+                            # messages again. So tweak it while writing itself.
+                            with timePhase('encode', **tags):
+                                messages = list(tweaked_messages([regdCube]))
+                            with timePhase('write', **tags):
+                                iris.fileformats.grib.save_messages(messages, 
+                                                            shardFn, append=True)
+                            del messages
+                        else:
+                            with timePhase('write', **tags):
+                                iris.fileformats.grib.save_grib2(regdCube, shardFn, append=True) # save grib2 shard file 
+                    except Exception as e:
+                        print "ALERT !!! Error while saving!! %s" % str(e)
+                        print " So skipping this without saving data"
+                        continue
+                    # end of try:
+                else:
+                    try:                
+                        # _lock_ other threads / processors from being access same file 
+                        # to write other variables
+                        _lock_.acquire() 
+                        with timePhase('write', **tags):
+                            iris.fileformats.grib.save_grib2(regdCube, outFn, append=True) # save grib2 file 
+                    except Exception as e:
+                        print "ALERT !!! Error while saving!! %s" % str(e)
+                        print " So skipping this without saving data"
+                        continue
+                    finally:
+                        # release the _lock_, let other threads/processors access this file.
+                        _lock_.release()
+                    # end of try:
+                # end of if ncfile:
+                print "saved"            
+                written.append((outFileName, varName, varSTASH, 
+                                       int(numpy.prod(regdCube.shape[:-2]))))
+                # make memory free 
+                del regdCube, tmpCube
+            # end of for tmpCube in __getCubeSlabs__(varCube, inSlabs):
+            del varCube
         # end of for fhr in fcstHours:
     # end of for varName, varSTASH in varNamesSTASH:
     # make memory free
@@ -2400,11 +2836,188 @@ def regridAnlFcstFiles(arg):
     
     print "  Time taken to convert the file: %8.5f seconds \n" %(time.time()-_startT_)
     print " Finished converting file: %s into grib2 format for fcst file: %s \n" %(fileName,hr)
+    return written
 # end of def regridAnlFcstFiles(fname):
 
+def __genGrib2ShardFileName__(outFn, varName, varSTASH):
+    # grib2 shard file name of this worker process for the variable, which 
+    # will be merged into outFn by mergeGrib2Shards.
+    return '%s.%s.%s.%d.shard' % (outFn, varSTASH, varName, os.getpid())
+# end of def __genGrib2ShardFileName__(outFn, varName, varSTASH):
+
+def _mergeGrib2ShardFiles(arg):
+    # concatenate (byte copy) the sorted shard files into outfile and remove
+    # the shard files. If writeIndex is True, then store the byte range of 
+    # every shard along with its variable into outfile.shardidx file, which 
+    # will be used by _reorderGrib2Messages.
+    outFile, shardFiles, writeIndex = arg
+    offset = os.path.getsize(outFile) if os.path.isfile(outFile) else 0
+    shardIndex = []
+    with open(outFile, 'ab') as ofile:
+        for varName, varSTASH, shardFile in shardFiles:
+            size = os.path.getsize(shardFile)
+            with open(shardFile, 'rb') as sfile:
+                shutil.copyfileobj(sfile, ofile, 16 * 1024 * 1024)
+            os.remove(shardFile)
+            shardIndex.append('%d %d %s %s\n' % (offset, size, varName, varSTASH))
+            offset += size
+        # end of for varName, varSTASH, shardFile in shardFiles:
+    # end of with open(outFile, 'ab') as ofile:
+    if writeIndex:
+        with open(outFile + '.shardidx', 'a') as ifile:
+            ifile.writelines(shardIndex)
+    # end of if writeIndex:
+    print "merged %d shard files into %s" % (len(shardFiles), outFile)
+# end of def _mergeGrib2ShardFiles(arg):
+
+def mergeGrib2Shards(path, outFiles=None):
+    """
+    Merge the per worker grib2 shard files (written by regridAnlFcstFiles)
+    into its _unOrdered grib2 out files by raw byte copy. The shards are 
+    concatenated in the _convertVars_ order (if user passed) otherwise in 
+    the _orderedVars_ order, followed by worker process id.
+    
+    :param path: out path which contains the shard files.
+    :param outFiles: merge shards of only these _unOrdered out file names.
+                     By default None, merge shards of all the out files.
+    """
+    global _orderedVars_, _convertVars_, _reorderGrib2Bytes_
+    
+    if _convertVars_:
+        # user has passed their own ordered and limited vars 
+        orderedVarsList = _convertVars_
+    else:
+        # use inbuilt ordered list from this module itself
+        orderedVarsList = _orderedVars_['PressureLevel'] + _orderedVars_['nonPressureLevel']
+    # keep first index of the variable in the ordered list
+    varsOrder = {}
+    for idx, var in enumerate(orderedVarsList): varsOrder.setdefault(var, idx)
+    
+    shards = {}
+    for sfile in os.listdir(path):
+        if not sfile.endswith('.shard'): continue
+        outFn, varSTASH, varName, pid, _ = sfile.rsplit('.', 4)
+        if outFiles is not None and outFn not in outFiles: continue
+        # unknown variables will be written at last
+        vidx = varsOrder.get((varName, varSTASH), len(varsOrder))
+        shards.setdefault(outFn, []).append((vidx, varName, varSTASH, int(pid), 
+                                             os.path.join(path, sfile)))
+    # end of for sfile in os.listdir(path):
+    if not shards: return 
+    
+    tasks = []
+    for outFn, shardFiles in shards.iteritems():
+        shardFiles.sort()
+        tasks.append((os.path.join(path, outFn), [(sf[1], sf[2], sf[-1]) 
+                         for sf in shardFiles], _reorderGrib2Bytes_))
+    # end of for outFn, shardFiles in shards.iteritems():
+    
+    pool = __getWorkerPool__()
+    print "Merging grib2 shard files of %d outfiles in workers pool" % len(tasks)
+    results = pool.map(_mergeGrib2ShardFiles, tasks, chunksize=1)
+# end of def mergeGrib2Shards(path, outFiles=None):
+
+def __getGrib2Packing__(wgrib2Arguments):
+    """
+    Returns (packingType, orderOfSpatialDifferencing, bitsPerValue) which is
+    equivalent of wgrib2Arguments, if it has only the packing options 
+    (-set_grib_type, -set_bin_prec, -ncpu, -grib_out). So that the messages
+    can be packed in tweaked_messages itself and every grib2 file is written
+    only once. Otherwise returns None (i.e. wgrib2 must be executed).
+    """
+    if not wgrib2Arguments: return None
+    # wgrib2 -set_grib_type options and its grib_api packingType, order
+    gribTypes = {'simple': ('grid_simple', None), 
+                 'complex1': ('grid_complex', None), 
+                 'complex2': ('grid_complex_spatial_differencing', 1), 
+                 'complex3': ('grid_complex_spatial_differencing', 2)}
+    # short names of wgrib2 grib types
+    for n in '123': gribTypes['c' + n] = gribTypes['complex' + n]
+    
+    packingType, order, bitsPerValue = None, None, None
+    args = wgrib2Arguments.split()
+    idx = 0
+    while idx < len(args):
+        arg = args[idx]
+        val = args[idx+1] if idx+1 < len(args) else ''
+        if arg == '-set_grib_type' and val in gribTypes:
+            packingType, order = gribTypes[val]
+            idx += 2
+        elif arg == '-set_bin_prec' and val.isdigit():
+            bitsPerValue = int(val)
+            idx += 2
+        elif arg == '-ncpu' and val.isdigit():
+            idx += 2
+        elif arg == '-grib_out' and idx == len(args) - 1:
+            idx += 1
+        else:
+            # some other wgrib2 option, which can not be done here
+            return None
+    # end of while idx < len(args):
+    if packingType is None and bitsPerValue is None: return None
+    return (packingType, order, bitsPerValue)
+# end of def __getGrib2Packing__(wgrib2Arguments):
+
+def __packGrib2Message__(grib_message):
+    # re-pack the data section of grib2 message as per _grib2Packing_. 
+    # It is in memory encoding, instead of re-writing the file by wgrib2.
+    global _grib2Packing_
+    
+    packingType, order, bitsPerValue = _grib2Packing_
+    values = gribapi.grib_get_double_array(grib_message, "values")
+    if packingType: gribapi.grib_set(grib_message, "packingType", packingType)
+    if order: gribapi.grib_set_long(grib_message, "orderOfSpatialDifferencing", order)
+    if bitsPerValue: gribapi.grib_set_long(grib_message, "bitsPerValue", bitsPerValue)
+    gribapi.grib_set_double_array(grib_message, "values", values)
+# end of def __packGrib2Message__(grib_message):
+
+# derivedForecast (code table 4.7) of the realization cell methods
+# http://www.nco.ncep.noaa.gov/pmb/docs/grib2/grib2_table4-7.shtml
+_derivedForecastCodes_ = {'mean': 0, 'standard_deviation': 4, 'minimum': 8, 
+                                                             'maximum': 9}
+
+def __setEnsembleStatisticKeys__(cube, grib_message, statistic):
+    # set the product definition template of ensemble statistics cube 
+    # (of cubeutils.cubeRealizationStatistics) as derived forecast (4.2), 
+    # percentile (4.6), probability (4.5) or its time interval templates 
+    # (4.12, 4.10, 4.9), if iris has set time interval template 4.8.
+    method, value, nmembers = statistic
+    interval = gribapi.grib_get_long(grib_message, "productDefinitionTemplateNumber") == 8
+    # http://www.nco.ncep.noaa.gov/pmb/docs/grib2/grib2_table1-4.shtml
+    # 5 points control and perturbed forecast products
+    gribapi.grib_set_long(grib_message, "typeOfProcessedData", 5)
+    # http://www.nco.ncep.noaa.gov/pmb/docs/grib2/grib2_table4-3.shtml 
+    # 4 points ensemble forecast
+    gribapi.grib_set_long(grib_message, "typeOfGeneratingProcess", 4)
+    if method == 'percentile':
+        gribapi.grib_set(grib_message, "productDefinitionTemplateNumber", 10 if interval else 6)
+        gribapi.grib_set_long(grib_message, "percentileValue", int(round(value)))
+    elif method == 'probability':
+        gribapi.grib_set(grib_message, "productDefinitionTemplateNumber", 9 if interval else 5)
+        gribapi.grib_set_long(grib_message, "forecastProbabilityNumber", 1)
+        gribapi.grib_set_long(grib_message, "totalNumberOfForecastProbabilities", 1)
+        # http://www.nco.ncep.noaa.gov/pmb/docs/grib2/grib2_table4-9.shtml
+        # 3 points probability of event above lower limit
+        gribapi.grib_set_long(grib_message, "probabilityType", 3)
+        scale = 0
+        while scale < 6 and abs(value * 10**scale - round(value * 10**scale)) > 1e-6:
+            scale += 1
+        gribapi.grib_set_long(grib_message, "scaleFactorOfLowerLimit", scale)
+        gribapi.grib_set_long(grib_message, "scaledValueOfLowerLimit", 
+                                           int(round(value * 10**scale)))
+    else:
+        gribapi.grib_set(grib_message, "productDefinitionTemplateNumber", 12 if interval else 2)
+        gribapi.grib_set_long(grib_message, "derivedForecast", 
+                                 _derivedForecastCodes_.get(method, 255))
+        gribapi.grib_set_long(grib_message, "numberOfForecastsInEnsemble", nmembers)
+    # end of if method == 'percentile':
+    print "reset productDefinitionTemplateNumber for ensemble", method, "of", cube.standard_name
+# end of def __setEnsembleStatisticKeys__(cube, grib_message, statistic):
+
 def tweaked_messages(cubeList):
     global _ncmrGrib2LocalTableVars_, _aod_pseudo_level_var_, __UMtype__, \
-           __setGrib2TableParameters__, __soilFirstSecondFixedSurfaceUnit__           
+           __setGrib2TableParameters__, __soilFirstSecondFixedSurfaceUnit__, \
+           _grib2Packing_
     
     for cube in cubeList:
         for cube, grib_message in iris.fileformats.grib.as_pairs(cube): #save_pairs_from_cube(cube):
@@ -2413,6 +3026,11 @@ def tweaked_messages(cubeList):
             gribapi.grib_set_long(grib_message, "centre", 29) # RMC of India
             gribapi.grib_set_long(grib_message, "subCentre", 0) # No subcentre
             print "reset the centre as 29"
+            statistic = getRealizationStatistic(cube)
+            if statistic is not None:
+                # ensemble statistics cube
+                __setEnsembleStatisticKeys__(cube, grib_message, statistic)
+            # end of if statistic is not None:
             if cube.coord("forecast_period").bounds is not None:        
                 # if we set bounds[0][0] = 0, wgrib2 gives error for 0 fcst time.
                 # so we need to set proper time intervals 
@@ -2515,6 +3133,10 @@ def tweaked_messages(cubeList):
                     gribapi.grib_set_long(grib_message, "versionNumberOfGribLocalTables", 1)
                 # end of if cube.standard_name in _ncmrGrib2LocalTableVars_:
             # end of if cube.standard_name or ...:
+            if _grib2Packing_:
+                # pack (say complex2) here itself instead of wgrib2 
+                __packGrib2Message__(grib_message)
+            # end of if _grib2Packing_:
             if __setGrib2TableParameters__:
                 # This user defined parameters must be at last of this function!
                 for key, val in __setGrib2TableParameters__:
@@ -2528,11 +3150,209 @@ def tweaked_messages(cubeList):
     # end of for cube in cubeList:
 # end of def tweaked_messages(cube):
 
-def doShuffleVarsInOrder(fpath):
+def __getGrib2DecodeVars__():
+    # doShuffleVarsInOrder must decode the variables into iris cubes, which
+    # has to be derived / masked / loaded from intermediate nc files, along
+    # with its depedendant variables. Returns those (varName, varSTASH) of 
+    # _convertVars_. Re-ordering all the other variables is just shuffling 
+    # the grib2 messages, which can be done by raw byte copy.
+    global _convertVars_, _maskOverOceanVars_, _aod_pseudo_level_var_, \
+           _ncfilesVars_, _depedendantVars_
+    
+    decodeVars = []
+    for (varName, varSTASH) in _convertVars_:
+        if not (varSTASH == 'None' or  # derived vars
+                varName in _maskOverOceanVars_ or 
+                varName in _aod_pseudo_level_var_ or 
+                (varName, varSTASH) in _ncfilesVars_ or 
+                (varName, varSTASH) in [('upward_air_velocity_in_pascal', 'm01s15i242'),
+                      ('surface_geopotential_height', 'm01s00i033')]): continue
+        dvars = _depedendantVars_.get((varName, varSTASH), [])
+        if varName in _maskOverOceanVars_: dvars = dvars + [('land_binary_mask', 'm01s00i030')]
+        for var in [(varName, varSTASH)] + dvars:
+            if var in _convertVars_ and var not in decodeVars: decodeVars.append(var)
+    # end of for (varName, varSTASH) in _convertVars_:
+    return decodeVars
+# end of def __getGrib2DecodeVars__():
+
+def __isGrib2BytesReorderable__():
+    # re-order by byte copy, unless all the variables have to be decoded.
+    global _convertVars_
+    
+    if not _convertVars_: return False
+    return len(__getGrib2DecodeVars__()) < len(_convertVars_)
+# end of def __isGrib2BytesReorderable__():
+
+def __getCubeVarKey__(cube, varKeys):
+    # (varName, varSTASH) of varKeys for the cube (aod pseudo level cubes 
+    # are named as varName + '_at_%sum').
+    name = cube.standard_name if cube.standard_name else cube.long_name
+    for varName, varSTASH in varKeys:
+        if name == varName or name.startswith(varName + '_at_'): 
+            return (varName, varSTASH)
+    # end of for varName, varSTASH in varKeys:
+    return None
+# end of def __getCubeVarKey__(cube, varKeys):
+
+def _writeGrib2DecodeFile(fpath, decodePath, decodeVars):
+    # byte copy the messages of decodeVars from fpath (merged _unOrdered 
+    # file) into decodePath as per fpath.shardidx, to be decoded by iris.
+    with open(decodePath, 'wb') as ofile:
+        with open(fpath, 'rb') as gfile:
+            for line in open(fpath + '.shardidx'):
+                start, size, varName, varSTASH = line.split()
+                if (varName, varSTASH) not in decodeVars: continue
+                gfile.seek(int(start))
+                ofile.write(gfile.read(int(size)))
+            # end of for line in open(fpath + '.shardidx'):
+        # end of with open(fpath, 'rb') as gfile:
+    # end of with open(decodePath, 'wb') as ofile:
+# end of def _writeGrib2DecodeFile(fpath, decodePath, decodeVars):
+
+def _reorderGrib2Messages(fpath, g2filepath, ctlMessages=None, skipVars=(),
+                                                       decodedMessages=()):
+    """
+    Write the grib2 messages of fpath (merged _unOrdered file) into g2filepath
+    in the variables order by raw byte copy, without decoding into iris cubes.
+    The variable of each message is known from fpath.shardidx file (written 
+    by mergeGrib2Shards) and only offset, totalLength, forecastTime, level 
+    keys are read from the grib2 headers. Messages are written into tmp file
+    which will be renamed as g2filepath once all the messages are written.
+    
+    The skipVars messages of fpath are not copied, instead decodedMessages 
+    (which are decoded & processed by doShuffleVarsInOrder) are written in 
+    its variables order.
+    
+    Pressure level variables are written first and then non pressure level
+    variables as like doShuffleVarsInOrder. Within variable, messages are 
+    sorted by forecastTime and level.
+    
+    :param fpath: merged _unOrdered grib2 file path.
+    :param g2filepath: ordered grib2 out file path.
+    :param ctlMessages: list to collect ctlutils.getMessageKeys of messages.
+    :param skipVars: (varName, varSTASH) list, whose messages are not copied.
+    :param decodedMessages: list of ((varName, varSTASH), grib message id).
+    :return: no of messages written into g2filepath.
+    """
+    global _orderedVars_, _convertVars_, _removeVars_, __outFileType__, \
+           __fcst_step_hour__
+    
+    pressureVars = _orderedVars_['PressureLevel']
+    nonPressureVars = _orderedVars_['nonPressureLevel']
+    varsRank = {}
+    for idx, var in enumerate(_convertVars_):
+        if var in pressureVars: 
+            varsRank.setdefault(var, (0, idx))
+        elif var in nonPressureVars or var in skipVars:
+            # derived vars (decoded) are not in _orderedVars_, but written
+            # along with non pressure vars as like doShuffleVarsInOrder.
+            varsRank.setdefault(var, (1, idx))
+        else:
+            print "Error : (%s, %s) not available in _orderedVars_. Pl add it!" % var
+    # end of for idx, var in enumerate(_convertVars_):
+    
+    # remove temporary variables from ordered vars list 
+    for var in _removeVars_: varsRank.pop(var, None)
+    if __outFileType__ in ['prg', 'fcst'] and __fcst_step_hour__ in [6]:
+        # remove land_binary_mask from 6 hourly forecast files 
+        # (refer doShuffleVarsInOrder)
+        varsRank.pop(('land_binary_mask', 'm01s00i030'), None)
+    
+    messages = []
+    with open(fpath, 'rb') as gfile:
+        for line in open(fpath + '.shardidx'):
+            start, size, varName, varSTASH = line.split()
+            if (varName, varSTASH) not in varsRank: continue
+            if (varName, varSTASH) in skipVars: continue
+            end = int(start) + int(size)
+            gfile.seek(int(start))
+            while gfile.tell() < end:
+                gid = gribapi.grib_new_from_file(gfile)
+                if gid is None: break
+                messages.append((varsRank[(varName, varSTASH)], 
+                                 gribapi.grib_get_long(gid, 'forecastTime'),
+                                 gribapi.grib_get_long(gid, 'level'), 
+                                 len(messages),
+                                 gribapi.grib_get_long(gid, 'offset'),
+                                 gribapi.grib_get_long(gid, 'totalLength')))
+                if ctlMessages is not None: 
+                    ctlMessages.append(ctlutils.getMessageKeys(gid))
+                gribapi.grib_release(gid)
+            # end of while gfile.tell() < end:
+        # end of for line in open(fpath + '.shardidx'):
+        for var, gid in decodedMessages:
+            if var in varsRank:
+                # keeps the encoded message itself instead of its offset
+                messages.append((varsRank[var], 
+                                 gribapi.grib_get_long(gid, 'forecastTime'),
+                                 gribapi.grib_get_long(gid, 'level'), 
+                                 len(messages), None, 
+                                 gribapi.grib_get_message(gid)))
+                if ctlMessages is not None: 
+                    ctlMessages.append(ctlutils.getMessageKeys(gid))
+            # end of if var in varsRank:
+            gribapi.grib_release(gid)
+        # end of for var, gid in decodedMessages:
+        messages.sort()
+        
+        tmppath = g2filepath + '.tmp'
+        with open(tmppath, 'wb') as ofile:
+            for msg in messages:
+                offset, length = msg[-2:]
+                if offset is None:
+                    # encoded message of the decoded variable itself
+                    ofile.write(msg[-1])
+                else:
+                    gfile.seek(offset)
+                    ofile.write(gfile.read(length))
+                # end of if offset is None:
+            # end of for msg in messages:
+        # end of with open(tmppath, 'wb') as ofile:
+        __renameCompletedFile__(tmppath, g2filepath)
+    # end of with open(fpath, 'rb') as gfile:
+    return len(messages)
+# end of def _reorderGrib2Messages(fpath, g2filepath, ctlMessages=None):
+
+def __getOceanMask__(landMaskCube, nlayers=None):
+    """
+    Returns the ocean mask (land_binary_mask < 1) of the grid of the 
+    landMaskCube (grown into nlayers along first axis, for the multi layer 
+    soil variables). land_binary_mask is static, so the mask is built only 
+    once per grid (and nlayers) in this process and shared by all the 
+    variables and out files, which are re-ordered by this worker. It is 
+    read only.
+    """
+    global _oceanMasks_
+    
+    sha = hashlib.sha1()
+    for cname in ['latitude', 'longitude']:
+        sha.update(numpy.ascontiguousarray(landMaskCube.coord(cname).points, 
+                                                        dtype=numpy.float64))
+    # end of for cname in ['latitude', 'longitude']:
+    gridKey = sha.hexdigest()
+    if (gridKey, nlayers) in _oceanMasks_: return _oceanMasks_[(gridKey, nlayers)]
+    if nlayers is None:
+        # here we are masking less than 1. we can do just simply == 0 also, 
+        # but somehow it retains fraction values between 0 to 1. To get 
+        # ride out of this fraction values, just mask out < 1.
+        # (masked points of land_binary_mask are masked too)
+        mask = numpy.ma.filled(landMaskCube.data < 1, True)
+    else:
+        mask = __getOceanMask__(landMaskCube)
+        mask = mask.reshape((1,) + mask.shape).repeat(nlayers, axis=0)
+    # end of if nlayers is None:
+    mask.flags.writeable = False
+    _oceanMasks_[(gridKey, nlayers)] = mask
+    return mask
+# end of def __getOceanMask__(landMaskCube, nlayers=None):
+
+def doShuffleVarsInOrder(fpath, deferGrib1=False):
     """
     order the variables and create new grib2 files;
     delete the older shuffled variables grib2 files.
     create ctl, idx files using g2ctl.pl, gribmap scripts for the ordered grib2 files.
+    If deferGrib1 is True, returns the grib1 conversion task (instead of 
+    converting it here) as like _postProcessOrderedGrib2File.
     
     Arulalan/T
     11-12-2015
@@ -2544,9 +3364,45 @@ def doShuffleVarsInOrder(fpath):
            __removeGrib2FilesAfterGrib1FilesCreated__, _removeVars_, cnvgrib, \
            __fcst_step_hour__, __anl_step_hour__, g2ctl, grib2ctl, gribmap, \
            __anl_aavars_reference_time__, _reverseLatitude_, __wgrib2Arguments__, \
-           _write2NetcdfFile_, __UMReanalysis__
+           _write2NetcdfFile_, __UMReanalysis__, _reorderGrib2Bytes_, \
+           _grib2DecodeVars_
     
     print "doShuffleVarsInOrder Begins", fpath
+    
+    # variables to be decoded (others are re-ordered by byte copy) and the 
+    # grib2 file to load those variables
+    decodeVars, loadpath = [], fpath
+    if _reorderGrib2Bytes_ and os.path.isfile(fpath + '.shardidx') and _grib2DecodeVars_:
+        # decode only the _grib2DecodeVars_ (to be derived / masked) from its
+        # own file, and byte copy the others along with them (see below).
+        decodeVars, loadpath = _grib2DecodeVars_, fpath + '.decode'
+        try:
+            _writeGrib2DecodeFile(fpath, loadpath, decodeVars)
+        except Exception as e:
+            print "ALERT!!! ERROR!!! couldn't write grib2 messages to decode", e
+            return
+        # end of try:
+    elif _reorderGrib2Bytes_ and os.path.isfile(fpath + '.shardidx'):
+        # generate correct file name by removing _preExtension_
+        g2filepath = fpath.split(_preExtension_)
+        wg2filepath = g2filepath[0] + g2filepath[-1]
+        # set ordered extension is empty incase wgrib2 argument is empyt
+        orderedExtension = '_Ordered' if __wgrib2Arguments__ else ''    
+        g2filepath = g2filepath[0] + orderedExtension + g2filepath[-1]
+        ctlMessages = []
+        try:
+            with timePhase('reorder', file=fpath):
+                nmsg = _reorderGrib2Messages(fpath, g2filepath, ctlMessages)
+        except Exception as e:
+            print "ALERT!!! ERROR!!! couldn't re-order grib2 messages", e
+            return
+        os.remove(fpath + '.shardidx')
+        print "Created the variables in ordered fassion (%d messages) and saved into" % nmsg, g2filepath
+        return _postProcessOrderedGrib2File(fpath, g2filepath, wg2filepath, 
+                                            ctlMessages, deferGrib1)
+    # end of if _reorderGrib2Bytes_ and os.path.isfile(fpath + '.shardidx'):
+    
+    phase = startPhase('reorder', file=fpath)
     # need to store the ordered variables in this empty list
     orderedVars = []
     ncloaddic = {}
@@ -2580,7 +3436,11 @@ def doShuffleVarsInOrder(fpath):
 
     elif os.path.isfile(fpath):
         try:        
-            f = iris.load(fpath, callback=update_cf_standard_name) # load intermediate grib2 file
+            # load intermediate grib2 file 
+            if os.path.getsize(loadpath):
+                f = iris.load(loadpath, callback=update_cf_standard_name) 
+            else:
+                f = iris.cube.CubeList()
         except gribapi.GribInternalError as e:
             if str(e) == "Wrong message length":
                 print "ALERT!!!! ERROR!!! Couldn't read grib2 file to re-order", e
@@ -2706,10 +3566,8 @@ def doShuffleVarsInOrder(fpath):
     if (_maskOverOceanVars_ and land_binary_mask_var and 
             lat_60N_start_val is not None and lat_60N_end_val is not None) and not __UMReanalysis__:
 
-        land_binary_mask = land_binary_mask_var[0].data < 1
-        # here we are masking less than 1. we can do just simply == 0 also, 
-        # but somehow it retains fraction values between 0 to 1. To get 
-        # ride out of this fraction values, just mask out < 1.
+        # ocean mask of this grid (built once per grid, see __getOceanMask__)
+        land_binary_mask = __getOceanMask__(land_binary_mask_var[0])
         # get the shapes
         lsh = land_binary_mask.shape
         
@@ -2778,8 +3636,7 @@ def doShuffleVarsInOrder(fpath):
                     var.data[:, lat_60S_index: lat_60N_index, :] = var_60S_60N.data                        
                     # get the ocean mask by masking 0s of land_binary_mask 
                     # (0-sea, 1-land) and set it to the required variables. 
-                    land_binary_mask_grown = land_binary_mask.reshape(1, lsh[0], lsh[-1])
-                    land_binary_mask_grown = land_binary_mask_grown.repeat(vsh[0], axis=0)                    
+                    land_binary_mask_grown = __getOceanMask__(land_binary_mask_var[0], vsh[0])
                     var.data = numpy.ma.masked_where(land_binary_mask_grown, var.data)
                 else:    
                     # single layer only. so first dimension points latitude
@@ -3038,6 +3895,12 @@ def doShuffleVarsInOrder(fpath):
     orderedExtension = '_Ordered' if __wgrib2Arguments__ else ''    
     g2filepath = g2filepath[0] + orderedExtension + g2filepath[-1]
     outstatus = False
+    # keys of the written messages to render ctl file (see ctlutils)
+    ctlMessages = []
+    # write into tmp file and rename it as out file once it is completed.
+    # So the out file is never seen as partially written.
+    tmppath = (ncfilepath if _write2NetcdfFile_ else g2filepath) + '.tmp'
+    if os.path.isfile(tmppath): os.remove(tmppath)
     
     if _write2NetcdfFile_:
         if _write2NetcdfFile_ in [True, 'True']:
@@ -3045,23 +3908,44 @@ def doShuffleVarsInOrder(fpath):
             # otherwise lets use user passed nc type 
         ## lets save into compressed netcdf4 file 
         try:
-            iris.fileformats.netcdf.save(orderedVars, ncfilepath, netcdf_format=_write2NetcdfFile_, 
+            iris.fileformats.netcdf.save(orderedVars, tmppath, netcdf_format=_write2NetcdfFile_, 
                                        zlib=True, shuffle=True, least_significant_digit=6) 
         except Exception as e:
+            if os.path.isfile(tmppath): os.remove(tmppath)
             print "ALERT !!! Error while saving orderd variables into nc!! %s" % str(e)
             print " So skipping this without saving data"
             outstatus = False
             return 
         finally:
             outstatus = True
+    elif decodeVars:
+        # write the decoded variables (tweaked) along with the byte copied 
+        # messages of all the other variables in order. It writes into tmp 
+        # file and renames it by itself.
+        try:
+            decodedMessages = [(__getCubeVarKey__(cube, decodeVars), gid) 
+                  for cube in orderedVars for gid in tweaked_messages([cube])]
+            nmsg = _reorderGrib2Messages(fpath, g2filepath, ctlMessages, 
+                                         decodeVars, decodedMessages)
+        except Exception as e:
+            if os.path.isfile(tmppath): os.remove(tmppath)
+            print "ALERT !!! Error while saving orderd variables into grib2!! %s" % str(e)
+            print " So skipping this without saving data"
+            return 
+        finally:
+            os.remove(loadpath)
+        # end of try:
+        os.remove(fpath + '.shardidx')
+        print "Re-ordered %d messages (decoded %s)" % (nmsg, str(decodeVars))
     else:
         # now lets save the ordered variables into same file
         try:   
             # before save it, tweak the cubes by setting centre no and 
             # address other temporary issues before saving into grib2.
-            iris.fileformats.grib.save_messages(tweaked_messages(orderedVars), 
-                                                    g2filepath, append=True)
+            iris.fileformats.grib.save_messages(__collectCtlMessageKeys__(
+                 tweaked_messages(orderedVars), ctlMessages), tmppath, append=True)
         except Exception as e:
+            if os.path.isfile(tmppath): os.remove(tmppath)
             print "ALERT !!! Error while saving orderd variables into grib2!! %s" % str(e)
             print " So skipping this without saving data"
             outstatus = True
@@ -3070,8 +3954,11 @@ def doShuffleVarsInOrder(fpath):
             outstatus = True
         # end of try:
     # end of if _write2NetcdfFile_:
-    time.sleep(30)  # lets wait 30 more seconds to be written properly.    
-    while not outstatus: time.sleep(30)   # lets wait till grib2 file written status to be completed.        
+    # save_messages / netcdf save has closed the file. Just flush it into 
+    # disk and rename, instead of waiting for it to be written properly.
+    if not decodeVars:
+        __renameCompletedFile__(tmppath, ncfilepath if _write2NetcdfFile_ else g2filepath)
+    endPhase(phase)
     
     # make memory free 
     del orderedVars
@@ -3087,63 +3974,76 @@ def doShuffleVarsInOrder(fpath):
         return
          
     print g2filepath
+    return _postProcessOrderedGrib2File(fpath, g2filepath, wg2filepath, 
+                                        ctlMessages, deferGrib1)
+# end of def doShuffleVarsInOrder(fpath, deferGrib1=False):
+
+def __collectCtlMessageKeys__(messages, ctlMessages):
+    # collect the keys of grib2 messages (to render ctl file) while saving it
+    for gid in messages:
+        ctlMessages.append(ctlutils.getMessageKeys(gid))
+        yield gid
+    # end of for gid in messages:
+# end of def __collectCtlMessageKeys__(messages, ctlMessages):
+
+def __createCtlFile__(datapath, ctlCmd, ctlMessages, tstepHour):
+    # create ctl file of datapath by ctlCmd (g2ctl.pl / grib2ctl.pl) or 
+    # render it from the ctl template of same structure.
+    global _renderCtlFiles_, _tmpDir_
+    
+    if not _renderCtlFiles_: ctlMessages = None
+    rendered = ctlutils.createCtlFile(datapath, ctlCmd, ctlMessages, tstepHour,
+                                   os.path.join(_tmpDir_, 'ctlTemplates'))
+    print "Created ctl file %s %s" % ('by rendering template' if rendered else 
+                                   'using %s' % os.path.basename(ctlCmd[0]), datapath+'.ctl')
+# end of def __createCtlFile__(datapath, ctlCmd, ctlMessages, tstepHour):
+
+def _postProcessOrderedGrib2File(fpath, g2filepath, wg2filepath, ctlMessages=None, deferGrib1=False):
+    """
+    remove the older (_unOrdered) grib2 file fpath, compress the ordered 
+    grib2 file using wgrib2, convert into grib1 and create ctl, idx files
+    for the ordered grib2 / grib1 files. ctlMessages (ctlutils.getMessageKeys
+    of the written messages) are used to render the ctl files.
+    If deferGrib1 is True, grib1 conversion is not done here and returns 
+    the (g2filepath, ctlMessages) to be passed to _convertGrib2ToGrib1File.
+    """
+    global _createGrib2CtlIdxFiles_, _createGrib1CtlIdxFiles_, cnvgrib, \
+           _convertGrib2FilestoGrib1Files_, __outFileType__, gribmap, \
+           __grib1FilesNameSuffix__, __removeGrib2FilesAfterGrib1FilesCreated__, \
+           __fcst_step_hour__, __anl_step_hour__, g2ctl, grib2ctl, \
+           __anl_aavars_reference_time__, __wgrib2Arguments__
+    
     # remove the older grib2 file 
     print "removed older grib2 file", fpath
     os.remove(fpath)
     
     if __wgrib2Arguments__ is not None:
         # execute post wgrib2 command # strick to no of cpu is 2.
+        # wgrib2 writes into tmp file, which will be renamed once it is 
+        # completed successfully (as per its return code).
+        wg2tmppath = wg2filepath + '.tmp'
         ncpu = ' -ncpu 2 ' if not '-ncpu' in __wgrib2Arguments__ else ' '
-        cmd = "%s %s %s %s" % (wgrib2, g2filepath, ncpu+__wgrib2Arguments__, wg2filepath)
+        cmd = "%s %s %s %s" % (wgrib2, g2filepath, ncpu+__wgrib2Arguments__, wg2tmppath)
         print cmd
-        subprocess.call(cmd, shell=True)            
-        time.sleep(10)
-        # remove the grib2 file generated by IRIS
-        os.remove(g2filepath)
+        with timePhase('repack', file=g2filepath):
+            returncode = subprocess.call(cmd, shell=True)            
+        if returncode == 0 and os.path.isfile(wg2tmppath):
+            __renameCompletedFile__(wg2tmppath, wg2filepath)
+            # remove the grib2 file generated by IRIS
+            os.remove(g2filepath)
+            print "Created grib2 file using wgrib2 command with compress arguments " 
+        else:
+            # keep the IRIS grib2 file as out file, instead of losing it.
+            print "ALERT !!! wgrib2 failed (return code %d). So keeping uncompressed grib2 file" % returncode
+            if os.path.isfile(wg2tmppath): os.remove(wg2tmppath)
+            __renameCompletedFile__(g2filepath, wg2filepath)
+        # end of if returncode == 0 and os.path.isfile(wg2tmppath):
         # rename g2filepath as wg2filepath
         g2filepath = wg2filepath
-        print "Created grib2 file using wgrib2 command with compress arguments " 
     # end of if __wgrib2Arguments__:
                 
-    if _convertGrib2FilestoGrib1Files_:
-        g1filepath = '.'.join(g2filepath.split('.')[:-1])
-        g1filepath = g1filepath if g1filepath else g2filepath[:-1]
-        if __grib1FilesNameSuffix__: g1filepath += str(__grib1FilesNameSuffix__)
-        
-        if os.path.isfile(g1filepath): os.remove(g1filepath)
-        
-        cmd = [cnvgrib, '-g21', g2filepath, g1filepath]
-        subprocess.call(cmd, shell=False)
-        cmd = ['chmod', '644', g1filepath]
-        subprocess.call(cmd, shell=False)
-        print "Converted grib2 to grib1 file : -", g1filepath
-        
-        if  _createGrib1CtlIdxFiles_:
-            ## grib2ctl.pl usage option refer the below link 
-            ## https://tuxcoder.wordpress.com/2011/04/11/how-to-install-grib2ctl-pl-and-wgrib-in-linux/    
-            ctlfile = open(g1filepath+'.ctl', 'w')
-            if __outFileType__ in ['ana', 'anl']:
-                # create ctl & idx files for analysis file 
-                tsahr = '-ts%dhr' %  int(__anl_step_hour__)
-                subprocess.call([grib2ctl, tsahr, g1filepath], stdout=ctlfile)
-                subprocess.call([gribmap, tsahr, '-0', '-i', g1filepath+'.ctl'])
-            elif __outFileType__ in ['prg', 'fcst']:
-                # create ctl & idx files for forecast file
-                tsfhr = '-ts%dhr' %  int(__fcst_step_hour__)
-                subprocess.call([grib2ctl, tsfhr, '-verf', g1filepath], stdout=ctlfile)
-                subprocess.call([gribmap, '-i', g1filepath+'.ctl'])
-            else:
-                raise ValueError("unknown file type while executing grib2ctl.pl!!")
-            
-            print "Successfully created control and index file using grib2ctl !", g1filepath+'.ctl'
-        # end of if _createGrib1CtlIdxFiles_:
-    # end of if _convertGrib2FilestoGrib1Files_:
-    
-    if __removeGrib2FilesAfterGrib1FilesCreated__ and _convertGrib2FilestoGrib1Files_:
-        # grib1 files are converted. so we can remove grib2 files.
-        os.remove(g2filepath)
-        print "deleted grib2 file", g2filepath        
-    elif _createGrib2CtlIdxFiles_:
+    if _createGrib2CtlIdxFiles_ and not (__removeGrib2FilesAfterGrib1FilesCreated__ 
+                                  and _convertGrib2FilestoGrib1Files_):
         ## g2ctl.pl usage option refer the below link 
         ## https://tuxcoder.wordpress.com/2011/08/31/how-to-install-g2ctl-pl-and-wgrib2-in-linux/
         ## though options says -verf for forecast end time, -0 for analysis time 
@@ -3153,34 +4053,129 @@ def doShuffleVarsInOrder(fpath):
         ## so here we no need to pass any options like -0 or -b. 
         ## By default g2ctl takes -verf option, same option we are passing 
         ## here to make sure that in future it will not affect.
-        ctlfile = open(g2filepath+'.ctl', 'w')
+        phase = startPhase('ctlidx', file=g2filepath)
         # create ctl & idx files for forecast file        
         if __outFileType__ in ['ana', 'anl'] and __anl_aavars_reference_time__ == 'analysis':
             # -0 will set the base reference time as analysis utc time. 
             tsahr = '-ts%dhr' %  int(__anl_step_hour__)
-            subprocess.call([g2ctl, tsahr, '-0', g2filepath], stdout=ctlfile)
+            __createCtlFile__(g2filepath, [g2ctl, tsahr, '-0'], ctlMessages, 
+                                                  int(__anl_step_hour__))
             subprocess.call([gribmap, '-0', '-i', g2filepath+'.ctl']) 
         elif __outFileType__ in ['rea', 'reanalysis']:
             # by default -verf as passed which takes end time of fcst bounds to set as base time.
             tsfhr = '-ts%dhr' %  int(__anl_step_hour__)
-            subprocess.call([g2ctl, tsfhr, '-verf', g2filepath], stdout=ctlfile)
+            __createCtlFile__(g2filepath, [g2ctl, tsfhr, '-verf'], ctlMessages, 
+                                                  int(__anl_step_hour__))
             subprocess.call([gribmap, '-i', g2filepath+'.ctl'])                
         else:
             # by default -verf as passed which takes end time of fcst bounds to set as base time.
             tsfhr = '-ts%dhr' %  int(__fcst_step_hour__)
-            subprocess.call([g2ctl, tsfhr, '-verf', g2filepath], stdout=ctlfile)
+            __createCtlFile__(g2filepath, [g2ctl, tsfhr, '-verf'], ctlMessages, 
+                                                  int(__fcst_step_hour__))
             subprocess.call([gribmap, '-i', g2filepath+'.ctl'])                
-        print "Successfully created control and index file using g2ctl !", g2filepath+'.ctl'
-    # end of if __removeGrib2FilesAfterGrib1FilesCreated__:    
-# end of def doShuffleVarsInOrder(fpath):
+        endPhase(phase)
+        print "Successfully created control and index file !", g2filepath+'.ctl'
+    # end of if _createGrib2CtlIdxFiles_ and ...:
+    
+    if _convertGrib2FilestoGrib1Files_:
+        # grib1 stage of main process will convert it, so that this worker 
+        # can take the next file to re-order (see doShuffleVarsInOrderInParallel)
+        if deferGrib1: return (os.path.abspath(g2filepath), ctlMessages)
+        _convertGrib2ToGrib1File((g2filepath, ctlMessages))
+    # end of if _convertGrib2FilestoGrib1Files_:
+# end of def _postProcessOrderedGrib2File(fpath, g2filepath, wg2filepath, ctlMessages=None, deferGrib1=False):
+
+def _convertGrib2ToGrib1File(arg):
+    """
+    convert the grib2 file into grib1 file using cnvgrib, create ctl, idx 
+    files for the grib1 file and remove the grib2 file (if needed).
+    
+    :param arg: (g2filepath, ctlMessages) tuple, ctlMessages are the 
+                ctlutils.getMessageKeys of the grib2 messages.
+    """
+    global _createGrib1CtlIdxFiles_, cnvgrib, __outFileType__, gribmap, \
+           __grib1FilesNameSuffix__, __removeGrib2FilesAfterGrib1FilesCreated__, \
+           __fcst_step_hour__, __anl_step_hour__, grib2ctl
+    
+    g2filepath, ctlMessages = arg
+    g1filepath = '.'.join(g2filepath.split('.')[:-1])
+    g1filepath = g1filepath if g1filepath else g2filepath[:-1]
+    if __grib1FilesNameSuffix__: g1filepath += str(__grib1FilesNameSuffix__)
+    
+    if os.path.isfile(g1filepath): os.remove(g1filepath)
+    
+    g1tmppath = g1filepath + '.tmp'
+    cmd = [cnvgrib, '-g21', g2filepath, g1tmppath]
+    with timePhase('grib1', file=g2filepath):
+        returncode = subprocess.call(cmd, shell=False)
+    if returncode != 0:
+        print "ALERT !!! cnvgrib failed (return code %d) for %s" % (returncode, g2filepath)
+        if os.path.isfile(g1tmppath): os.remove(g1tmppath)
+        return
+    # end of if returncode != 0:
+    os.chmod(g1tmppath, 0644)
+    __renameCompletedFile__(g1tmppath, g1filepath)
+    print "Converted grib2 to grib1 file : -", g1filepath
+    
+    if  _createGrib1CtlIdxFiles_:
+        ## grib2ctl.pl usage option refer the below link 
+        ## https://tuxcoder.wordpress.com/2011/04/11/how-to-install-grib2ctl-pl-and-wgrib-in-linux/    
+        phase = startPhase('ctlidx', file=g1filepath)
+        # grib1 messages are converted from the grib2 messages, so the 
+        # grib2 message keys decides the structure of grib1 ctl too.
+        if __outFileType__ in ['ana', 'anl']:
+            # create ctl & idx files for analysis file 
+            tsahr = '-ts%dhr' %  int(__anl_step_hour__)
+            __createCtlFile__(g1filepath, [grib2ctl, tsahr], ctlMessages, 
+                                                int(__anl_step_hour__))
+            subprocess.call([gribmap, tsahr, '-0', '-i', g1filepath+'.ctl'])
+        elif __outFileType__ in ['prg', 'fcst']:
+            # create ctl & idx files for forecast file
+            tsfhr = '-ts%dhr' %  int(__fcst_step_hour__)
+            __createCtlFile__(g1filepath, [grib2ctl, tsfhr, '-verf'], 
+                              ctlMessages, int(__fcst_step_hour__))
+            subprocess.call([gribmap, '-i', g1filepath+'.ctl'])
+        else:
+            raise ValueError("unknown file type while executing grib2ctl.pl!!")
+        endPhase(phase)
+        
+        print "Successfully created control and index file using grib2ctl !", g1filepath+'.ctl'
+    # end of if _createGrib1CtlIdxFiles_:
+    
+    if __removeGrib2FilesAfterGrib1FilesCreated__:
+        # grib1 files are converted. so we can remove grib2 files.
+        os.remove(g2filepath)
+        print "deleted grib2 file", g2filepath        
+    # end of if __removeGrib2FilesAfterGrib1FilesCreated__:
+# end of def _convertGrib2ToGrib1File(arg):
+
+def _doShuffleVarsInOrderInPath(arg):
+    # persistent pool workers are forked before doShuffleVarsInOrderInParallel
+    # has changed the current working directory. So change it here itself.
+    path, fpath, deferGrib1 = arg
+    os.chdir(path)
+    return doShuffleVarsInOrder(fpath, deferGrib1)
+# end of def _doShuffleVarsInOrderInPath(arg):
 
-def doShuffleVarsInOrderInParallel(ftype, simulated_hr):
+def doShuffleVarsInOrderInParallel(ftype, simulated_hr, fcstHours=None):
             
     global _current_date_, _opPath_, _preExtension_, __end_long_fcst_hour__, \
            __anlFileNameStructure__, __fcstFileNameStructure__, __anl_step_hour__, \
-           __end_long_fcst_hour__, __fcst_step_hour__, __utc__, __start_long_fcst_hour__
+           __end_long_fcst_hour__, __fcst_step_hour__, __utc__, __start_long_fcst_hour__, \
+           _convertGrib2FilestoGrib1Files_, _write2NetcdfFile_
             
     print "Lets re-order variables for all the files!!!"
+    # grib1 stage : workers return the re-ordered grib2 files and its cnvgrib
+    # runs by bounded threads pool of this process, overlapped with the 
+    # re-order of next files by workers.
+    grib1Pool, grib1Results = None, []
+    if _convertGrib2FilestoGrib1Files_ and not _write2NetcdfFile_:
+        grib1Pool = mppool.ThreadPool(__getGrib1WorkersCount__())
+    def feedGrib1Stage(task, grib1Task):
+        if grib1Task: 
+            grib1Results.append(grib1Pool.apply_async(_convertGrib2ToGrib1File, (grib1Task,)))
+    # end of def feedGrib1Stage(task, grib1Task):
+    onResult = feedGrib1Stage if grib1Pool is not None else None
     #####
     ## 6-hourly Files have been created with extension.
     ## Now lets do re-order variables within those individual files, in parallel mode.  
@@ -3204,19 +4199,18 @@ def doShuffleVarsInOrderInParallel(ftype, simulated_hr):
         # end of for fcsthr in range(...):
         if __start_long_fcst_hour__ > 72 and __end_long_fcst_hour__ > 72:
              fcstFiles = fcstFiles[:3] # we need to extract upto 75 hours only
+        if fcstHours is not None:
+            # re-order only the passed forecast hours files (watch mode)
+            fcstFiles = [outFn for fcsthr, outFn in zip(range(__start_long_fcst_hour__, 
+                   __end_long_fcst_hour__+1, __fcst_step_hour__), fcstFiles) 
+                                                    if fcsthr in fcstHours]
+        # end of if fcstHours is not None:
              
-        ## get the no of created fcst files  
-        nprocesses = len(fcstFiles)  
-        maxprocess = mp.cpu_count()
-        if nprocesses > maxprocess: nprocesses = maxprocess
         # parallel begin - 3
-        pool = _MyPool(nprocesses)
-        print "Creating %d (non-daemon) workers and jobs in doShuffleVarsInOrder process." % nprocesses
-        results = pool.map(doShuffleVarsInOrder, fcstFiles)   
-        
-        # closing and joining master pools
-        pool.close()     
-        pool.join()
+        estimates = [__estimateShuffleTaskMemoryGB__(fpath) for fpath in fcstFiles]
+        results = __mapInMemoryBudget__(_doShuffleVarsInOrderInPath, 
+                         [(_opPath_, fpath, onResult is not None) for fpath in fcstFiles], 
+                                                         estimates, onResult)
         # parallel end - 3    
     elif ftype in ['anl', 'analysis', 'rea', 'reanalysis']:
         ## generate the analysis filename w.r.t simulated_hr
@@ -3235,36 +4229,38 @@ def doShuffleVarsInOrderInParallel(ftype, simulated_hr):
                                            simulated_hr, _preExtension_)  
             anlFiles.append(outFn)
         # end of for fcsthr in range(...):
-        ## get the no of created anl files  
-        nprocesses = len(anlFiles)   
-        maxprocess = mp.cpu_count()
-        if nprocesses > maxprocess: nprocesses = maxprocess 
         # parallel begin - 3 # parallel analysis required for 3-hourly analysis files.
-        pool = _MyPool(nprocesses)
-        print "Creating %d (non-daemon) workers and jobs in doShuffleVarsInOrder process." % nprocesses
-        results = pool.map(doShuffleVarsInOrder, anlFiles)
-        # closing and joining master pools
-        pool.close()     
-        pool.join()
+        estimates = [__estimateShuffleTaskMemoryGB__(fpath) for fpath in anlFiles]
+        results = __mapInMemoryBudget__(_doShuffleVarsInOrderInPath, 
+                         [(_opPath_, fpath, onResult is not None) for fpath in anlFiles], 
+                                                         estimates, onResult)
         # parallel end - 3        
     # end of if ftype in ['fcst', 'forecast']: 
+    if grib1Pool is not None:
+        # wait till the grib1 stage completes the remaining conversions
+        grib1Pool.close()
+        for result in grib1Results: result.get()
+        grib1Pool.join()
+    # end of if grib1Pool is not None:
     print "Total time taken to convert and re-order all files was: %8.5f seconds \n" % (time.time()-_startT_)
     # reset current working directory
     os.chdir(current_dir)
     return 
-# end of def doShuffleVarsInOrderInParallel(arg):
+# end of def doShuffleVarsInOrderInParallel(ftype, simulated_hr, fcstHours=None):
     
 # Start definition #6
-def doFcstConvert(fname):
+def _getFcstConvertTasks(fname):
     """
-    New Module by AAT:
-    This module has been rewritten entirely by AAT for optimization as an embarassingly-
-    parallel problem! This module acts as the main program to feed the filenames as a
-    child process to a multiprocessing thread as a daemon process.
+    Returns the list of (fname, hr, varIdx) regridAnlFcstFiles tasks of the 
+    forecast file (one task per variable of every hour group infile, if 
+    _fcstVariableTasks_ is True, otherwise one task for all the variables of
+    every hour group infile), which will be fed into the persistent workers 
+    pool by convertFilesInParallel. The out file messages order is restored 
+    by mergeGrib2Shards & doShuffleVarsInOrder, irrespective of tasks order.
     :param fname: Name of the FF filename in question as a "string"
-    :return: Nothing! TANGIBLE!
     """
-    global __start_long_fcst_hour__, __end_long_fcst_hour__, __UMtype__, __fcst_step_hour__
+    global __start_long_fcst_hour__, __end_long_fcst_hour__, __UMtype__, \
+           __fcst_step_hour__, _fcstVariableTasks_, _inDataPath_, _convertVars_
     
     
     if __UMtype__ == 'global':
@@ -3291,31 +4287,32 @@ def doFcstConvert(fname):
         fcst_times = [str(hr).zfill(2) for hr in range(start_fcst_hour, __end_long_fcst_hour__, 6)]
     # end of if __UMtype__ == 'global':
     
-    fcst_filenames = [(fname, hr, None) for hr in fcst_times]
+    fcst_filenames = []
+    for hr in fcst_times:
+        if not _fcstVariableTasks_:
+            fcst_filenames.append((fname, hr, None))
+            continue
+        # end of if not _fcstVariableTasks_:
+        # variables of this infile (from its name, infile need not exists yet)
+        varNamesSTASH = getVarInOutFilesDetails(_inDataPath_, 
+                                    __getInFileName__(fname, hr), hr)[0]
+        if _convertVars_:
+            varNamesSTASH = [vns for vns in varNamesSTASH if vns in _convertVars_]
+        fcst_filenames.extend([(fname, hr, idx) for idx in range(len(varNamesSTASH))])
+    # end of for hr in fcst_times:
     print "fcst_filenames = ", fcst_filenames
-    nchild = len(fcst_times)
-    if not nchild: raise ValueError("Got 0 fcst_times, couldn't make parallel !")
-    # create the no of child parallel processes
-    inner_pool = mp.Pool(processes=nchild)
-    print "Creating %i (daemon) workers and jobs in child." % nchild
-    
-    # pass the forecast hours as argument to take one fcst file per process / core to regrid it.
-    results = inner_pool.map(regridAnlFcstFiles, fcst_filenames)
-    # closing and joining child pools      
-    inner_pool.close() 
-    inner_pool.join()
-    # parallel end
-# end def doFcstConvert(fname):
-
-
-def doAnlConvert(fname):
+    if not fcst_filenames: raise ValueError("Got 0 fcst_times, couldn't make parallel !")
+    return fcst_filenames
+# end def _getFcstConvertTasks(fname):
+
+
+def _getAnlConvertTasks(fname):
     """
-    New Module by AAT:
-    This module has been rewritten entirely by AAT for optimization as an embarassingly-
-    parallel problem! This module acts as the main program to feed the filenames as a
-    child process to a multiprocessing thread as a daemon process.
+    Returns the list of (fname, hr, varIdx) regridAnlFcstFiles tasks of the 
+    analysis file (one task per variable for reanalysis, otherwise one task 
+    for all the variables), which will be fed into the persistent workers 
+    pool by convertFilesInParallel.
     :param fname: Name of the FF filename in question as a "string"
-    :return: Nothing! TANGIBLE!
     """
     global _inDataPath_, _convertVars_, __UMReanalysis__
     
@@ -3328,22 +4325,29 @@ def doAnlConvert(fname):
             varNamesSTASH = [vns for vns in varNamesSTASH if vns in _convertVars_]    
         varCount = len(varNamesSTASH)
         anl_filenames = [(fname, hr, idx) for idx in range(varCount)]
-        nchild = len(anl_filenames)
-        if not nchild: raise ValueError("Got 0 varCount, couldn't make parallel !")
-        # create the no of child parallel processes
-        inner_pool = mp.Pool(processes=nchild)
-        print "Creating %i (daemon) workers and jobs in child." % nchild        
-        # pass the forecast hours as argument to take one fcst file per process / core to regrid it.
-        results = inner_pool.map(regridAnlFcstFiles, anl_filenames)
-        # closing and joining child pools      
-        inner_pool.close() 
-        inner_pool.join()
-        # parallel end
+        if not anl_filenames: raise ValueError("Got 0 varCount, couldn't make parallel !")
+        return anl_filenames
     else:
         # convert all variables in serial manner
-        regridAnlFcstFiles((fname, hr, None))  
-# end def doAnlConvert(fname):
+        return [(fname, hr, None)]
+# end def _getAnlConvertTasks(fname):
+
 
+def __getConvertTasks__(fnames, ftype):
+    # flat list of (file, hour, variable) tasks of all the files
+    if not fnames: raise ValueError("Got 0 fnames, couldn't make parallel !")
+    tasks = []
+    for fname in fnames:
+        if ftype in ['anl', 'analysis']:
+            tasks.extend(_getAnlConvertTasks(fname))
+        elif ftype in ['fcst', 'forecast']:
+            tasks.extend(_getFcstConvertTasks(fname))
+        else:
+            raise ValueError("Unknown file type !")
+        # end of if ftype in ['anl', 'analysis']:    
+    # end of for fname in fnames:
+    return tasks
+# end of def __getConvertTasks__(fnames, ftype):
 
 # Start the convertFilesInParallel function
 def convertFilesInParallel(fnames, ftype):
@@ -3353,36 +4357,446 @@ def convertFilesInParallel(fnames, ftype):
     :return: THE SheBang!
     """
     
-    global _startT_, _tmpDir_, _opPath_
+    global _startT_, _tmpDir_, _opPath_, _writeGrib2Shards_
     
-    ## get the no of files and 
-    nprocesses = len(fnames)
-    if not nprocesses: raise ValueError("Got 0 fnames, couldn't make parallel !")
-    # lets create no of parallel process w.r.t no of files.
-    maxprocess = mp.cpu_count()
-    if nprocesses > maxprocess: nprocesses = maxprocess 
-    # parallel begin - 1 
-    pool = _MyPool(nprocesses)
-    print "Creating %d (non-daemon) workers and jobs in convertFilesInParallel process." % nprocesses
+    # convert only the missing / stale tasks as per manifest
+    tasks, _ = __getStaleTasks__(__getConvertTasks__(fnames, ftype), ftype)
+    if not tasks:
+        print "All the files are already converted as per manifest."
+        return
+    # end of if not tasks:
     
-    if ftype in ['anl', 'analysis']:
-        results = pool.map(doAnlConvert, fnames)
-    elif ftype in ['fcst', 'forecast']:
-        results = pool.map(doFcstConvert, fnames)
-    else:
-        raise ValueError("Unknown file type !")
-    # end of if ftype in ['anl', 'analysis']:    
-
-    # closing and joining master pools
-    pool.close()     
-    pool.join()
+    # parallel begin - 1 
+    estimates = [__estimateRegridTaskMemoryGB__(task) for task in tasks]
+    print "Estimated memory of %d tasks in convertFilesInParallel process : max %.2f GB" % (len(tasks), max(estimates))
+    # record every converted task into manifest as soon as it is finished
+    __mapInMemoryBudget__(regridAnlFcstFiles, tasks, estimates, 
+                                               __updateManifestTask__)
     # parallel end - 1 
     
+    if _writeGrib2Shards_:
+        # merge the per worker grib2 shard files into _unOrdered files
+        mergeGrib2Shards(_opPath_)
+    # end of if _writeGrib2Shards_:
+    
     print "Total time taken to convert %d files was: %8.5f seconds \n" %(len(fnames),(time.time()-_startT_))
     
     return
 # end of def convertFilesInParallel(fnames):
 
+def convertFilesInWatchMode(fnames, ftype, simulated_hr):
+    """
+    Watch mode of convertFilesInParallel and doShuffleVarsInOrderInParallel.
+    Tasks are grouped by the infiles hour (24 hourly infiles of global model, 
+    6 hourly infiles of regional model). As soon as all the infiles of one 
+    hour group have arrived (see __isInFileArrived__), that group is 
+    converted, its grib2 shards are merged and the out files of forecast 
+    hours covered by the converted groups are re-ordered. So out files are 
+    delivered progressively while the model is still running.
+    
+    :param fnames: partial infile names.
+    :param ftype: 'anl' or 'fcst'.
+    :param simulated_hr: utc hour.
+    :return: True if all the infiles have arrived and converted. False if 
+             any hour group infiles have not arrived within _watchTimeout_.
+    """
+    global _startT_, _opPath_, _writeGrib2Shards_, _inDataPath_, __UMtype__, \
+           _watchInterval_, _watchTimeout_, _current_date_, _preExtension_, \
+           __start_long_fcst_hour__, __end_long_fcst_hour__, __fcst_step_hour__, \
+           __fcstFileNameStructure__
+    
+    # missing / stale (file, hour, variable) tasks grouped by hour
+    tasks, _ = __getStaleTasks__(__getConvertTasks__(fnames, ftype), ftype)
+    groups = {}
+    for task in tasks: groups.setdefault(task[1], []).append(task)
+    hours = sorted(groups, key=int)
+    groupStep = 24 if __UMtype__ == 'global' else 6
+    
+    if ftype in ['fcst', 'forecast']:
+        outHours = range(__start_long_fcst_hour__, __end_long_fcst_hour__+1, 
+                                                        __fcst_step_hour__)
+        outFnIndecies = __getAnlFcstFileNameIndecies__(__fcstFileNameStructure__)
+    # end of if ftype in ['fcst', 'forecast']:
+    reorderedHours = []
+    
+    for gidx, hr in enumerate(hours):
+        tasks = groups[hr]
+        infiles = set()
+        for task in tasks: infiles.update(__getTaskWatchInFiles__(task, ftype))
+        waitT = time.time()
+        while not all([__isInFileArrived__(infile) for infile in infiles]):
+            if time.time() - waitT > _watchTimeout_:
+                print "ALERT!!! infiles of hour %s have not arrived in %d seconds. So stopped watching." % (hr, _watchTimeout_)
+                return False
+            # end of if time.time() - waitT > _watchTimeout_:
+            time.sleep(_watchInterval_)
+        # end of while not all(...):
+        print "infiles of hour %s have arrived. Lets convert it." % hr
+        
+        estimates = [__estimateRegridTaskMemoryGB__(task) for task in tasks]
+        __mapInMemoryBudget__(regridAnlFcstFiles, tasks, estimates, 
+                                               __updateManifestTask__)
+        
+        if ftype in ['fcst', 'forecast']:
+            # out files upto end of this hour group have been written
+            lastHour = outHours[-1] if gidx == len(hours) - 1 else int(hr) + groupStep
+            readyHours = [fhr for fhr in outHours if fhr <= lastHour and 
+                                                  fhr not in reorderedHours]
+            if not readyHours: continue
+            outFiles = set([__genAnlFcstOutFileName__(__fcstFileNameStructure__, 
+                                    outFnIndecies, _current_date_, fhr, 
+                                    simulated_hr, _preExtension_) for fhr in readyHours])
+        else:
+            # analysis out files are written from single hour group
+            readyHours, outFiles = None, None
+        # end of if ftype in ['fcst', 'forecast']:
+        
+        if _writeGrib2Shards_:
+            # merge the per worker grib2 shard files into _unOrdered files
+            mergeGrib2Shards(_opPath_, outFiles)
+        # end of if _writeGrib2Shards_:
+        doShuffleVarsInOrderInParallel(ftype, simulated_hr, readyHours)
+        __updateManifestOutFiles__()
+        if readyHours: reorderedHours.extend(readyHours)
+    # end of for gidx, hr in enumerate(hours):
+    
+    print "Total time taken to convert %d files in watch mode was: %8.5f seconds \n" %(len(fnames),(time.time()-_startT_))
+    return True
+# end of def convertFilesInWatchMode(fnames, ftype, simulated_hr):
+
+def __isUMFileComplete__(infile, size):
+    # UM fieldsfile fixed length header is of 256 (64 bit big endian) words.
+    # Its word 160 is start of data and word 161 is length of data, which 
+    # are updated while UM closing the file. pp files do not have such 
+    # header, so stable size itself is enough.
+    with open(infile, 'rb') as ffile:
+        header = numpy.fromfile(ffile, dtype='>i8', count=256)
+    # first word is data set format version (15 / 20 for fieldsfile)
+    if len(header) < 256 or header[0] not in (15, 20): return True
+    dataStart, dataLength = header[159], header[160]
+    if dataStart <= 0 or dataLength <= 0: return False
+    return size >= (dataStart - 1 + dataLength) * 8
+# end of def __isUMFileComplete__(infile, size):
+
+def __isInFileArrived__(infile):
+    """
+    Returns True, if the infile size has not been changed at least for
+    _watchInterval_ seconds and the UM fieldsfile is complete as per its
+    fixed length header.
+    """
+    global _inFilesSize_, _watchInterval_
+    
+    if not os.path.isfile(infile): return False
+    size = os.path.getsize(infile)
+    psize, since = _inFilesSize_.get(infile, (None, None))
+    if size != psize:
+        # new / still growing file
+        _inFilesSize_[infile] = (size, time.time())
+        return False
+    # end of if size != psize:
+    if time.time() - since < _watchInterval_: return False
+    return __isUMFileComplete__(infile, size)
+# end of def __isInFileArrived__(infile):
+
+def __waitForInDataPath__(path):
+    # returns True if path exists. In watch mode, it waits for the path 
+    # to be created by the model, upto _watchTimeout_ seconds.
+    global _watchInFiles_, _watchInterval_, _watchTimeout_
+    
+    waitT = time.time()
+    while not os.path.exists(path):
+        if not _watchInFiles_ or time.time() - waitT > _watchTimeout_: 
+            return False
+        print "Waiting for In datapath to be created", path
+        time.sleep(_watchInterval_)
+    # end of while not os.path.exists(path):
+    return True
+# end of def __waitForInDataPath__(path):
+
+def __getTaskInFile__(arg):
+    # returns the infile path of regridAnlFcstFiles task
+    global _inDataPath_
+    
+    fpname, hr, _ = arg
+    fileName = __getInFileName__(fpname, hr)
+    return getVarInOutFilesDetails(_inDataPath_, fileName, hr)[3]
+# end of def __getTaskInFile__(arg):
+
+def __getTaskWatchInFiles__(arg, ftype):
+    # returns the infiles to be arrived before converting regridAnlFcstFiles
+    # task. 24 hourly global forecast of accumulation vars needs next day 
+    # infile also (03z till next day 03z accumulation, see regridAnlFcstFiles)
+    global _inDataPath_, _convertVars_, _accumulationVars_, __UMtype__, \
+           __fcst_step_hour__
+    
+    fpname, hr, varIdx = arg
+    fileName = __getInFileName__(fpname, hr)
+    varNamesSTASH, _, _, infile, _ = getVarInOutFilesDetails(_inDataPath_, fileName, hr)
+    infiles = [infile]
+    if not (ftype in ['fcst', 'forecast'] and __UMtype__ == 'global' and 
+                                          __fcst_step_hour__ == 24): return infiles
+    if _convertVars_:
+        varNamesSTASH = [vns for vns in varNamesSTASH if vns in _convertVars_]
+    if varIdx is not None: varNamesSTASH = [varNamesSTASH[varIdx]]
+    if any([vns in _accumulationVars_ for vns in varNamesSTASH]):
+        infiles.append(infile[:-3] + str(int(hr)+24).zfill(3))
+    return infiles
+# end of def __getTaskWatchInFiles__(arg, ftype):
+
+def __getInFileStat__(infile):
+    # returns [mtime, size] of infile, otherwise None
+    if not os.path.isfile(infile): return None
+    fstat = os.stat(infile)
+    return [int(fstat.st_mtime), fstat.st_size]
+# end of def __getInFileStat__(infile):
+
+def __getConfigHash__():
+    # hash of the options which change the content of out files.
+    global _targetGridRes_, _targetGridFile_, _convertVars_, _requiredLat_, \
+           _requiredLon_, _requiredPressureLevels_, _extraPolateMethod_, \
+           _regridEngine_, __fillFullyMaskedVars__, __UMtype__, \
+           __soilFirstSecondFixedSurfaceUnit__, __setGrib2TableParameters__, \
+           __wgrib2Arguments__, __fcst_step_hour__, __anl_step_hour__, \
+           __anl_aavars_reference_time__, __anl_aavars_time_bounds__, \
+           __anlFileNameStructure__, __fcstFileNameStructure__, \
+           _write2NetcdfFile_, __UMReanalysis__, _grib2Packing_, \
+           _workingDtype_, _regridInSlabs_, _fcstVariableTasks_
+    
+    config = (_targetGridRes_, _targetGridFile_, _convertVars_, _requiredLat_, 
+              _requiredLon_, _requiredPressureLevels_, _extraPolateMethod_,
+              _regridEngine_, __fillFullyMaskedVars__, __UMtype__, 
+              __soilFirstSecondFixedSurfaceUnit__, __setGrib2TableParameters__,
+              __wgrib2Arguments__, __fcst_step_hour__, __anl_step_hour__, 
+              __anl_aavars_reference_time__, __anl_aavars_time_bounds__, 
+              __anlFileNameStructure__, __fcstFileNameStructure__, 
+              _write2NetcdfFile_, __UMReanalysis__, _grib2Packing_, 
+              _workingDtype_, _regridInSlabs_, _fcstVariableTasks_)
+    return hashlib.sha1(repr(config)).hexdigest()
+# end of def __getConfigHash__():
+
+def __getManifestPath__():
+    global _opPath_, __outFileType__
+    return os.path.join(_opPath_, 'um2grb2_%s_manifest.json' % __outFileType__)
+# end of def __getManifestPath__():
+
+def __loadManifest__():
+    """
+    Load the manifest of previous conversion from out path, only if it was 
+    created with same configuration (and _resumeConversion_ is True). 
+    Otherwise starts with empty manifest.
+    
+    Manifest contains 'tasks' which are keyed by 'fname:hr:varIdx' with its
+    'inFile', 'inFileStat' ([mtime, size]) and 'outFiles' (out file name as
+    key and list of [varName, varSTASH, no of messages] as value). And 
+    'outFiles' which are keyed by re-ordered out file name with its 'size'
+    and 'messages' (no of regridded messages).
+    """
+    global _manifest_, _resumeConversion_
+    
+    _manifest_ = {'configHash': __getConfigHash__(), 'tasks': {}, 'outFiles': {}}
+    mpath = __getManifestPath__()
+    if not _resumeConversion_ or not os.path.isfile(mpath): return _manifest_
+    try:
+        with open(mpath) as mfile:
+            manifest = json.load(mfile)
+    except (IOError, ValueError) as e:
+        print "ALERT!!! couldn't read the manifest", mpath, e
+        return _manifest_
+    # end of try:
+    if manifest.get('configHash') == _manifest_['configHash']:
+        _manifest_ = manifest
+        print "loaded the manifest of previous conversion", mpath
+    else:
+        print "configuration has been changed. So ignoring the manifest", mpath
+    return _manifest_
+# end of def __loadManifest__():
+
+def __saveManifest__():
+    # write into tmp file and rename it, so that manifest will not be 
+    # corrupted even if the process is killed while writing it. Manifest 
+    # is needed only to resume the conversion.
+    global _manifest_, _resumeConversion_
+    
+    if not _resumeConversion_: return
+    mpath = __getManifestPath__()
+    tmppath = '%s.%d.tmp' % (mpath, os.getpid())
+    with open(tmppath, 'w') as mfile:
+        json.dump(_manifest_, mfile, indent=1, sort_keys=True)
+    os.rename(tmppath, mpath)
+# end of def __saveManifest__():
+
+def __getTaskOutFiles__(arg, ftype):
+    """
+    Returns the (ordered) out file names, which the regridAnlFcstFiles task
+    will write, as per the forecast hours of its infile (see 
+    getVarInOutFilesDetails). Analysis tasks write all the analysis out 
+    files of the cycle.
+    """
+    global _inDataPath_, _current_date_, __utc__, __anlFileNameStructure__, \
+           __fcstFileNameStructure__, __anl_step_hour__, __fcst_step_hour__, \
+           __start_long_fcst_hour__, __end_long_fcst_hour__
+    
+    if ftype in ['anl', 'analysis']:
+        outFileNameStructure = __anlFileNameStructure__
+        fhrs = range(int(__utc__), int(__utc__) + 6, __anl_step_hour__)
+    else:
+        outFileNameStructure = __fcstFileNameStructure__
+        fpname, hr, _ = arg
+        fileName = __getInFileName__(fpname, hr)
+        _, fcstHours, _, _, _ = getVarInOutFilesDetails(_inDataPath_, fileName, hr)
+        # out file hour is end of the mean / accumulation hours
+        hours = set([int(numpy.ceil(numpy.max(fhr))) for fhr in numpy.array(fcstHours, ndmin=1)])
+        fhrs = [fhr for fhr in range(__start_long_fcst_hour__, __end_long_fcst_hour__+1, 
+                                          __fcst_step_hour__) if fhr in hours]
+    # end of if ftype in ['anl', 'analysis']:
+    outFnIndecies = __getAnlFcstFileNameIndecies__(outFileNameStructure)
+    return set([__genAnlFcstOutFileName__(outFileNameStructure, outFnIndecies, 
+                                     _current_date_, fhr, __utc__) for fhr in fhrs])
+# end of def __getTaskOutFiles__(arg, ftype):
+
+def __getStaleTasks__(tasks, ftype):
+    """
+    Returns the tasks need to be converted and the out files which are 
+    already converted as per the manifest. A task is stale if it is not in 
+    the manifest, or its infile mtime / size has been changed, or any one 
+    of its out files does not exist / size has been changed. Since one out 
+    file is written by many tasks, all the tasks of the stale out files are
+    also stale. Out files of the stale task are taken from manifest along 
+    with its infile forecast hours (see __getTaskOutFiles__), since the 
+    task may not be in the manifest yet.
+    
+    :param tasks: list of (fname, hr, varIdx) tasks.
+    :param ftype: 'anl' or 'fcst'.
+    :return: (staleTasks, freshOutFiles)
+    """
+    global _manifest_, _opPath_, _resumeConversion_
+    
+    if not _resumeConversion_: return list(tasks), set()
+    mtasks, moutFiles = _manifest_['tasks'], _manifest_['outFiles']
+    stale = set()
+    for task in tasks:
+        key = '%s:%s:%s' % task
+        entry = mtasks.get(key)
+        if entry is None or entry['inFileStat'] != __getInFileStat__(entry['inFile']):
+            stale.add(key)
+            continue
+        # end of if entry is None or ...:
+        for outFileName in entry['outFiles']:
+            opath = os.path.join(_opPath_, outFileName)
+            if (outFileName not in moutFiles or not os.path.isfile(opath) or 
+                    os.path.getsize(opath) != moutFiles[outFileName]['size']):
+                stale.add(key)
+                break
+        # end of for outFileName in entry['outFiles']:
+    # end of for task in tasks:
+    
+    # out files of the tasks (stale tasks will re-write these out files)
+    tasksOutFiles = {}
+    for task in tasks:
+        key = '%s:%s:%s' % task
+        outFiles = set(mtasks[key]['outFiles']) if key in mtasks else set()
+        if key in stale: outFiles.update(__getTaskOutFiles__(task, ftype))
+        tasksOutFiles[key] = outFiles
+    # end of for task in tasks:
+    for key in mtasks:
+        if key not in tasksOutFiles: tasksOutFiles[key] = set(mtasks[key]['outFiles'])
+    # end of for key in mtasks:
+    
+    while True:
+        # out files of stale tasks and then other tasks of those out files.
+        staleOutFiles = set([outFileName for key in stale 
+                                for outFileName in tasksOutFiles[key]])
+        newStale = set([key for key in tasksOutFiles if key not in stale and 
+                        staleOutFiles.intersection(tasksOutFiles[key])])
+        if not newStale: break
+        stale.update(newStale)
+    # end of while True:
+    
+    staleTasks = [task for task in tasks if '%s:%s:%s' % task in stale]
+    # never keep the out files, which are going to be re-written
+    freshOutFiles = set([outFileName for task in tasks if '%s:%s:%s' % task not in stale
+                         for outFileName in tasksOutFiles['%s:%s:%s' % task]]) - staleOutFiles
+    if len(staleTasks) != len(tasks):
+        print "%d tasks (%d out files) are already converted as per manifest" % (
+                           len(tasks) - len(staleTasks), len(freshOutFiles))
+    return staleTasks, freshOutFiles
+# end of def __getStaleTasks__(tasks, ftype):
+
+def __updateManifestTask__(task, written):
+    # store the out files written by the converted task (result of 
+    # regridAnlFcstFiles) into manifest. Those out files are yet to be 
+    # re-ordered, so remove it from manifest 'outFiles'. Called as soon as
+    # the task is finished (see __mapInMemoryBudget__), so that the finished
+    # tasks are kept in manifest even if the conversion is killed.
+    global _manifest_
+    
+    key = '%s:%s:%s' % task
+    if written is None:
+        _manifest_['tasks'].pop(key, None)
+        __saveManifest__()
+        return
+    # end of if written is None:
+    outFiles = {}
+    for outFileName, varName, varSTASH, nmsg in written:
+        outFiles.setdefault(outFileName, []).append([varName, varSTASH, nmsg])
+        _manifest_['outFiles'].pop(outFileName, None)
+    # end of for outFileName, varName, varSTASH, nmsg in written:
+    infile = __getTaskInFile__(task)
+    _manifest_['tasks'][key] = {'inFile': infile, 'outFiles': outFiles,
+                                'inFileStat': __getInFileStat__(infile)}
+    __saveManifest__()
+# end of def __updateManifestTask__(task, written):
+
+def __updateManifestOutFiles__():
+    # store the re-ordered out files (which are exists now) into manifest.
+    global _manifest_, _opPath_
+    
+    messages = {}
+    for entry in _manifest_['tasks'].itervalues():
+        for outFileName, fields in entry['outFiles'].iteritems():
+            messages[outFileName] = messages.get(outFileName, 0) + sum([f[-1] for f in fields])
+    # end of for entry in _manifest_['tasks'].itervalues():
+    for outFileName, nmsg in messages.iteritems():
+        if outFileName in _manifest_['outFiles']: continue
+        opath = os.path.join(_opPath_, outFileName)
+        if not os.path.isfile(opath): continue
+        _manifest_['outFiles'][outFileName] = {'size': os.path.getsize(opath), 
+                                               'messages': nmsg}
+    # end of for outFileName, nmsg in messages.iteritems():
+    __saveManifest__()
+# end of def __updateManifestOutFiles__():
+
+def __getDoneMarkerPath__(utc):
+    global _opPath_, _current_date_, __outFileType__
+    return os.path.join(_opPath_, 'um2grb2_%s_%s_%sZ.done' % (__outFileType__, 
+                                                     _current_date_, utc))
+# end of def __getDoneMarkerPath__(utc):
+
+def writeCompletionManifest(donepath, **info):
+    """
+    Write the completion manifest (done marker) json file donepath with info
+    (say date, utc, outFiles) atomically. Consumers (callBackScript, bsub
+    jobs, ftp push) can start exactly when this file appears, since all the
+    out files are already renamed from tmp files into its final names.
+    """
+    tmppath = '%s.%d.tmp' % (donepath, os.getpid())
+    with open(tmppath, 'w') as dfile:
+        json.dump(info, dfile, indent=1, sort_keys=True)
+    # end of with open(tmppath, 'w') as dfile:
+    __renameCompletedFile__(tmppath, donepath)
+    print "Written completion manifest", donepath
+# end of def writeCompletionManifest(donepath, **info):
+
+def __writeDoneMarker__(utc):
+    # write the done marker file of this cycle, which contains the out files
+    # and its size, no of messages as per manifest.
+    global _manifest_, _current_date_, __outFileType__
+    
+    writeCompletionManifest(__getDoneMarkerPath__(utc), date=_current_date_, 
+                        utc=utc, outFileType=__outFileType__, 
+                        outFiles=_manifest_['outFiles'])
+# end of def __writeDoneMarker__(utc):
+
 def _checkInFilesStatus(path, ftype, pfnames):
     
     global __start_long_fcst_hour__, __end_long_fcst_hour__, __UMtype__
@@ -3434,7 +4848,7 @@ def _checkInFilesStatus(path, ftype, pfnames):
     return status
 # end of def _checkInFilesStatus(path, ftype, pfnames):
 
-def _checkOutFilesStatus(path, ftype, date, utc, overwrite):
+def _checkOutFilesStatus(path, ftype, date, utc, overwrite, keepFiles=()):
     
     global _preExtension_, __end_long_fcst_hour__, __anlFileNameStructure__,\
            __fcstFileNameStructure__, __fcst_step_hour__, \
@@ -3465,6 +4879,11 @@ def _checkOutFilesStatus(path, ftype, date, utc, overwrite):
         fnames_list.append(fname)
         fpath = os.path.join(path, fname) 
         print "checking outfile", fhr, fname                
+        if fname in keepFiles:
+            # already converted as per manifest. So keep it as it is.
+            print "Out File already converted as per manifest", fpath
+            continue
+        # end of if fname in keepFiles:
         for ext in ['', '.ctl', '.idx']:
             fpath = os.path.join(path, fname+ext)
             if os.path.isfile(fpath):
@@ -3499,7 +4918,7 @@ def _checkOutFilesStatus(path, ftype, date, utc, overwrite):
                 os.remove(os.path.join(path, ifile))
                 print "removed intermediate file", ifile             
     # if ifiles and overwrite:
-# end of def _checkOutFilesStatus(path, ftype, date, hr, overwrite):
+# end of def _checkOutFilesStatus(path, ftype, date, hr, overwrite, keepFiles=()):
             
 def convertFcstFiles(inPath, outPath, tmpPath, **kwarg):
            
@@ -3513,7 +4932,13 @@ def convertFcstFiles(inPath, outPath, tmpPath, **kwarg):
        _removeVars_, _requiredPressureLevels_, __setGrib2TableParameters__, \
        __wgrib2Arguments__, __soilFirstSecondFixedSurfaceUnit__,  __UMtype__, \
        __start_long_fcst_hour__, _extraPolateMethod_, _targetGridFile_, \
-       __fillFullyMaskedVars__, _write2NetcdfFile_
+       __fillFullyMaskedVars__, _write2NetcdfFile_, _cacheRegridWeights_, \
+       _regridEngine_, _writeGrib2Shards_, _reorderGrib2Bytes_, _maxWorkers_, \
+       _grib2DecodeVars_, _memoryBudget_, _watchInFiles_, _watchInterval_, \
+       _watchTimeout_, _resumeConversion_, _recordTimings_, _profileWorkers_, \
+       _grib2Packing_, \
+       _renderCtlFiles_, _grib1Workers_, _regridInSlabs_, _workingDtype_, \
+       _fcstVariableTasks_
      
     # load key word arguments
     UMtype = kwarg.get('UMtype', 'global')    
@@ -3542,8 +4967,26 @@ def convertFcstFiles(inPath, outPath, tmpPath, **kwarg):
     removeGrib2FilesAfterGrib1FilesCreated = kwarg.get('removeGrib2FilesAfterGrib1FilesCreated', False)
     setGrib2TableParameters = kwarg.get('setGrib2TableParameters', None)
     wgrib2Arguments = kwarg.get('wgrib2Arguments', None)
+    packGrib2InProcess = kwarg.get('packGrib2InProcess', True)
+    renderCtlFiles = kwarg.get('renderCtlFiles', True)
+    grib1Workers = kwarg.get('grib1Workers', None)
+    regridInSlabs = kwarg.get('regridInSlabs', True)
+    workingDtype = kwarg.get('workingDtype', 'float32')
+    fcstVariableTasks = kwarg.get('fcstVariableTasks', False)
     callBackScript = kwarg.get('callBackScript', None)
     write2netcdf = kwarg.get('write2NetcdfFile', False)
+    cacheRegridWeights = kwarg.get('cacheRegridWeights', True)
+    writeGrib2Shards = kwarg.get('writeGrib2Shards', True)
+    reorderGrib2Bytes = kwarg.get('reorderGrib2Bytes', True)
+    maxWorkers = kwarg.get('maxWorkers', None)
+    memoryBudget = kwarg.get('memoryBudget', None)
+    watchInFiles = kwarg.get('watchInFiles', False)
+    watchInterval = kwarg.get('watchInterval', 60)
+    watchTimeout = kwarg.get('watchTimeout', 21600)
+    resumeConversion = kwarg.get('resumeConversion', False)
+    recordTimings = kwarg.get('recordTimings', False)
+    profileWorkers = kwarg.get('profileWorkers', None)
+    regridEngine = kwarg.get('regridEngine', 'iris')
     
     # assign out file type in global variable
     __outFileType__ = 'fcst'
@@ -3572,7 +5015,34 @@ def convertFcstFiles(inPath, outPath, tmpPath, **kwarg):
     _convertGrib2FilestoGrib1Files_ = convertGrib2FilestoGrib1Files
     __setGrib2TableParameters__ = setGrib2TableParameters
     __wgrib2Arguments__ = wgrib2Arguments
+    _grib2Packing_ = __getGrib2Packing__(wgrib2Arguments) if packGrib2InProcess else None
+    if _grib2Packing_:
+        # wgrib2 packing options are done by tweaked_messages itself
+        print "grib2 messages will be packed in-process as", _grib2Packing_
+        __wgrib2Arguments__ = None
+    # end of if _grib2Packing_:
     _write2NetcdfFile_ = write2netcdf
+    _cacheRegridWeights_ = cacheRegridWeights
+    _writeGrib2Shards_ = writeGrib2Shards
+    _regridEngine_ = regridEngine
+    _maxWorkers_ = maxWorkers
+    _memoryBudget_ = memoryBudget
+    _watchInFiles_ = watchInFiles
+    _watchInterval_ = watchInterval
+    _watchTimeout_ = watchTimeout
+    # resume works only with overwrite, otherwise existing out files are kept
+    _resumeConversion_ = resumeConversion and overwrite
+    _recordTimings_ = recordTimings
+    _profileWorkers_ = profileWorkers
+    _renderCtlFiles_ = renderCtlFiles
+    _grib1Workers_ = grib1Workers
+    _regridInSlabs_ = regridInSlabs
+    _workingDtype_ = workingDtype
+    _fcstVariableTasks_ = fcstVariableTasks
+    __setGribLoaderDtype__()
+    # close the workers pool of previous cycle (if any), because its workers
+    # were forked with previous cycle global variables.
+    __closeWorkerPool__()
     # forecast filenames partial name
     if __UMtype__ == 'global':
         # pass user passed long forecast global model infiles otherwise pass proper infiles.
@@ -3590,15 +5060,27 @@ def convertFcstFiles(inPath, outPath, tmpPath, **kwarg):
     createDirWhileParallelRacing(logpath)
     logfile = 'um2grb2_fcst_stdout_'+ _current_date_ +'_' + utc +'Z.log'
     sys.stdout = myLog(os.path.join(logpath, logfile))
+    # timing records (json lines) and worker profiles are kept along with log
+    timingfile = 'um2grb2_fcst_timing_'+ _current_date_ +'_' + utc +'Z.json'
+    profiledir = 'um2grb2_fcst_profiles_'+ _current_date_ +'_' + utc +'Z'
+    timingutils.configure(os.path.join(logpath, timingfile) if _recordTimings_ else None,
+                          _profileWorkers_, os.path.join(logpath, profiledir))
+    
+    if _cacheRegridWeights_ and _regridEngine_ != 'iris':
+        # regrid weights will be stored in tmpPath and reused by next cycles
+        createDirWhileParallelRacing(os.path.join(_tmpDir_, 'regridWeights'))
+    # end of if _cacheRegridWeights_ and _regridEngine_ != 'iris':
+    # ctl templates will be stored in tmpPath and reused by next cycles
+    if _renderCtlFiles_: createDirWhileParallelRacing(os.path.join(_tmpDir_, 'ctlTemplates'))
     
     # start the timer now
     _startT_ = time.time()
     
     # update indata path 
     _inDataPath_ = __completeInOutPath__(inPath, _current_date_, utc)    
-    if not os.path.exists(_inDataPath_):
+    if not __waitForInDataPath__(_inDataPath_):
         raise ValueError("In datapath does not exists %s" % _inDataPath_)
-    # end of if not os.path.exists(_inDataPath_):
+    # end of if not __waitForInDataPath__(_inDataPath_):
     
     if convertVars:
         # check either depedendant vars are need to be loaded 
@@ -3627,10 +5109,18 @@ def convertFcstFiles(inPath, outPath, tmpPath, **kwarg):
                 print "removed %s from list of files" % fpname             
     # end of if convertVars:    
     print "Final fpname list :", fcst_fnames
+    # re-order grib2 messages by byte copy, unless all of it has to be decoded
+    _reorderGrib2Bytes_ = (reorderGrib2Bytes and _writeGrib2Shards_ and 
+                not _write2NetcdfFile_ and __isGrib2BytesReorderable__())
+    # but decode these variables alone
+    _grib2DecodeVars_ = __getGrib2DecodeVars__() if _reorderGrib2Bytes_ else []
+    print "reorderGrib2Bytes :", _reorderGrib2Bytes_, "decode vars :", _grib2DecodeVars_
     # check either infiles are exist or not!
     status = _checkInFilesStatus(_inDataPath_, 'prg', fcst_fnames)
     print "in status+++++++++++++++++++++++++++", status
-    if not status:
+    if not status and _watchInFiles_:
+        print "Watch mode is enabled. So lets wait for the above infiles to arrive."
+    elif not status:
         raise ValueError("In datapath does not contain the above valid infiles")
     # end of if not instatus:
     
@@ -3638,6 +5128,8 @@ def convertFcstFiles(inPath, outPath, tmpPath, **kwarg):
     _opPath_ = __completeInOutPath__(outPath, _current_date_, utc)  
     # create out directory
     createDirWhileParallelRacing(_opPath_)
+    # remove done marker of previous run, this cycle is not done yet.
+    if os.path.isfile(__getDoneMarkerPath__(utc)): os.remove(__getDoneMarkerPath__(utc))
     
     # define default global lat start, lon end points
     slat, elat = (-90., 90.)
@@ -3691,7 +5183,11 @@ def convertFcstFiles(inPath, outPath, tmpPath, **kwarg):
     
     # check either files are exists or not. delete the existing files in case
     # of overwrite option is True, else return without re-converting files.
-    status = _checkOutFilesStatus(_opPath_, 'prg', _current_date_, utc, overwrite)
+    # load manifest of previous conversion (if any) to resume it
+    __loadManifest__()
+    _, freshOutFiles = __getStaleTasks__(__getConvertTasks__(fcst_fnames, 'fcst'), 'fcst')
+    status = _checkOutFilesStatus(_opPath_, 'prg', _current_date_, utc, overwrite, 
+                                                          freshOutFiles)
     if status is 'FilesExist': 
         print "All files are already exists. So skipping convert Fcst files porcess"
         return # return back without executing conversion process.
@@ -3699,14 +5195,30 @@ def convertFcstFiles(inPath, outPath, tmpPath, **kwarg):
         print "Going to start convert Fcst files freshly"
     # end of if status is 'FilesExists': 
     
-    # do convert for forecast files 
-    convertFilesInParallel(fcst_fnames, ftype='fcst')   
-    
-    # do re-order variables within files in parallel
-    doShuffleVarsInOrderInParallel('fcst', utc)
+    if _watchInFiles_:
+        # convert & re-order the files progressively as soon as infiles arrive
+        watchStatus = convertFilesInWatchMode(fcst_fnames, 'fcst', utc)
+    else:
+        # do convert for forecast files 
+        convertFilesInParallel(fcst_fnames, ftype='fcst')
+        # do re-order variables within files in parallel
+        doShuffleVarsInOrderInParallel('fcst', utc)
+        __updateManifestOutFiles__()
+    # end of if _watchInFiles_:
+    # all the stages are done. so close the workers pool.
+    __closeWorkerPool__()
+    if _watchInFiles_ and not watchStatus:
+        # infiles have not arrived. So this cycle is not done, neither mark 
+        # it as done nor call the callBackScript (rerun with resumeConversion
+        # converts only the rest).
+        print "ALERT!!! %s cycle is not completed. So skipping done marker and callBackScript" % utc
+        return
+    # end of if _watchInFiles_ and not watchStatus:
+    # all the out files are completely written (fsync & renamed). So mark
+    # this cycle as done, then follow-on stages can start immediately.
+    __writeDoneMarker__(utc)
     
     if callBackScript:
-        time.sleep(30)  # required few seconds sleep before further process starts  
         callBackScript = os.path.abspath(callBackScript)
         if not os.path.exists(callBackScript): 
             print "callBackScript '%s' doenst exist" % callBackScript
@@ -3714,7 +5226,9 @@ def convertFcstFiles(inPath, outPath, tmpPath, **kwarg):
         kwargs = ' --date=%s --outpath=%s --oftype=forecast --utc=%s' % (_current_date_, _opPath_, utc)
         scriptExecuteCmd = callBackScript + ' ' + kwargs
         # execute user defined call back script with keyword arguments
-        subprocess.call(scriptExecuteCmd, shell=True)
+        returncode = subprocess.call(scriptExecuteCmd, shell=True)
+        if returncode != 0:
+            print "ALERT !!! callBackScript '%s' failed (return code %d)" % (callBackScript, returncode)
     # end of if callBackScript:
 # end of def convertFcstFiles(...):
 
@@ -3731,7 +5245,12 @@ def convertAnlFiles(inPath, outPath, tmpPath, **kwarg):
        __setGrib2TableParameters__, __anl_aavars_reference_time__, \
        __anl_aavars_time_bounds__, _reverseLatitude_, __wgrib2Arguments__, \
        __soilFirstSecondFixedSurfaceUnit__, _extraPolateMethod_, _targetGridFile_, \
-       __UMtype__, __fillFullyMaskedVars__, _write2NetcdfFile_, __UMReanalysis__  
+       __UMtype__, __fillFullyMaskedVars__, _write2NetcdfFile_, __UMReanalysis__, \
+       _cacheRegridWeights_, _regridEngine_, _writeGrib2Shards_, \
+       _reorderGrib2Bytes_, _grib2DecodeVars_, _maxWorkers_, \
+       _memoryBudget_, _watchInFiles_, _watchInterval_, _watchTimeout_, \
+       _resumeConversion_, _recordTimings_, _profileWorkers_, _grib2Packing_, \
+       _renderCtlFiles_, _grib1Workers_, _regridInSlabs_, _workingDtype_
            
     # load key word arguments
     UMtype = kwarg.get('UMtype', 'global')
@@ -3762,8 +5281,25 @@ def convertAnlFiles(inPath, outPath, tmpPath, **kwarg):
     removeGrib2FilesAfterGrib1FilesCreated = kwarg.get('removeGrib2FilesAfterGrib1FilesCreated', False)
     setGrib2TableParameters = kwarg.get('setGrib2TableParameters', None)
     wgrib2Arguments = kwarg.get('wgrib2Arguments', None)
+    packGrib2InProcess = kwarg.get('packGrib2InProcess', True)
+    renderCtlFiles = kwarg.get('renderCtlFiles', True)
+    grib1Workers = kwarg.get('grib1Workers', None)
+    regridInSlabs = kwarg.get('regridInSlabs', True)
+    workingDtype = kwarg.get('workingDtype', 'float32')
     callBackScript = kwarg.get('callBackScript', None)
     write2netcdf = kwarg.get('write2NetcdfFile', False)
+    cacheRegridWeights = kwarg.get('cacheRegridWeights', True)
+    writeGrib2Shards = kwarg.get('writeGrib2Shards', True)
+    reorderGrib2Bytes = kwarg.get('reorderGrib2Bytes', True)
+    maxWorkers = kwarg.get('maxWorkers', None)
+    memoryBudget = kwarg.get('memoryBudget', None)
+    watchInFiles = kwarg.get('watchInFiles', False)
+    watchInterval = kwarg.get('watchInterval', 60)
+    watchTimeout = kwarg.get('watchTimeout', 21600)
+    resumeConversion = kwarg.get('resumeConversion', False)
+    recordTimings = kwarg.get('recordTimings', False)
+    profileWorkers = kwarg.get('profileWorkers', None)
+    regridEngine = kwarg.get('regridEngine', 'iris')
         
     # assign out file type in global variable    
     __UMReanalysis__ = UMReanalysis
@@ -3798,7 +5334,33 @@ def convertAnlFiles(inPath, outPath, tmpPath, **kwarg):
     _convertGrib2FilestoGrib1Files_ = convertGrib2FilestoGrib1Files
     __setGrib2TableParameters__ = setGrib2TableParameters
     __wgrib2Arguments__ = wgrib2Arguments
+    _grib2Packing_ = __getGrib2Packing__(wgrib2Arguments) if packGrib2InProcess else None
+    if _grib2Packing_:
+        # wgrib2 packing options are done by tweaked_messages itself
+        print "grib2 messages will be packed in-process as", _grib2Packing_
+        __wgrib2Arguments__ = None
+    # end of if _grib2Packing_:
     _write2NetcdfFile_ = write2netcdf
+    _cacheRegridWeights_ = cacheRegridWeights
+    _writeGrib2Shards_ = writeGrib2Shards
+    _regridEngine_ = regridEngine
+    _maxWorkers_ = maxWorkers
+    _memoryBudget_ = memoryBudget
+    _watchInFiles_ = watchInFiles
+    _watchInterval_ = watchInterval
+    _watchTimeout_ = watchTimeout
+    # resume works only with overwrite, otherwise existing out files are kept
+    _resumeConversion_ = resumeConversion and overwrite
+    _recordTimings_ = recordTimings
+    _profileWorkers_ = profileWorkers
+    _renderCtlFiles_ = renderCtlFiles
+    _grib1Workers_ = grib1Workers
+    _regridInSlabs_ = regridInSlabs
+    _workingDtype_ = workingDtype
+    __setGribLoaderDtype__()
+    # close the workers pool of previous cycle (if any), because its workers
+    # were forked with previous cycle global variables.
+    __closeWorkerPool__()
     # analysis filenames partial name
     if UMReanalysis:
         anl_fnames = UMInShortFcstFiles
@@ -3824,6 +5386,18 @@ def convertAnlFiles(inPath, outPath, tmpPath, **kwarg):
     createDirWhileParallelRacing(logpath)
     logfile = 'um2grb2_anal_stdout_'+ _current_date_ +'_' + utc +'Z.log'
     sys.stdout = myLog(os.path.join(logpath, logfile))
+    # timing records (json lines) and worker profiles are kept along with log
+    timingfile = 'um2grb2_anal_timing_'+ _current_date_ +'_' + utc +'Z.json'
+    profiledir = 'um2grb2_anal_profiles_'+ _current_date_ +'_' + utc +'Z'
+    timingutils.configure(os.path.join(logpath, timingfile) if _recordTimings_ else None,
+                          _profileWorkers_, os.path.join(logpath, profiledir))
+    
+    if _cacheRegridWeights_ and _regridEngine_ != 'iris':
+        # regrid weights will be stored in tmpPath and reused by next cycles
+        createDirWhileParallelRacing(os.path.join(_tmpDir_, 'regridWeights'))
+    # end of if _cacheRegridWeights_ and _regridEngine_ != 'iris':
+    # ctl templates will be stored in tmpPath and reused by next cycles
+    if _renderCtlFiles_: createDirWhileParallelRacing(os.path.join(_tmpDir_, 'ctlTemplates'))
     
     # start the timer now
     _startT_ = time.time()
@@ -3831,9 +5405,9 @@ def convertAnlFiles(inPath, outPath, tmpPath, **kwarg):
     # update indata path 
     _inDataPath_ = __completeInOutPath__(inPath, _current_date_, utc)
     print '_inDataPath_', _inDataPath_
-    if not os.path.exists(_inDataPath_):
+    if not __waitForInDataPath__(_inDataPath_):
         raise ValueError("In datapath does not exists %s" % _inDataPath_)
-    # end of if not os.path.exists(_inDataPath_):
+    # end of if not __waitForInDataPath__(_inDataPath_):
     print     
     if convertVars:
         # check either depedendant vars are need to be loaded 
@@ -3865,9 +5439,17 @@ def convertAnlFiles(inPath, outPath, tmpPath, **kwarg):
                 print "removed %s from list of files" % fpname            
     # end of if convertVars:    
     print "Final fpname list :", anl_fnames    
+    # re-order grib2 messages by byte copy, unless all of it has to be decoded
+    _reorderGrib2Bytes_ = (reorderGrib2Bytes and _writeGrib2Shards_ and 
+                not _write2NetcdfFile_ and __isGrib2BytesReorderable__())
+    # but decode these variables alone
+    _grib2DecodeVars_ = __getGrib2DecodeVars__() if _reorderGrib2Bytes_ else []
+    print "reorderGrib2Bytes :", _reorderGrib2Bytes_, "decode vars :", _grib2DecodeVars_
     # check either infiles are exist or not!
     status = _checkInFilesStatus(_inDataPath_, __outFileType__, anl_fnames)
-    if not status:
+    if not status and _watchInFiles_:
+        print "Watch mode is enabled. So lets wait for the above infiles to arrive."
+    elif not status:
         raise ValueError("In datapath does not contain the above valid infiles")
     # end of if not instatus:
     
@@ -3875,6 +5457,8 @@ def convertAnlFiles(inPath, outPath, tmpPath, **kwarg):
     _opPath_ = __completeInOutPath__(outPath, _current_date_, utc)    
     # create out directory
     createDirWhileParallelRacing(_opPath_)
+    # remove done marker of previous run, this cycle is not done yet.
+    if os.path.isfile(__getDoneMarkerPath__(utc)): os.remove(__getDoneMarkerPath__(utc))
     
     # define default global lat start, lon end points
     slat, elat = (-90., 90.)
@@ -3928,7 +5512,11 @@ def convertAnlFiles(inPath, outPath, tmpPath, **kwarg):
     print "_reverseLatitude_ =", _reverseLatitude_ 
     # check either files are exists or not. delete the existing files in case
     # of overwrite option is True, else return without re-converting files.
-    status = _checkOutFilesStatus(_opPath_, 'ana', _current_date_, utc, overwrite)
+    # load manifest of previous conversion (if any) to resume it
+    __loadManifest__()
+    _, freshOutFiles = __getStaleTasks__(__getConvertTasks__(anl_fnames, 'anl'), 'anl')
+    status = _checkOutFilesStatus(_opPath_, 'ana', _current_date_, utc, overwrite, 
+                                                          freshOutFiles)
     if status is 'FilesExist': 
         print "All files are already exists. So skipping convert Anl files porcess"
         return # return back without executing conversion process.
@@ -3936,14 +5524,30 @@ def convertAnlFiles(inPath, outPath, tmpPath, **kwarg):
         print "Going to start convert Anl files freshly"
     # end of if status is 'FilesExists': 
                    
-    # do convert for analysis files
-    convertFilesInParallel(anl_fnames, ftype='anl')   
-    
-    # do re-order variables within files in parallel
-    doShuffleVarsInOrderInParallel('anl', utc)
+    if _watchInFiles_:
+        # convert & re-order the files progressively as soon as infiles arrive
+        watchStatus = convertFilesInWatchMode(anl_fnames, 'anl', utc)
+    else:
+        # do convert for analysis files 
+        convertFilesInParallel(anl_fnames, ftype='anl')
+        # do re-order variables within files in parallel
+        doShuffleVarsInOrderInParallel('anl', utc)
+        __updateManifestOutFiles__()
+    # end of if _watchInFiles_:
+    # all the stages are done. so close the workers pool.
+    __closeWorkerPool__()
+    if _watchInFiles_ and not watchStatus:
+        # infiles have not arrived. So this cycle is not done, neither mark 
+        # it as done nor call the callBackScript (rerun with resumeConversion
+        # converts only the rest).
+        print "ALERT!!! %s cycle is not completed. So skipping done marker and callBackScript" % utc
+        return
+    # end of if _watchInFiles_ and not watchStatus:
+    # all the out files are completely written (fsync & renamed). So mark
+    # this cycle as done, then follow-on stages can start immediately.
+    __writeDoneMarker__(utc)
     
     if callBackScript:
-        time.sleep(30)  # required few seconds sleep before further process starts  
         callBackScript = os.path.abspath(callBackScript)
         if not os.path.exists(callBackScript): 
             print "callBackScript '%s' doenst exist" % callBackScript
@@ -3951,7 +5555,9 @@ def convertAnlFiles(inPath, outPath, tmpPath, **kwarg):
         kwargs = ' --date=%s --outpath=%s --oftype=analysis --utc=%s' % (_current_date_, _opPath_, utc)
         scriptExecuteCmd = callBackScript + ' ' + kwargs
         # execute user defined call back script with keyword arguments
-        subprocess.call(scriptExecuteCmd, shell=True)
+        returncode = subprocess.call(scriptExecuteCmd, shell=True)
+        if returncode != 0:
+            print "ALERT !!! callBackScript '%s' failed (return code %d)" % (callBackScript, returncode)
     # end of if callBackScript:
 # end of def convertAnlFiles(...):
 
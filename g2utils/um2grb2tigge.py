@@ -68,13 +68,15 @@ import multiprocessing.pool as mppool
 # by the top-level multiprocessing module.
 import datetime
 from iris.time import PartialDateTime
-from cubeutils import cubeAverager, cubeAddSubtractor, cubeCummulator
+from cubeutils import (cubeAverager, cubeAddSubtractor, cubeCummulator, 
+                       getRealizationStatistic)
 from ncum_load_rules import update_cf_standard_name
 import um2grb2 as umfcs
 import umeps2grb2 as umeps
 from um2grb2 import (createDirWhileParallelRacing, getCubeData, myLog, 
              __getAnlFcstFileNameIndecies__, __genAnlFcstOutFileName__, 
-            getCubeAttr, _NoDaemonProcess, _MyPool)
+            getCubeAttr, _NoDaemonProcess, _MyPool, writeCompletionManifest, 
+            __setEnsembleStatisticKeys__)
 # End of importing business
 
 # We have to make sure that strict_grib_load as False, since we have to 
@@ -1008,6 +1010,7 @@ def save_tigge_tweaked_messages(cubeList):
             # 5 for TIGGE-NCMRWF Test data
             gribapi.grib_set_long(grib_message, "productionStatusOfProcessedData", 4) # Operational mode
             
+            statistic = getRealizationStatistic(cube)
             if cube.coords("realization"):
                 # ensembles tweak 
                 # http://www.nco.ncep.noaa.gov/pmb/docs/grib2/grib2_table4-3.shtml 
@@ -1046,6 +1049,16 @@ def save_tigge_tweaked_messages(cubeList):
                     # 1 would be better for control run 
                     gribapi.grib_set(grib_message, "typeOfEnsembleForecast", 1)
                 # ensembles tweak end
+            elif statistic is not None:
+                # ensemble statistics cube (mean, spread, percentiles, ...)
+                # of cubeutils.cubeRealizationStatistics
+                __setEnsembleStatisticKeys__(cube, grib_message, statistic)
+                method, value, nmembers = statistic
+                # directory of the statistic (say mean, percentile90)
+                memno = method if value is None else '%s%g' % (method, value)
+                if cube.coord("forecast_period").bounds is not None:  
+                    # same as members, set proper time intervals
+                    gribapi.grib_set(grib_message, "typeOfTimeIncrement", 2)
             else:
                 # deterministic forecast 
                 memno = 'fcs'  # directory member number 
@@ -1182,16 +1195,59 @@ def save_tigge_tweaked_messages(cubeList):
             outgpath = os.path.join(outgdir, outgname) # Join the outpath & outfilename
             print "lets save into", outgpath
             
+            # write into tmp file and rename it, so that ftp push / tarball
+            # scripts never see partially written tigge file.
             if (cube.standard_name, cstash) in _accumulationVars_:
-                iris.fileformats.netcdf.save(cube, outgpath+'.nc')  # save nc file 
+                outgpath += '.nc'
+                iris.fileformats.netcdf.save(cube, outgpath+'.tmp')  # save nc file 
             else:
                 # finally save the cube/message into many individual grib2 files
-                iris.fileformats.grib.save_messages([grib_message], outgpath)
+                iris.fileformats.grib.save_messages([grib_message], outgpath+'.tmp')
+            os.rename(outgpath+'.tmp', outgpath)
 
         # end of for cube, grib_message in iris.fileformats.grib.as_pairs(cube):
     # end of for cube in cubeList:
 # end of def save_tigge_tweaked_messages(cube):
 
+def _getTiggeDoneMarkerPath(oftype, utc):
+    global _opPath_, _current_date_, _ensemble_member_
+    
+    fname = 'um2grb2tigge_%s_%s_%sZ' % (oftype, _current_date_, utc)
+    if oftype == 'eps':
+        member = 'all' if _ensemble_member_ is None else str(_ensemble_member_).zfill(3)
+        fname += '_' + member
+    # end of if oftype == 'eps':
+    return os.path.join(_opPath_, fname + '.done')
+# end of def _getTiggeDoneMarkerPath(oftype, utc):
+
+def _writeTiggeDoneMarker(oftype, utc):
+    # write completion manifest with the tigge files (and its size) of the 
+    # member directories (fcs for deterministic) which are completed now.
+    global _opPath_, _current_date_, _ensemble_member_
+    
+    if oftype != 'eps':
+        memdirs = ['fcs']
+    elif _ensemble_member_ is not None:
+        memdirs = [str(_ensemble_member_).zfill(3)]
+    else:
+        memdirs = [d for d in os.listdir(_opPath_) if d != 'fcs' 
+                        if os.path.isdir(os.path.join(_opPath_, d))]
+    # end of if oftype != 'eps':
+    outFiles = {}
+    for memdir in memdirs:
+        for root, dirs, files in os.walk(os.path.join(_opPath_, memdir)):
+            for fname in files:
+                if fname.endswith('.tmp'): continue
+                fpath = os.path.join(root, fname)
+                outFiles[os.path.relpath(fpath, _opPath_)] = {'size': os.path.getsize(fpath)}
+            # end of for fname in files:
+        # end of for root, dirs, files in os.walk(...):
+    # end of for memdir in memdirs:
+    writeCompletionManifest(_getTiggeDoneMarkerPath(oftype, utc), 
+                   date=_current_date_, utc=utc, outFileType=oftype, 
+                   outFiles=outFiles)
+# end of def _writeTiggeDoneMarker(oftype, utc):
+
 def makeTotalCummulativeVars(arg):
     
     global _opPath_, _current_date_, __start_long_fcst_hour__, __end_long_fcst_hour__  
@@ -1226,9 +1282,10 @@ def makeTotalCummulativeVars(arg):
     except Exception as e:     
         raise ValueError("Unable to load files from %s - while makeTotalCummulativeVars" % str(infiles))
     
-    # get the cummulated cubes generator
+    # get the cummulated cubes generator. Every cube is saved before taking 
+    # the next one, so the running sum can be kept in place.
     outcubes = cubeCummulator(cubes, standard_name='None', long_name=lname, 
-                                addZerosFirstCube=True, removeSTASH=rstash)
+                  addZerosFirstCube=True, removeSTASH=rstash, inPlace=True)
 
     # save cummulated cubes into individual grib2 files
     for cube in outcubes: save_tigge_tweaked_messages([cube])        
@@ -1610,6 +1667,9 @@ def convertFcstFiles(inPath, outPath, tmpPath, **kwarg):
     
     _opPath_ = os.path.join(outPath, _current_date_)
     createDirWhileParallelRacing(_opPath_)
+    # remove done marker of previous run, this cycle is not done yet.
+    if os.path.isfile(_getTiggeDoneMarkerPath('fcst', utc)): 
+        os.remove(_getTiggeDoneMarkerPath('fcst', utc))
     
     # define default global lat start, lon end points
     slat, elat = (-90., 90.)
@@ -1674,8 +1734,6 @@ def convertFcstFiles(inPath, outPath, tmpPath, **kwarg):
     # do convert for forecast files 
     convertFilesInParallel(fcst_fnames, ftype='fcst')   
     
-    time.sleep(30)  
-    
     # make total time cummulated variables    
     for (TCV, TCVS, TCSVAR) in [('surface_net_downward_shortwave_flux', 'm01s01i202', 'ssr'),
                         ('surface_net_downward_longwave_flux', 'm01s02i201', 'str'), 
@@ -1685,9 +1743,10 @@ def convertFcstFiles(inPath, outPath, tmpPath, **kwarg):
                         ('precipitation_amount', 'm01s05i226', 'tp')]:
         if (TCV, TCVS) in convertVars: makeTotalCummulativeVars((TCSVAR, TCV, 'fc', '000'))
     # end of for (TCV, TCVS, TCSVAR) ...:
+    # all the tigge files are renamed into its final names. So mark it done.
+    _writeTiggeDoneMarker('fcst', utc)
     
     if callBackScript:
-        time.sleep(30)  # required few seconds sleep before further process starts  
         callBackScript = os.path.abspath(callBackScript)
         if not os.path.exists(callBackScript): 
             print "callBackScript '%s' doenst exist" % callBackScript
@@ -1695,7 +1754,9 @@ def convertFcstFiles(inPath, outPath, tmpPath, **kwarg):
         kwargs = ' --date=%s --outpath=%s --oftype=forecast --utc=%s' % (_current_date_, _opPath_, utc)
         scriptExecuteCmd = callBackScript + ' ' + kwargs
         # execute user defined call back script with keyword arguments
-        subprocess.call(scriptExecuteCmd, shell=True)
+        returncode = subprocess.call(scriptExecuteCmd, shell=True)
+        if returncode != 0:
+            print "ALERT !!! callBackScript '%s' failed (return code %d)" % (callBackScript, returncode)
     # end of if callBackScript:
 # end of def convertFcstFiles(...):
 
@@ -1833,6 +1894,9 @@ def convertAnlFiles(inPath, outPath, tmpPath, **kwarg):
     
     _opPath_ = os.path.join(outPath, _current_date_)
     createDirWhileParallelRacing(_opPath_)
+    # remove done marker of previous run, this cycle is not done yet.
+    if os.path.isfile(_getTiggeDoneMarkerPath('anl', utc)): 
+        os.remove(_getTiggeDoneMarkerPath('anl', utc))
     
     # define default global lat start, lon end points
     slat, elat = (-90., 90.)
@@ -1896,9 +1960,10 @@ def convertAnlFiles(inPath, outPath, tmpPath, **kwarg):
                    
     # do convert for analysis files
     convertFilesInParallel(anl_fnames, ftype='anl')   
+    # all the tigge files are renamed into its final names. So mark it done.
+    _writeTiggeDoneMarker('anl', utc)
         
     if callBackScript:
-        time.sleep(30)  # required few seconds sleep before further process starts  
         callBackScript = os.path.abspath(callBackScript)
         if not os.path.exists(callBackScript): 
             print "callBackScript '%s' doenst exist" % callBackScript
@@ -1906,7 +1971,9 @@ def convertAnlFiles(inPath, outPath, tmpPath, **kwarg):
         kwargs = ' --date=%s --outpath=%s --oftype=analysis --utc=%s' % (_current_date_, _opPath_, utc)
         scriptExecuteCmd = callBackScript + ' ' + kwargs
         # execute user defined call back script with keyword arguments
-        subprocess.call(scriptExecuteCmd, shell=True)
+        returncode = subprocess.call(scriptExecuteCmd, shell=True)
+        if returncode != 0:
+            print "ALERT !!! callBackScript '%s' failed (return code %d)" % (callBackScript, returncode)
     # end of if callBackScript:
 # end of def convertAnlFiles(...):
 
@@ -2504,6 +2571,9 @@ def convertEPSFcstFiles(inPath, outPath, tmpPath, **kwarg):
     
     _opPath_ = os.path.join(outPath, _current_date_)
     createDirWhileParallelRacing(_opPath_) 
+    # remove done marker of previous run, this cycle is not done yet.
+    if os.path.isfile(_getTiggeDoneMarkerPath('eps', utc)): 
+        os.remove(_getTiggeDoneMarkerPath('eps', utc))
         
     # define default global lat start, lon end points
     slat, elat = (-90., 90.)
@@ -2567,7 +2637,6 @@ def convertEPSFcstFiles(inPath, outPath, tmpPath, **kwarg):
     
     # do convert for forecast files  
     convertEPSFilesInParallel(fcst_fnames, ftype='fcst')
-    time.sleep(30)  
     # make total time cummulated variables    
     for (TCV, TCVS, TCSVAR) in [('surface_net_downward_shortwave_flux', 'm01s01i202', 'ssr'),
                         ('surface_net_downward_longwave_flux', 'm01s02i201', 'str'), 
@@ -2601,6 +2670,8 @@ def convertEPSFcstFiles(inPath, outPath, tmpPath, **kwarg):
         pool.close()     
         pool.join()
     # end of for (TCV, TCVS, TCSVAR) ...:
+    # all the tigge files are renamed into its final names. So mark it done.
+    _writeTiggeDoneMarker('eps', utc)
     
 
     
@@ -21,7 +21,7 @@ latest Update : 29-Aug-2016
 """
 
 # -- Start importing necessary modules
-import os, sys, time, subprocess, errno
+import os, sys, time, subprocess, errno, shutil
 import numpy 
 import iris
 import gribapi
@@ -32,13 +32,17 @@ import multiprocessing.pool as mppool
 # by the top-level multiprocessing module.
 import datetime
 from iris.time import PartialDateTime
-from cubeutils import cubeAverager, cubeAddSubtractor
+from cubeutils import cubeAverager, cubeAddSubtractor, getRealizationStatistic
+from regridutils import regridCube, irisRegrid
 from ncum_load_rules import update_cf_standard_name
 from um2grb2 import (createDirWhileParallelRacing, getCubeData, myLog, 
              __getAnlFcstFileNameIndecies__, __genAnlFcstOutFileName__, 
             getCubeAttr, _NoDaemonProcess, _MyPool, _convert2WEASD,
             _updateDepthBelowLandSurfaceCoords4Levs, 
-            _convert2VolumetricMoisture)
+            _convert2VolumetricMoisture, __renameCompletedFile__, 
+            writeCompletionManifest, __getCubeSlabs__, getCubesIndex, 
+            __setEnsembleStatisticKeys__, __getAvailableMemoryGB__, 
+            __taskMemoryFactor__)
 
 # End of importing business
 
@@ -112,7 +116,27 @@ _convertGrib2FilestoGrib1Files_ = False
 __setGrib2TableParameters__ = None
 __wgrib2Arguments__ = None
 _extraPolateMethod_ = 'auto'
+# regrid & write the pressure levels of every member one by one
+_regridInSlabs_ = True
+# dtype of the regridded, masked and packed ensembles data
+_workingDtype_ = 'float32'
+# reuse regrid weights stored in tmpPath instead of iris Linear regrid
+_cacheRegridWeights_ = True
+# regrid engine 'sparse' | 'weights' | 'iris' (see regridutils module).
+# All the members of the variable are regridded together.
+_regridEngine_ = 'iris'
 _ensemble_count_ = 44
+# {(varName, varSTASH, fhr): (template cube, (member, ...) data memmap, 
+# (member, ...) mask memmap)} of the forecast file being packed. It is filled
+# by reading every member file once per group of outputs (see 
+# _getEnsembleOutputGroups) and inherited by the packEnsembles workers.
+_ensembleOutputs_ = {}
+# memory budget (in GB) of the ensemble outputs of all the forecast files 
+# being packed in parallel. If None, 80% of available memory of the node
+# (see _getEnsembleOutputGroups)
+_memoryBudget_ = None
+# no of forecast files being packed in parallel (see convertFilesInParallel)
+_filesInParallel_ = 1
 __UMtype__ = 'ensemble'
 __soilFirstSecondFixedSurfaceUnit__ = 'cm'
 # store out grib2 files name for the purpose of creat ctl files in parallel
@@ -399,17 +423,11 @@ def getVarInOutFilesDetails(inDataPath, fname, hr):
     return varNamesSTASH, fcstHours, doMultiHourlyMean, infile
 # end of def getVarInOutFilesDetails(inDataPath, fname, hr):
 
-def packEnsembles(arg):
-    
-    global _targetGrid_, _targetGridRes_,  _startT_, _inDataPath_, _opPath_, \
-            _preExtension_, _ncfilesVars_, _requiredLat_, _requiredLon_, \
-            _doRegrid_, __utc__, _requiredPressureLevels_, __LPRINT__, \
-            __outg2files__, _lock_, _accumulationVars_, __fcst_step_hour__, \
-            _targetGridFile_, _extraPolateMethod_, _current_date_, \
-             _reverseLatitude_, _precipVars_, _maskOverOceanVars_
-                 
-    infiles, varNamesSTASHFcstHour = arg
-    varName, varSTASH, fhr = varNamesSTASHFcstHour
+def _extractEnsembleMember(cubesIndex, varName, varSTASH, fhr, infile):
+    # extract the variable at fhr from the cubesIndex (getCubesIndex) of
+    # the member file infile.
+    global _requiredLat_, _requiredLon_, _requiredPressureLevels_, \
+           _accumulationVars_
     
     if (varName, varSTASH) in _accumulationVars_:
         # update the forecast hour, since precipitation_amount is accumulated
@@ -417,15 +435,8 @@ def packEnsembles(arg):
         fhr -= 3
     # end of if (varName, varSTASH) in [('precipitation_amount', 'm01s05i226')]:
     
-    simulated_hr = __utc__
-    # define variable name constraint
-    varConstraint = iris.Constraint(name=varName)
-    # define varibale stash code constraint
-    STASHConstraint = iris.AttributeConstraint(STASH=varSTASH)    
     # 
     forecast_period_constraint = iris.Constraint(forecast_period=fhr)            
-     # define (simulated_hr) forecast_reference_time constraint
-    fcstRefTimeConstraint = iris.Constraint(forecast_reference_time=PartialDateTime(hour=simulated_hr))
     # Define default lat, lon, pressure contraint (None just bring model global data)
     latConstraint, lonConstraint, pressureConstraint = None, None, None
     if _requiredLat_: 
@@ -444,60 +455,213 @@ def packEnsembles(arg):
         pressureConstraint = iris.Constraint(pressure=lambda cell: 
                                 int(cell.point) in _requiredPressureLevels_)
     
-    # make load constraints together
-    loadConstraints = varConstraint & STASHConstraint & forecast_period_constraint & latConstraint & lonConstraint
+    # make load constraints together (variable name & STASH are the key of
+    # cubesIndex)
+    loadConstraints = forecast_period_constraint & latConstraint & lonConstraint
+    ensCube = cubesIndex.get((varName, varSTASH))
+    if ensCube: ensCube = ensCube.extract(loadConstraints)
+    if not ensCube: raise ValueError("unable to extract variable %s %s %d from %s" % (varName, varSTASH, fhr, infile))
+    # Got variable successfully!    
+    ensCube = ensCube[0]        
+    # extract pressure levels
+    if pressureConstraint and ensCube.coords('pressure'): 
+        ensCube = ensCube.extract(pressureConstraint)
+    # ene of if pressureConstraint and tmpCube.coords('pressure'): 
+    return ensCube
+# end of def _extractEnsembleMember(cubesIndex, varName, varSTASH, fhr, infile):
+
+def _loadEnsembleMemberFile(infile, varNamesSTASHFcstHours):
+    # load the member file only once (needed variables alone) and returns 
+    # {(varName, varSTASH, fhr): cube} of all the outputs
+    STASHConstraints = [iris.AttributeConstraint(STASH=varSTASH) for varSTASH 
+                        in set(varSTASH for _, varSTASH, _ in varNamesSTASHFcstHours)]
+    print "extracting ensemble data", infile
+    cubesIndex = getCubesIndex(getCubeData(infile, constraints=STASHConstraints))
+    return dict(((varName, varSTASH, fhr), _extractEnsembleMember(cubesIndex, 
+                                       varName, varSTASH, fhr, infile))
+                    for varName, varSTASH, fhr in varNamesSTASHFcstHours)
+# end of def _loadEnsembleMemberFile(infile, varNamesSTASHFcstHours):
+
+def _allocateEnsembleOutputs(infiles, varNamesSTASHFcstHours, packDir):
+    # load the first member file and allocate (member, ...) data & mask 
+    # arrays (memmap in packDir) of every output as per its shape and dtype.
+    # Returns _ensembleOutputs_.
+    createDirWhileParallelRacing(packDir)
+    outputs = {}
+    for key, cube in _loadEnsembleMemberFile(infiles[0], varNamesSTASHFcstHours).iteritems():
+        ## By accessing cube.data, the full data has been loaded into memory
+        ## instead of being lazy data. Especially for dust aod, we must make 
+        ## it as fully loaded otherwise full data will be treated as zeros 
+        ## only instead of 6 pseudo_level data.
+        data = cube.data
+        fname = os.path.join(packDir, '%s_%s_%d' % key)
+        shape = (len(infiles),) + data.shape
+        values = numpy.lib.format.open_memmap(fname + '.data.npy', mode='w+', 
+                                               dtype=data.dtype, shape=shape)
+        masks = numpy.lib.format.open_memmap(fname + '.mask.npy', mode='w+', 
+                                               dtype=numpy.bool_, shape=shape)
+        values[0] = numpy.ma.getdata(data)
+        masks[0] = numpy.ma.getmaskarray(data)
+        # template keeps the coords & metadata, its data is not used.
+        cube.data = values[0]
+        outputs[key] = (cube, values, masks)
+    # end of for key, cube in ...:
+    return outputs
+# end of def _allocateEnsembleOutputs(infiles, varNamesSTASHFcstHours, packDir):
+
+def _getEnsembleOutputGroups(infiles, varNamesSTASHFcstHours):
+    # split the outputs into groups, whose (member, ...) data & mask of all
+    # the members (from the shape & dtype of the lazy first member cubes) fits
+    # into this file share of the memory budget. So only one group is loaded
+    # & packed at a time, instead of allocating all the outputs together.
+    # Every group reads the member files once. One output is always grouped,
+    # even if it alone exceeds the budget.
+    global _memoryBudget_, _filesInParallel_
+    
+    if _memoryBudget_:
+        budget = float(_memoryBudget_)
+    else:
+        memory = __getAvailableMemoryGB__()
+        budget = memory * 0.8 if memory is not None else float('inf')
+    # end of if _memoryBudget_:
+    budget /= _filesInParallel_
+    
+    cubes = _loadEnsembleMemberFile(infiles[0], varNamesSTASHFcstHours)
+    groups, group, used = [], [], 0.
+    for key in varNamesSTASHFcstHours:
+        cube = cubes[tuple(key)]
+        # data + mask (bool) of all the members, and its copies while 
+        # regridding & saving (see um2grb2.__taskMemoryFactor__)
+        npoints = len(infiles) * numpy.prod(cube.shape)
+        size = npoints * (cube.lazy_data().dtype.itemsize + 1) * \
+                                        __taskMemoryFactor__ / 1024.**3
+        if group and used + size > budget:
+            groups.append(group)
+            group, used = [], 0.
+        # end of if group and used + size > budget:
+        group.append(key)
+        used += size
+    # end of for key in varNamesSTASHFcstHours:
+    if group: groups.append(group)
+    print "ensemble outputs are packed in %d groups with memory budget %.2f GB" % (len(groups), budget)
+    return groups
+# end of def _getEnsembleOutputGroups(infiles, varNamesSTASHFcstHours):
+
+def _storeEnsembleMember(arg):
+    # load the member file (idx) only once and store all of its outputs into 
+    # the member row of _ensembleOutputs_ arrays.
+    global _ensembleOutputs_
+    
+    idx, infile = arg
+    cubes = _loadEnsembleMemberFile(infile, _ensembleOutputs_.keys())
+    for key, (template, values, masks) in _ensembleOutputs_.iteritems():
+        data = cubes.pop(key).data
+        if data.shape != values.shape[1:]:
+            raise ValueError("shape of %s %s %d of %s %s mismatch with first member %s" 
+                                  % (key + (infile, data.shape, values.shape[1:])))
+        values[idx] = numpy.ma.getdata(data)
+        masks[idx] = numpy.ma.getmaskarray(data)
+        values.flush()
+        masks.flush()
+    # end of for key, (template, values, masks) in ...:
+# end of def _storeEnsembleMember(arg):
+
+def _getEnsembleCube(template, values, masks, infiles):
+    # (realization, ...) cube of all the members from the template (first 
+    # member cube) and the (member, ...) data & mask arrays of infiles.
+    # plain ndarray views of the memmaps, since masked array keeps the memmap
+    # attributes (mmap) which cannot be deep copied while slicing the cube.
+    data = numpy.asarray(values)
+    if masks.any(): data = numpy.ma.masked_array(data, mask=numpy.asarray(masks))
+    members = [int(infile.split('/')[-1].split('_')[0]) for infile in infiles]
+    # create ensemble coordinate
+    enscoord = iris.coords.DimCoord(numpy.array(members, dtype=numpy.int32), 
+                         standard_name='realization', units=Unit('no_unit'), 
+                                                long_name='ensemble_member')
+    # insert ensemble dimension at first axis 
+    dim_coords = [(enscoord, 0)] + [(coord, template.coord_dims(coord)[0]+1) 
+                                        for coord in template.dim_coords]
+    ensCube = iris.cube.Cube(data, template.standard_name, template.long_name, 
+                           template.var_name, template.units, template.attributes,
+                                          template.cell_methods, dim_coords)
+    for coord in template.aux_coords:
+        ensCube.add_aux_coord(coord, tuple(dim+1 for dim in template.coord_dims(coord)))
+    return ensCube
+# end of def _getEnsembleCube(template, values, masks, infiles):
+
+def packEnsembles(arg):
+    
+    global _targetGrid_, _targetGridRes_,  _startT_, _inDataPath_, _opPath_, \
+            _preExtension_, _ncfilesVars_, _requiredLat_, _requiredLon_, \
+            _doRegrid_, __utc__, _requiredPressureLevels_, __LPRINT__, \
+            __outg2files__, _lock_, _accumulationVars_, __fcst_step_hour__, \
+            _targetGridFile_, _extraPolateMethod_, _current_date_, \
+             _reverseLatitude_, _precipVars_, _maskOverOceanVars_, \
+             _regridInSlabs_, _workingDtype_, _ensembleOutputs_, \
+             _regridEngine_, _cacheRegridWeights_, _tmpDir_
+                 
+    infiles, varNamesSTASHFcstHour = arg
+    varName, varSTASH, fhr = varNamesSTASHFcstHour
+    # members are already loaded (by _storeEnsembleMember) from infiles
+    template, values, masks = _ensembleOutputs_[(varName, varSTASH, fhr)]
+    # (realization, ...) cube of all the members (data still in memmap)
+    memberCube = _getEnsembleCube(template, values, masks, infiles)
     # initialize 
-    ensembleData, ensCube, dshape = None, None, None
+    ensembleArray, ensCube = None, None
+    # fully masked vars need all the levels together to be filled
+    inSlabs = _regridInSlabs_ and __fillFullyMaskedVars__ is None
     print "packEnsembles Started using", infiles
-    for idx, infile in enumerate(infiles):
-        print "extracting ensemble data", infile
-        # load ensemble cube with all constraints
-        ensCube = getCubeData(infile, constraints=loadConstraints)
-        if not ensCube: raise ValueError("unable to extract variable %s %s %d from %s" % (varName, varSTASH, fhr, infile))
-        # Got variable successfully!    
-        ensCube = ensCube[0]        
-        # extract pressure levels
-        if pressureConstraint and ensCube.coords('pressure'): 
-            ensCube = ensCube.extract(pressureConstraint)
-        # ene of if pressureConstraint and tmpCube.coords('pressure'): 
-
-        if ensCube.has_lazy_data():
-            print "Loaded", ensCube.standard_name, "into memory",
-            ## By accessing tmpCube.data (even for printing), the full 
-            ## data has been loaded into memory instead of being lazy 
-            ## data. Especially for dust aod, we must make it as fully 
-            ## loaded otherwise full data will be treated as zeros only 
-            ## instead of 6 pseudo_level data.
-            print "- min", ensCube.data.min(), "max", ensCube.data.max(),
-            print "has_lazy_data =", ensCube.has_lazy_data()
-        # end of if ensCube.has_lazy_data():        
-        exmode = None # required, when user didnt do any regrid
+    
+    exmode = None # required, when user didnt do any regrid
+    if _doRegrid_:
+        if (varName, varSTASH) in _precipVars_:
+            # DO NOT APPLY iris.analysis.Linear(extrapolation_mode='mask'), 
+            # which writes nan every where for the snowfall_flux,  
+            # rainfall_flux, precipitation_flux. So donot apply that.         
+            exmode = 'linear'
+        else:
+            # In general all the other variables should not be 
+            # extrapolated over masked grid points.
+            exmode = 'mask'
+        # end of if (...):
+        # However, if user specified custom method do that!                
+        exmode = _extraPolateMethod_ if _extraPolateMethod_ != 'auto' else exmode
+        # but make sure that soil variables (or whichever variables do not have values over ocean)
+        # do not extrapolate over ocean/masked regions. Otherwise, it will write only nan.
+        exmode = 'mask' if varName in _maskOverOceanVars_ else exmode
+    # end of if _doRegrid_:
+    
+    # regrid & write level by level (see um2grb2.__getCubeSlabs__), but all
+    # the members of the level together.
+    for ensCube in __getCubeSlabs__(memberCube, inSlabs):
         # interpolate it as per targetGridResolution deg resolution by 
         # setting up sample points based on coord 
         if _doRegrid_:
             if __LPRINT__: print "From shape", ensCube.shape                    
-            if (varName, varSTASH) in _precipVars_:
-                # DO NOT APPLY iris.analysis.Linear(extrapolation_mode='mask'), 
-                # which writes nan every where for the snowfall_flux,  
-                # rainfall_flux, precipitation_flux. So donot apply that.         
-                exmode = 'linear'
-            else:
-                # In general all the other variables should not be 
-                # extrapolated over masked grid points.
-                exmode = 'mask'
-            # end of if (...):
-            # However, if user specified custom method do that!                
-            exmode = _extraPolateMethod_ if _extraPolateMethod_ != 'auto' else exmode
-            # but make sure that soil variables (or whichever variables do not have values over ocean)
-            # do not extrapolate over ocean/masked regions. Otherwise, it will write only nan.
-            exmode = 'mask' if varName in _maskOverOceanVars_ else exmode
-                
-            if os.path.isfile(_targetGridFile_):
+            regdSlab = None
+            if _regridEngine_ != 'iris':
+                # Regrid all the members by single sparse matrix multiplication,
+                # by reusing the bilinear operator of this source to target 
+                # grid which computed only once and stored in tmpPath.
+                weightsDir = os.path.join(_tmpDir_, 'regridWeights') if _cacheRegridWeights_ else None
+                regdSlab = regridCube(ensCube, _targetGrid_, exmode, 
+                                   cacheDir=weightsDir, engine=_regridEngine_)
+            # end of if _regridEngine_ != 'iris':
+            
+            if regdSlab is not None:
+                print "\n Regridded all members using %s engine, shape %s" % (_regridEngine_, str(regdSlab.shape))
+            elif os.path.isfile(_targetGridFile_):
                 print "\n Regridding data to %s degree spatial resolution based on file %s\n" % (_targetGrid_.shape, _targetGridFile_) 
                 # Do regrid based on user specfied target grid file.
-                scheme = iris.analysis.Linear(extrapolation_mode=exmode)
-                regdCube = ensCube.regrid(_targetGrid_, scheme)
-                print "regrid data shape", regdCube.shape 
+                if _cacheRegridWeights_:
+                    # reuse the iris regridder of this grid & exmode (see 
+                    # regridutils.irisRegrid)
+                    regdSlab = irisRegrid(ensCube, _targetGrid_, exmode)
+                else:
+                    scheme = iris.analysis.Linear(extrapolation_mode=exmode)
+                    regdSlab = ensCube.regrid(_targetGrid_, scheme)
+                # end of if _cacheRegridWeights_:
+                print "regrid data shape", regdSlab.shape 
             else:           
                 # Do regrid based on user specfied target grid resolution number.
                 print "\n Regridding data to %sx%s degree spatial resolution \n" % (_targetGridRes_, _targetGridRes_)                    
@@ -505,169 +669,168 @@ def packEnsembles(arg):
                     # This lienar interpolate will do extra polate over ocean even 
                     # though original data doesnt have values over ocean and wise versa.
                     # So lets be aware of this.                    
-                    regdCube = ensCube.interpolate(_targetGrid_, iris.analysis.Linear(extrapolation_mode=exmode))
+                    regdSlab = ensCube.interpolate(_targetGrid_, iris.analysis.Linear(extrapolation_mode=exmode))
                 except Exception as e:
                     print "ALERT !!! Error while regridding!! %s" % str(e)
                     print " So skipping this without saving data"
                     continue
                 # end of try:      
         else:
-            # do not apply regrid. this is temporary fix. 
-            regdCube = ensCube
+            # do not apply regrid. this is temporary fix. (copy into memory
+            # from memmap)
+            regdSlab = ensCube.copy()
         # end of if _doRegrid_:
-
-        if _reverseLatitude_:
-            # Need to reverse latitude from SN to NS
-            rcsh = len(regdCube.data.shape)
-            if rcsh == 3:
-                regdCube.data = regdCube.data[:,::-1,:]
-            elif rcsh == 2:
-                regdCube.data = regdCube.data[::-1,:]
-            lat = regdCube.coords('latitude')[0]
-            lat.points = lat.points[::-1]
-        # end of if _reverseLatitude_:
         
-        if (varName, varSTASH) in _precipVars_:
-            # Since we are not using 'mask' option for extrapolate while 
-            # doing linear regrid, which bring -ve values after regrid in 
-            # extrapolated grids. So lets make it as 0 as minimum value.
-            regdCube.data[regdCube.data < 0.0] = 0.0
-        # end of if (varName, varSTASH) in _precipVars_:
+        for idx, infile in enumerate(infiles):
+            # regridded member 
+            regdCube = regdSlab[idx]
+            if _reverseLatitude_:
+                # Need to reverse latitude from SN to NS
+                rcsh = len(regdCube.data.shape)
+                if rcsh == 3:
+                    regdCube.data = regdCube.data[:,::-1,:]
+                elif rcsh == 2:
+                    regdCube.data = regdCube.data[::-1,:]
+                lat = regdCube.coords('latitude')[0]
+                lat.points = lat.points[::-1]
+            # end of if _reverseLatitude_:
+        
+            if (varName, varSTASH) in _precipVars_:
+                # Since we are not using 'mask' option for extrapolate while 
+                # doing linear regrid, which bring -ve values after regrid in 
+                # extrapolated grids. So lets make it as 0 as minimum value.
+                regdCube.data[regdCube.data < 0.0] = 0.0
+            # end of if (varName, varSTASH) in _precipVars_:
         
-        if (varName, varSTASH) in [('land_binary_mask', 'm01s00i030')]:
-            regdCube.data[regdCube.data > 0] = 1
-            # trying to keep values either 0 or 1. Not fraction!
-            regdCube.data = numpy.ma.array(regdCube.data, dtype=numpy.int)            
-        # end of if (varName, varSTASH) in [('land_binary_mask', 'm01s00i030')]:
+            if (varName, varSTASH) in [('land_binary_mask', 'm01s00i030')]:
+                regdCube.data[regdCube.data > 0] = 1
+                # trying to keep values either 0 or 1. Not fraction!
+                regdCube.data = numpy.ma.array(regdCube.data, dtype=numpy.int)            
+            # end of if (varName, varSTASH) in [('land_binary_mask', 'm01s00i030')]:
         
-        if exmode == 'mask':
-            # For the above set of variables we shouldnot convert into 
-            # masked array. Otherwise its full data goes as nan.                
-            # convert data into masked array
-            regdCube.data = numpy.ma.masked_array(regdCube.data, 
-                                dtype=numpy.float64, fill_value=9.999e+20) 
+            if exmode == 'mask':
+                # For the above set of variables we shouldnot convert into 
+                # masked array. Otherwise its full data goes as nan.                
+                # convert data into masked array
+                regdCube.data = numpy.ma.masked_array(regdCube.data, 
+                                    dtype=_workingDtype_, fill_value=9.999e+20) 
             
-            if (varName, varSTASH) in [('moisture_content_of_soil_layer', 'm01s08i223'),
-                                       ('sea_ice_area_fraction', 'm01s00i031'),
-                                       ('sea_ice_thickness', 'm01s00i032'),]:
-                    # We should assign 0 instead 1e-15 only for this var!
-                    regdCube.data[regdCube.data <= 1e-15] = 0.0
-            elif (varName, varSTASH) == ('soil_temperature', 'm01s03i238'):
-                # We should assign min instead 1e-15 only for this var!
-                # because 0 will not make sense when temperature unit is Kelvin
-                nmin = numpy.ma.masked_less_equal(regdCube.data, 1e-15).min()
-                regdCube.data[regdCube.data <= 1e-15] = nmin
-            # http://www.cpc.ncep.noaa.gov/products/wesley/g2grb.html
-            # Says that 9.999e+20 value indicates as missingValue in grib2
-            # by default g2ctl.pl generate "undefr 9.999e+20", so we must 
-            # keep the fill_value / missingValue as 9.999e+20 only.
-            numpy.ma.set_fill_value(regdCube.data, 9.999e+20)    
-        # end of if exmode == 'mask':
+                if (varName, varSTASH) in [('moisture_content_of_soil_layer', 'm01s08i223'),
+                                           ('sea_ice_area_fraction', 'm01s00i031'),
+                                           ('sea_ice_thickness', 'm01s00i032'),]:
+                        # We should assign 0 instead 1e-15 only for this var!
+                        regdCube.data[regdCube.data <= 1e-15] = 0.0
+                elif (varName, varSTASH) == ('soil_temperature', 'm01s03i238'):
+                    # We should assign min instead 1e-15 only for this var!
+                    # because 0 will not make sense when temperature unit is Kelvin
+                    nmin = numpy.ma.masked_less_equal(regdCube.data, 1e-15).min()
+                    regdCube.data[regdCube.data <= 1e-15] = nmin
+                # http://www.cpc.ncep.noaa.gov/products/wesley/g2grb.html
+                # Says that 9.999e+20 value indicates as missingValue in grib2
+                # by default g2ctl.pl generate "undefr 9.999e+20", so we must 
+                # keep the fill_value / missingValue as 9.999e+20 only.
+                numpy.ma.set_fill_value(regdCube.data, 9.999e+20)    
+            # end of if exmode == 'mask':
         
-        if (varName, varSTASH) in [('snowfall_amount', 'm01s00i023')]:
-            # the snowfall_amount need to be changed as 
-            # liquid_water_content_of_surface_snow by convert it into
-            # water equivalent of snow amount.                    
-            _convert2WEASD(regdCube)
-        # end of if (varName, varSTASH) == ('snowfall_amount', 'm01s00i023'):
+            if (varName, varSTASH) in [('snowfall_amount', 'm01s00i023')]:
+                # the snowfall_amount need to be changed as 
+                # liquid_water_content_of_surface_snow by convert it into
+                # water equivalent of snow amount.                    
+                _convert2WEASD(regdCube)
+            # end of if (varName, varSTASH) == ('snowfall_amount', 'm01s00i023'):
                 
-        if regdCube.coords('soil_model_level_number') or regdCube.coords('depth'):
-            # NOTE : THIS SECTION WILL WORKS ONLY FOR SOIL MOISTURE AND
-            # SOIL TEMPERATUE AT 4 LAYERS, NOT FOR SINGLE LAYER OR 
-            # NOT FOR Root zone Soil Moisture Content !!!
+            if regdCube.coords('soil_model_level_number') or regdCube.coords('depth'):
+                # NOTE : THIS SECTION WILL WORKS ONLY FOR SOIL MOISTURE AND
+                # SOIL TEMPERATUE AT 4 LAYERS, NOT FOR SINGLE LAYER OR 
+                # NOT FOR Root zone Soil Moisture Content !!!
              
-            # Get soil_model_level_number coords from the cube.
-            # We need to update this variable, which will be replicated
-            # in the cube attributes. By default iris-1.9 will not 
-            # support to handle soil_model_level_number, so we need to 
-            # tweak it by following way.
-            depth_below_land_surface = regdCube.coords('soil_model_level_number')
-            if not depth_below_land_surface:
-                depth_below_land_surface = regdCube.coords('depth')
+                # Get soil_model_level_number coords from the cube.
+                # We need to update this variable, which will be replicated
+                # in the cube attributes. By default iris-1.9 will not 
+                # support to handle soil_model_level_number, so we need to 
+                # tweak it by following way.
+                depth_below_land_surface = regdCube.coords('soil_model_level_number')
+                if not depth_below_land_surface:
+                    depth_below_land_surface = regdCube.coords('depth')
             
-            depth_below_land_surface = depth_below_land_surface[0]
-            _updateDepthBelowLandSurfaceCoords4Levs(depth_below_land_surface)
-            if __LPRINT__: print "depth_below_land_surface", depth_below_land_surface
+                depth_below_land_surface = depth_below_land_surface[0]
+                _updateDepthBelowLandSurfaceCoords4Levs(depth_below_land_surface)
+                if __LPRINT__: print "depth_below_land_surface", depth_below_land_surface
             
-            if (regdCube.standard_name == 'moisture_content_of_soil_layer'):
-                # pass the vertical layer depth in millimeter
-                _convert2VolumetricMoisture(regdCube, 
-                                    levels=[100.0, 250.0, 650.0, 2000.0])
-                print "converted four layer soil moisture to volumetric"                
-                # We need to save this variable into nc file, why because
-                # if we saved into grib2 and then re-read it while re-ordering
-                # variables, iris couldnt load variables with 
-                # depth_below_land_surfacer properly. We need to touch the 
-                # _load_rules. So for timebeing, we saved it as seperate nc 
-                # file. In iris-1.9 we couldnt append more variables into 
-                # nc file. so we saved into muliple individual nc files, only
-                # those who have depth_below_land_surface and will be deleted
-                # after inserted properly into orderd grib2 files.
-                ncfile = True
-            # end of if regdCube.standard_name == 'moisture_content_of_soil_layer':                
-            print "after soil_model_level_number", regdCube.data 
-        # end of if regdCube.coords('soil_model_level_number'):
+                if (regdCube.standard_name == 'moisture_content_of_soil_layer'):
+                    # pass the vertical layer depth in millimeter
+                    _convert2VolumetricMoisture(regdCube, 
+                                        levels=[100.0, 250.0, 650.0, 2000.0])
+                    print "converted four layer soil moisture to volumetric"                
+                    # We need to save this variable into nc file, why because
+                    # if we saved into grib2 and then re-read it while re-ordering
+                    # variables, iris couldnt load variables with 
+                    # depth_below_land_surfacer properly. We need to touch the 
+                    # _load_rules. So for timebeing, we saved it as seperate nc 
+                    # file. In iris-1.9 we couldnt append more variables into 
+                    # nc file. so we saved into muliple individual nc files, only
+                    # those who have depth_below_land_surface and will be deleted
+                    # after inserted properly into orderd grib2 files.
+                    ncfile = True
+                # end of if regdCube.standard_name == 'moisture_content_of_soil_layer':                
+                print "after soil_model_level_number", regdCube.data 
+            # end of if regdCube.coords('soil_model_level_number'):
                     
-        if __fillFullyMaskedVars__ is not None and isinstance(regdCube.data, numpy.ma.masked_array):
-            # yes, it is ma array
-            if regdCube.data.mask.all():
-                # Now data is fully masked. So lets fill with user passed value.
-                # And still create ma array
-                regdCube.data = regdCube.data.filled(__fillFullyMaskedVars__)
-                print "filled masked vars", regdCube.data
-                regdCube.data = numpy.ma.masked_array(regdCube.data.filled(__fillFullyMaskedVars__),
-                                                     fill_value=9.999e+20) 
-            elif regdCube.data.min() == regdCube.data.max():
-                # Both min and max are same value. But its mask is not fully True.
-                # So previous condition not executed, anyhow lets set 
-                # fully the value of fillFullyMaskedVars.
-                print "Both min and max are same. So lets fillFullyMaskedVars as", __fillFullyMaskedVars__ 
-                regdCube.data = numpy.ma.masked_array(regdCube.data.filled(__fillFullyMaskedVars__), 
-                                                    fill_value=9.999e+20)
-        # end of if __fillFullyMaskedVars__ and ...:            
-        print "regrid done"        
+            if __fillFullyMaskedVars__ is not None and isinstance(regdCube.data, numpy.ma.masked_array):
+                # yes, it is ma array
+                if regdCube.data.mask.all():
+                    # Now data is fully masked. So lets fill with user passed value.
+                    # And still create ma array
+                    regdCube.data = regdCube.data.filled(__fillFullyMaskedVars__)
+                    print "filled masked vars", regdCube.data
+                    regdCube.data = numpy.ma.masked_array(regdCube.data.filled(__fillFullyMaskedVars__),
+                                                         fill_value=9.999e+20) 
+                elif regdCube.data.min() == regdCube.data.max():
+                    # Both min and max are same value. But its mask is not fully True.
+                    # So previous condition not executed, anyhow lets set 
+                    # fully the value of fillFullyMaskedVars.
+                    print "Both min and max are same. So lets fillFullyMaskedVars as", __fillFullyMaskedVars__ 
+                    regdCube.data = numpy.ma.masked_array(regdCube.data.filled(__fillFullyMaskedVars__), 
+                                                        fill_value=9.999e+20)
+            # end of if __fillFullyMaskedVars__ and ...:            
+            print "regrid done"        
 
-        # introduce ensemble dimension at first axis 
-        dshape = list(regdCube.data.shape)
-        dshape.insert(0, 1)    
-        ensembleData = regdCube.data.reshape(dshape)
-            
-        print "taken into memory of all ensembles", ensembleData.shape 
-        # convert data into masked array
-        ensembleData = numpy.ma.masked_array(ensembleData, dtype=numpy.float64)
+            if ensembleArray is None or ensembleArray.shape[1:] != regdCube.shape:
+                # allocate the (realization, ...) out data and write every 
+                # member directly into its slice. It is reused by the next
+                # slabs, as long as their regridded shape is unchanged.
+                ensembleArray = numpy.ma.masked_array(numpy.empty((len(infiles),) + 
+                                regdCube.shape, dtype=_workingDtype_), mask=False)
+            # end of if ensembleArray is None or ...:
+            ensembleArray[idx] = regdCube.data
+        # end of for idx, infile in enumerate(infiles):
+        
+        print "taken into memory of all ensembles", ensembleArray.shape 
         if (varName, varSTASH) in [('precipitation_amount', 'm01s05i226'),]:
             # precipitation should not go less than 0.
-            ensembleData.data[ensembleData.data < 0] = 0.0
+            ensembleArray.data[ensembleArray.data < 0] = 0.0
         # end of if ...:
-        
+    
         # http://www.cpc.ncep.noaa.gov/products/wesley/g2grb.html
         # Says that 9.999e+20 value indicates as missingValue in grib2
         # by default g2ctl.pl generate "undefr 9.999e+20", so we must 
         # keep the fill_value / missingValue as 9.999e+20 only.
-        numpy.ma.set_fill_value(ensembleData, 9.999e+20)
-            
-        totEns = len(ensembleData)
-        member = int(infile.split('/')[-1].split('_')[0]) # get member number
-        # create ensemble coordinate
-        enscoord = iris.coords.DimCoord(numpy.array(member, dtype=numpy.int32), 
-                             standard_name='realization', units=Unit('no_unit'), 
-                                                    long_name='ensemble_member')
-                                                                                                
+        numpy.ma.set_fill_value(ensembleArray, 9.999e+20)
+        
         # get list of dimension coordinates
         dim_coords = list(regdCube.dim_coords)
         # insert ensemble dimension at first axis 
-        dim_coords.insert(0, enscoord)
+        dim_coords.insert(0, regdSlab.coord('realization'))
         # generate list of tuples contain index and coordinate
         dim_coords = [(coord, i) for i,coord in enumerate(dim_coords)]
-        # get all other dimensions
-        aux_coords = list(regdCube.aux_coords)
-        aux_factories = regdCube.aux_factories
         t = regdCube.coords('time')[0]
         fp = regdCube.coords('forecast_period')[0]
         ft = regdCube.coords('forecast_reference_time')[0]
         hg = regdCube.coords('height')
+        # pressure level of the slab
+        pr = regdCube.coords('pressure', dim_coords=False)
         # create ensemble packed cubes 
-        ensembleData = iris.cube.Cube(ensembleData, regdCube.standard_name, 
+        ensembleData = iris.cube.Cube(ensembleArray, regdCube.standard_name, 
                                  regdCube.long_name, regdCube.var_name,
                                    regdCube.units, regdCube.attributes, 
                                        regdCube.cell_methods, dim_coords)
@@ -677,6 +840,7 @@ def packEnsembles(arg):
         ensembleData.add_aux_coord(ft)
         ensembleData.add_aux_coord(t)
         if hg: ensembleData.add_aux_coord(hg[0])
+        if pr: ensembleData.add_aux_coord(pr[0])
         # create cell method for ensembles
         cm = iris.coords.CellMethod('realization', ('realization',), 
                                intervals=('1',), comments=(' ENS',))
@@ -694,13 +858,11 @@ def packEnsembles(arg):
             ensembleData.cell_methods = (cm,)
         print ensembleData
         # make memory free 
-        del regdCube  
+        del regdCube, regdSlab
     
-        print "To ensembleData shape", ensembleData.shape  
-
         # get the regridded ensembles meta data 
         fcstTm = getCubeAttr(ensembleData)[2]
-        
+    
         if fcstTm.bounds is not None:                
             # this is needed for forecast 00th simulated_hr
             # get the last hour from bounds
@@ -712,7 +874,7 @@ def packEnsembles(arg):
             hr = str(int(fcstTm.points))
             if __LPRINT__: print "points comes in ", hr 
         # end of if fcstTm.bounds:
-        
+    
         outFileNameStructure = __fcstFileNameStructure__
         # get the out fileName Structure based on pre / user defined indecies                       
         outFnIndecies = __getAnlFcstFileNameIndecies__(outFileNameStructure)
@@ -725,7 +887,7 @@ def packEnsembles(arg):
         # get the file full name except last extension, for the purpose
         # of writing intermediate nc files
         ofname = outFn.split(fileExtension)[0] 
-        
+    
         # make unique file name becase we are running in parallel            
         if varName == 'air_temperature_maximum':
             outFn = varSTASH + '-max_'+ outFn
@@ -733,10 +895,10 @@ def packEnsembles(arg):
             outFn = varSTASH + '-min_'+ outFn
         else:
             outFn = varSTASH + '_'+ outFn  # suits for all other vars
-                           
+                       
         ncfile = False
         print "outFn = ", outFn
-                
+            
         # append out grib2 files for the purpose of creating ctl files.
         if not outFn in __outg2files__: __outg2files__.append(outFn)
         print "__outg2files__ = ", __outg2files__
@@ -744,12 +906,12 @@ def packEnsembles(arg):
         print "Going to be save into ", outFn
         print "ensembleData-var", ensembleData.standard_name
         print ensembleData
-                
+            
         try:                
             # _lock_ other threads / processors from being access same file 
             # to write other variables. 
 #            _lock_.acquire()
-            
+        
             # before save it, tweak the cubes by setting centre no and 
             # address other temporary issues before saving into grib2.
             iris.fileformats.grib.save_messages(tweaked_messages([ensembleData,]), 
@@ -765,13 +927,15 @@ def packEnsembles(arg):
         print ensembleData
         # make memory free 
         del ensembleData
-#     end of for idx, infile in enumerate(infiles):
+    # end of for ensCube in __getCubeSlabs__(memberCube, inSlabs):
+    del memberCube, ensembleArray
 # end of def packEnsembles(arg):                     
 
 def packEnsemblesInParallel(arg):
 
     global  _startT_, _inDataPath_, __fcst_step_hour__, __LPRINT__, \
-            _opPath_, _ensemble_count_, __outg2files__, __start_long_fcst_hour__
+            _opPath_, _ensemble_count_, __outg2files__, __start_long_fcst_hour__, \
+            _ensembleOutputs_, _tmpDir_, _current_date_
    
     fpname, hr = arg 
 
@@ -823,23 +987,36 @@ def packEnsemblesInParallel(arg):
     
     print "Started Processing the file:  \n" 
     print "ensembleFiles_allConstraints_list", ensembleFiles_allConstraints_list
-                                                
-    ## get the no of childs process to create fcst ensemble files  
-    nchild = len(ensembleFiles_allConstraints_list)     
+    
+    # read every member file only once per group of outputs (instead of once 
+    # per variable and hour) into the (member, ...) arrays of the group. 
+    packDir = os.path.join(_tmpDir_, _current_date_, 'ensembles_%s%s' % (fpname, fexthr))
+    groups = _getEnsembleOutputGroups(ensembleFiles, [allConstraints 
+                  for _, allConstraints in ensembleFiles_allConstraints_list])
     maxprocess = mp.cpu_count()
-    if nchild > maxprocess: nchild = maxprocess
-    # create the no of child parallel processes
-    inner_pool = mp.Pool(processes=nchild)
-    print "Creating %i (daemon) workers and jobs in child." % nchild
-
-    print "parallel ensemble begins for", varName, varSTASH
-    # pass the (ensemblefileslist, allConstraints, pressureConstraint) as 
-    # argument to take one fcst ensemble file per process / core to regrid it.
-    results = inner_pool.map(packEnsembles, ensembleFiles_allConstraints_list)
-    # closing and joining child pools      
-    inner_pool.close() 
-    inner_pool.join()
-    # parallel end
+    for group in groups:
+        _ensembleOutputs_ = _allocateEnsembleOutputs(ensembleFiles, group, packDir)
+        ## get the no of childs process to create fcst ensemble files  
+        nchild = min(max(len(group), len(ensembleFiles)-1), maxprocess) or 1
+        # create the no of child parallel processes. The same workers store
+        # the members and then pack the outputs of this group. They inherit
+        # (fork) _ensembleOutputs_ and its memmap arrays.
+        inner_pool = mp.Pool(processes=nchild)
+        print "Creating %i (daemon) workers and jobs in child." % nchild
+        inner_pool.map(_storeEnsembleMember, list(enumerate(ensembleFiles))[1:])
+        
+        print "parallel ensemble begins for", group
+        # pass the (ensemblefileslist, allConstraints) as argument to take 
+        # one fcst ensemble output per process / core to regrid it.
+        results = inner_pool.map(packEnsembles, [(ensembleFiles, allConstraints)
+                                                  for allConstraints in group])
+        # closing and joining child pools      
+        inner_pool.close() 
+        inner_pool.join()
+        # parallel end
+        _ensembleOutputs_ = {}
+        shutil.rmtree(packDir, ignore_errors=True)
+    # end of for group in groups:
     # end of if __fcst_step_hour__ == 6:
               
     print "Time taken to convert the file: %8.5f seconds \n" %(time.time()-_startT_)
@@ -890,40 +1067,51 @@ def tweaked_messages(cubeList):
             gribapi.grib_set_long(grib_message, "subCentre", 0) # No subcentre
             print "reset the centre as 29"
             
-            # ensembles tweak begin
-            # http://www.nco.ncep.noaa.gov/pmb/docs/grib2/grib2_table4-3.shtml 
-            # 4 points ensemble forecast
-            gribapi.grib_set_long(grib_message, "typeOfGeneratingProcess", 4)
-                        
-            if cube.coord("forecast_period").bounds is None:       
-                #http://www.nco.ncep.noaa.gov/pmb/docs/grib2/grib2_table4-0.shtml 
-                # template 01 would be better
-                gribapi.grib_set(grib_message, "productDefinitionTemplateNumber", 1)
+            statistic = getRealizationStatistic(cube)
+            if statistic is not None:
+                # ensemble statistics cube (mean, spread, percentiles, ...)
+                # of cubeutils.cubeRealizationStatistics, which has no 
+                # realization coord.
+                __setEnsembleStatisticKeys__(cube, grib_message, statistic)
+                if cube.coord("forecast_period").bounds is not None:
+                    # same as members, set proper time intervals
+                    gribapi.grib_set(grib_message, "typeOfTimeIncrement", 2)
             else:
-                # template 11 would be better
-                gribapi.grib_set(grib_message, "productDefinitionTemplateNumber", 11)                   
-                # if we set bounds[0][0] = 0, wgrib2 gives error for 0 fcst time.
-                # so we need to set proper time intervals 
-                # (typeOfTimeIncrement) as 2 as per below table.
-                # http://www.nco.ncep.noaa.gov/pmb/docs/grib2/grib2_table4-11.shtml
-                # fileformats/grib/_save_rules.py-> set_forecast_time() ->
-                # _non_missing_forecast_period() returns 'fp' as bounds[0][0]. 
-                # but mean while lets fix by setting typeOfTimeIncrement=2.
-                # http://www.cosmo-model.org/content/model/documentation/grib/pdtemplate_4.11.htm 
-                gribapi.grib_set(grib_message, "typeOfTimeIncrement", 2)           
-                print 'reset typeOfTimeIncrement as 2 for', cube.standard_name
-            # end of if cube.coord("forecast_period").bounds is None:       
+                # ensembles tweak begin
+                # http://www.nco.ncep.noaa.gov/pmb/docs/grib2/grib2_table4-3.shtml 
+                # 4 points ensemble forecast
+                gribapi.grib_set_long(grib_message, "typeOfGeneratingProcess", 4)
+                            
+                if cube.coord("forecast_period").bounds is None:       
+                    #http://www.nco.ncep.noaa.gov/pmb/docs/grib2/grib2_table4-0.shtml 
+                    # template 01 would be better
+                    gribapi.grib_set(grib_message, "productDefinitionTemplateNumber", 1)
+                else:
+                    # template 11 would be better
+                    gribapi.grib_set(grib_message, "productDefinitionTemplateNumber", 11)                   
+                    # if we set bounds[0][0] = 0, wgrib2 gives error for 0 fcst time.
+                    # so we need to set proper time intervals 
+                    # (typeOfTimeIncrement) as 2 as per below table.
+                    # http://www.nco.ncep.noaa.gov/pmb/docs/grib2/grib2_table4-11.shtml
+                    # fileformats/grib/_save_rules.py-> set_forecast_time() ->
+                    # _non_missing_forecast_period() returns 'fp' as bounds[0][0]. 
+                    # but mean while lets fix by setting typeOfTimeIncrement=2.
+                    # http://www.cosmo-model.org/content/model/documentation/grib/pdtemplate_4.11.htm 
+                    gribapi.grib_set(grib_message, "typeOfTimeIncrement", 2)           
+                    print 'reset typeOfTimeIncrement as 2 for', cube.standard_name
+                # end of if cube.coord("forecast_period").bounds is None:       
             
-            # setting ensemble no   
-            gribapi.grib_set(grib_message, "perturbationNumber",
-                         int(cube.coord('realization').points[0]))
-            # no encoding at present in Iris, set to missing
-            gribapi.grib_set(grib_message, "numberOfForecastsInEnsemble", 255)
-            #http://www.nco.ncep.noaa.gov/pmb/docs/grib2/grib2_table4-6.shtml 
-            # 3 would be better, since we keep on increasing ensmble points 
-            # from 0 to 44
-            gribapi.grib_set(grib_message, "typeOfEnsembleForecast", 3)
-            # ensembles tweak end
+                # setting ensemble no   
+                gribapi.grib_set(grib_message, "perturbationNumber",
+                             int(cube.coord('realization').points[0]))
+                # no encoding at present in Iris, set to missing
+                gribapi.grib_set(grib_message, "numberOfForecastsInEnsemble", 255)
+                #http://www.nco.ncep.noaa.gov/pmb/docs/grib2/grib2_table4-6.shtml 
+                # 3 would be better, since we keep on increasing ensmble points 
+                # from 0 to 44
+                gribapi.grib_set(grib_message, "typeOfEnsembleForecast", 3)
+                # ensembles tweak end
+            # end of if statistic is not None:
             
             if cube.coords('depth_below_land_surface') or cube.coords('depth'):                
                 if __soilFirstSecondFixedSurfaceUnit__ == 'cm':
@@ -1013,7 +1201,7 @@ def convertFilesInParallel(fnames, ftype):
     
     global _startT_, _tmpDir_, _opPath_, __end_long_fcst_hour__,\
            __fcst_step_hour__, _createGrib2CtlIdxFiles_, \
-           __start_long_fcst_hour__
+           __start_long_fcst_hour__, _filesInParallel_
     
     # calculate start hour of long fcst in multiple of days.
     start_fcst_hour = __start_long_fcst_hour__
@@ -1027,6 +1215,8 @@ def convertFilesInParallel(fnames, ftype):
     # lets create no of parallel process w.r.t no of files.
     
     # parallel begin - 1 
+    # packEnsemblesInParallel workers (forked) share the memory budget
+    _filesInParallel_ = nprocesses
     pool = _MyPool(nprocesses)
     print "Creating %d (non-daemon) workers and jobs in convertFilesInParallel process." % nprocesses        
     if ftype in ['fcst', 'forecast']:        
@@ -1168,7 +1358,8 @@ def convertFcstFiles(inPath, outPath, tmpPath, **kwarg):
        _removeVars_, _requiredPressureLevels_, __setGrib2TableParameters__, \
         __outg2files__, __start_long_fcst_hour__, __wgrib2Arguments__, \
         __UMtype__, _preExtension_, _extraPolateMethod_, _targetGridFile_, \
-       __fillFullyMaskedVars__, _reverseLatitude_, epsMeanVars 
+       __fillFullyMaskedVars__, _reverseLatitude_, epsMeanVars, _regridInSlabs_, \
+       _workingDtype_, _cacheRegridWeights_, _regridEngine_, _memoryBudget_
      
     # load key word arguments
     UMtype = kwarg.get('UMtype', 'ensemble')
@@ -1196,6 +1387,11 @@ def convertFcstFiles(inPath, outPath, tmpPath, **kwarg):
     callBackScript = kwarg.get('callBackScript', None)
     setGrib2TableParameters = kwarg.get('setGrib2TableParameters', None)
     wgrib2Arguments = kwarg.get('wgrib2Arguments', None)
+    regridInSlabs = kwarg.get('regridInSlabs', True)
+    workingDtype = kwarg.get('workingDtype', 'float32')
+    cacheRegridWeights = kwarg.get('cacheRegridWeights', True)
+    regridEngine = kwarg.get('regridEngine', 'iris')
+    memoryBudget = kwarg.get('memoryBudget', None)
     
     # assign out file type in global variable
     __outFileType__ = 'fcst'
@@ -1225,6 +1421,11 @@ def convertFcstFiles(inPath, outPath, tmpPath, **kwarg):
     _convertGrib2FilestoGrib1Files_ = convertGrib2FilestoGrib1Files
     __setGrib2TableParameters__ = setGrib2TableParameters
     __wgrib2Arguments__ = wgrib2Arguments
+    _regridInSlabs_ = regridInSlabs
+    _workingDtype_ = workingDtype
+    _cacheRegridWeights_ = cacheRegridWeights
+    _regridEngine_ = regridEngine
+    _memoryBudget_ = memoryBudget
     # forecast filenames partial name
     if __fcst_step_hour__ == 6:
         fcst_fnames = ['pd', 'pg']  # ['pb'] old filename 
@@ -1237,6 +1438,10 @@ def convertFcstFiles(inPath, outPath, tmpPath, **kwarg):
     print "\n _current_date_ is %s" % _current_date_
     logpath = os.path.join(_tmpDir_, _current_date_)
     createDirWhileParallelRacing(logpath)
+    if _cacheRegridWeights_ and _regridEngine_ != 'iris':
+        # regrid weights will be stored in tmpPath and reused by next cycles
+        createDirWhileParallelRacing(os.path.join(_tmpDir_, 'regridWeights'))
+    # end of if _cacheRegridWeights_ and _regridEngine_ != 'iris':
     logfile = 'um2grb2_fcst_stdout_'+ _current_date_ +'_' + utc +'Z.log'
     sys.stdout = myLog(os.path.join(logpath, logfile))
     
@@ -1289,6 +1494,9 @@ def convertFcstFiles(inPath, outPath, tmpPath, **kwarg):
     
     _opPath_ = os.path.join(outPath, _current_date_)
     createDirWhileParallelRacing(_opPath_) 
+    # remove done marker of previous run, this cycle is not done yet.
+    donepath = os.path.join(_opPath_, 'umeps2grb2_fcst_%s_%sZ.done' % (_current_date_, utc))
+    if os.path.isfile(donepath): os.remove(donepath)
         
     # define default global lat start, lon end points
     slat, elat = (-90., 90.)
@@ -1360,12 +1568,17 @@ def convertFcstFiles(inPath, outPath, tmpPath, **kwarg):
     if start_long_fcst_hour == 0: fhrs = [0] + fhrs
     ffns = fcstFileNameStructure[0]
     print "ffns---->", ffns, fhrs
+    outFiles = {}
     for fhr in fhrs:
         hrs = str(fhr).zfill(3) + 'hr'
         outg2files = [inf for inf in os.listdir(_opPath_) if ffns in inf if hrs in inf if _preExtension_ in inf]
         if not outg2files: continue
         fname = '_'.join(outg2files[0].split('_')[1:]) # remove STASH alone
         outFn = fname.replace(_preExtension_, '') # remove _preExtension_
+        # all the variables are merged into tmp file and renamed as outFn 
+        # once it is completed. So outFn is never seen as partially written.
+        outTmpFn = outFn + '.tmp'
+        if os.path.isfile(outTmpFn): os.remove(outTmpFn)
         print "_convertVars_====>", _convertVars_
         for varName, varSTASH in _convertVars_:
             # make unique file name becase we are running in parallel            
@@ -1381,15 +1594,19 @@ def convertFcstFiles(inPath, outPath, tmpPath, **kwarg):
             inFn = inFn[0]
             if __wgrib2Arguments__ is not None:
                 # execute post wgrib2 command in parellel (-ncpu 4 Best speed compare to 32)            
-                cmd = "%s %s %s %s" % (wgrib2, inFn, __wgrib2Arguments__, outFn)
+                cmd = "%s %s %s %s" % (wgrib2, inFn, __wgrib2Arguments__, outTmpFn)
                 print "wgrib2 merge cmd", cmd
-                subprocess.call(cmd, shell=True)
+                returncode = subprocess.call(cmd, shell=True)
+                if returncode != 0:
+                    # keep inFn, so that it can be merged again.
+                    print "ALERT !!! wgrib2 merge failed (return code %d) for %s" % (returncode, inFn)
+                    continue
+                # end of if returncode != 0:
             else:
                 cubes = iris.load_cubes(inFn)
                 iris.fileformats.grib.save_messages(tweaked_messages(cubes), 
-                                                 outFn, append=True) # save grib2 file                
+                                                 outTmpFn, append=True) # save grib2 file                
             # end of if __wgrib2Arguments__:
-            time.sleep(15)            
             if not ((varName, varSTASH) in epsMeanVars and fhr % 24 == 0): 
                 os.remove(inFn)
                 print "removed", inFn                        
@@ -1403,12 +1620,18 @@ def convertFcstFiles(inPath, outPath, tmpPath, **kwarg):
             ## be used to read it to create EPS mean and then will be deleted.
             ## Dated : 05-Aug-2016.              
         # end of for varName, varSTASH in varNamesSTASH:   
-        time.sleep(15)
-        # Lets create ctl and idx file. 
-        createGrib2CtlIdxFilesFn(outFn, ftype='fcst')       
+        if not os.path.isfile(outTmpFn): continue
+        # flush the merged file into disk and rename, then lets create ctl 
+        # and idx file. 
+        __renameCompletedFile__(outTmpFn, outFn)
+        outFiles[outFn] = {'size': os.path.getsize(outFn)}
+        if _createGrib2CtlIdxFiles_: createGrib2CtlIdxFilesFn(outFn, ftype='fcst')       
     # end of for fhr in range(start_long_fcst_hour, end_long_fcst_hour, fcst_step_hour):
     
     os.chdir(pwd) # Back to previous directory
+    # all the merged files are completed. So mark this cycle as done.
+    writeCompletionManifest(donepath, date=_current_date_, utc=utc, 
+                            outFileType='fcst', outFiles=outFiles)
     
     if callBackScript:
         callBackScript = os.path.abspath(callBackScript)
@@ -52,7 +52,7 @@ import iris.fileformats.grib.load_rules
 __all__ = ['load_cubes', 'save_grib2', 'load_pairs_from_fields',
            'save_pairs_from_cube', 'save_messages', 'GribWrapper',
            'as_messages', 'as_pairs', 'grib_generator', 'reset_load_rules',
-           'hindcast_workaround']
+           'hindcast_workaround', 'values_dtype']
 
 
 #: Set this flag to True to enable support of negative forecast periods
@@ -62,6 +62,11 @@ __all__ = ['load_cubes', 'save_grib2', 'load_pairs_from_fields',
 hindcast_workaround = False
 
 
+#: dtype of the loaded GRIB message values (say np.float32 for the fields
+#: packed into 12-16 bits, which halves the memory of the loaded data).
+values_dtype = np.float64
+
+
 CENTRE_TITLES = {'egrr': 'U.K. Met Office - Exeter',
                  'ecmf': 'European Centre for Medium Range Weather Forecasts',
                  'rjtd': 'Tokyo, Japan Meteorological Agency',
@@ -228,7 +233,7 @@ class GribWrapper(object):
             # The byte offset requires to be reset back to the first byte
             # of this message. The file pointer offset is always at the end 
             # of the current message due to the grib-api reading the message.
-            proxy = GribDataProxy(shape, np.zeros(.0).dtype, np.nan,
+            proxy = GribDataProxy(shape, np.dtype(values_dtype), np.nan,
                                   grib_fh.name,
                                   offset - message_length,
                                   auto_regularise)
@@ -740,7 +745,7 @@ def _longitude_is_cyclic(points):
 def _message_values(grib_message, shape):
     gribapi.grib_set_double(grib_message, 'missingValue', np.nan)
     data = gribapi.grib_get_double_array(grib_message, 'values')
-    data = data.reshape(shape)
+    data = data.reshape(shape).astype(values_dtype, copy=False)
 
     # Handle missing values in a sensible way.
     mask = np.isnan(data)
@@ -1042,6 +1042,16 @@ def product_definition_section(cube, grib):
 #
 ###############################################################################
 
+def _cube_is_probability(cube):
+    """
+    Test whether this cube is the probability of its parameter (say
+    probability over realization), from its cell methods.
+
+    """
+    return any(cell_method.method == 'probability'
+               for cell_method in cube.cell_methods)
+
+
 def data_section(cube, grib):
     # Masked data?
     if isinstance(cube.data, ma.core.MaskedArray):
@@ -1068,7 +1078,8 @@ def data_section(cube, grib):
         # for now, just allow this
         warnings.warn('Unable to determine Grib2 parameter code for cube.\n'
                       'Message data may not be correctly scaled.')
-    else:
+    elif not _cube_is_probability(cube):
+        # probability (%) of the parameter is not in parameter units
         if cube.units != grib2_info.units:
             data = cube.units.convert(data, grib2_info.units)
             if fill_value is not None: